@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# pylint: disable=I0011
+
+"""
+Compares per-capture latency of the cold CLI path with requests served by `lolologist daemon`.
+
+    python -m benchmarks.daemon_latency [--requests N]
+
+The camera is replaced with a fixture image, so the numbers exclude camera warmup.
+"""
+
+from __future__ import unicode_literals, print_function
+
+import argparse
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.fixtures import make_image, make_repository, write_config, use_fixture_camera
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_child(image_path, argv):
+    """ Runs lolologist with the fixture camera. Invoked in a subprocess. """
+    use_fixture_camera(image_path)
+    from lolologist import lolologist
+    sys.argv = ['lolologist'] + argv
+    lolologist.main()
+
+
+def percentile(samples, fraction):
+    """ Gets the nearest-rank percentile of the samples. """
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def time_commands(command, environment, cwd, count):
+    """ Times `count` runs of a command, in milliseconds. """
+    samples = []
+    for _ in range(count):
+        started = time.time()
+        subprocess.check_call(command, env=environment, cwd=cwd, stdout=subprocess.PIPE)
+        samples.append((time.time() - started) * 1000)
+    return samples
+
+
+def main():
+    """ Sets up the fixtures, runs each path and prints a table. """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=10, help="Captures per path")
+    parser.add_argument('--child', nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return run_child(args.child[0], args.child[1:])
+
+    workspace = tempfile.mkdtemp(prefix='lolologist-bench-')
+    try:
+        home = os.path.join(workspace, 'home')
+        os.makedirs(home)
+        image_path = make_image(os.path.join(workspace, 'frame.jpg'))
+        repository = make_repository(os.path.join(workspace, 'repo'))
+        socket_path = os.path.join(home, 'daemon.sock')
+        write_config(home, os.path.join(workspace, 'out', '{project}'), DaemonSocket=socket_path)
+        environment = dict(os.environ, HOME=home, PYTHONPATH=PROJECT_ROOT)
+        child = [sys.executable, '-m', 'benchmarks.daemon_latency', '--child', image_path]
+
+        results = [("cold CLI", time_commands(child + ['capture'], environment, repository, args.requests))]
+
+        daemon = subprocess.Popen(child + ['daemon'], env=environment, cwd=repository, stdout=subprocess.PIPE)
+        try:
+            while not os.path.exists(socket_path):
+                time.sleep(0.05)
+            os.environ['HOME'] = home
+            from lolologist.daemon import request_capture
+            samples, server_samples = [], []
+            for _ in range(args.requests):
+                started = time.time()
+                response = request_capture(socket_path, repository)
+                samples.append((time.time() - started) * 1000)
+                server_samples.append(response['elapsed'] * 1000)
+            results.append(("daemon (server time)", server_samples))
+            results.append(("daemon (socket client)", samples))
+            results.append(("daemon (CLI client)",
+                            time_commands(child + ['capture', '--daemon'], environment, repository, args.requests)))
+        finally:
+            daemon.send_signal(signal.SIGINT)
+            daemon.wait()
+
+        print("{:<24} {:>10} {:>10}".format("path", "p50 (ms)", "p95 (ms)"))
+        for name, samples in results:
+            print("{:<24} {:>10.1f} {:>10.1f}".format(name, percentile(samples, 0.5), percentile(samples, 0.95)))
+    finally:
+        shutil.rmtree(workspace)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# pylint: disable=I0011
+
+"""
+Compares the time and peak RSS of ImageMacro.render() on large JPEGs with a full decode and a draft-mode decode.
+
+    python -m benchmarks.decode_draft [--repeat N]
+
+Fixtures are generated and each measurement runs in a fresh process, so peak RSS covers a single render. (Linux
+carries a parent's peak RSS over to its children.)
+"""
+
+from __future__ import unicode_literals, print_function
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+
+from benchmarks.fixtures import make_image
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Megapixels -> dimensions, all 4:3 like most webcams and phone cameras
+SIZES = [
+    (2, (1632, 1224)),
+    (8, (3264, 2448)),
+    (24, (5664, 4248)),
+]
+
+
+def run_child(image_path, mode, repeat):
+    """ Renders the image and prints the best time and the peak RSS as JSON. Invoked in a subprocess. """
+    from PIL import Image
+    from lolologist.lolologist import ImageMacro, FALLBACK_FONT
+
+    def full_decode():
+        """ Opens the image without a draft, as ImageMacro.render used to. """
+        image = Image.open(image_path)
+        image.load()
+        return ImageMacro(image, '0123456789', "Decode only what survives the thumbnail", FALLBACK_FONT).render()
+
+    def draft_decode():
+        """ Lets ImageMacro.render open the image itself. """
+        return ImageMacro(image_path, '0123456789', "Decode only what survives the thumbnail",
+                          FALLBACK_FONT).render()
+
+    render = full_decode if mode == 'full' else draft_decode
+    best = min(timeit.repeat(render, number=1, repeat=repeat)) * 1000
+    # ru_maxrss is in kilobytes on Linux, bytes on OS X
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    if sys.platform == 'darwin':
+        peak /= 1024.0
+    print(json.dumps({"ms": best, "rss_mb": peak}))
+
+
+def run_in_child(*argv):
+    """ Runs this benchmark with the given arguments in a fresh interpreter, returning its output. """
+    environment = dict(os.environ, PYTHONPATH=PROJECT_ROOT)
+    output = subprocess.check_output([sys.executable, '-m', 'benchmarks.decode_draft'] + list(argv),
+                                     env=environment, cwd=PROJECT_ROOT)
+    return output.decode('utf-8').strip()
+
+
+def measure(image_path, mode, repeat):
+    """ Runs one measurement in a fresh interpreter. """
+    return json.loads(run_in_child('--child', mode, image_path, '--repeat', str(repeat)).splitlines()[-1])
+
+
+def main():
+    """ Runs the benchmark matrix and prints a table. """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help="Number of timed renders per cell")
+    parser.add_argument('--child', nargs=2, metavar=('MODE', 'IMAGE'), help=argparse.SUPPRESS)
+    parser.add_argument('--make', nargs=3, metavar=('IMAGE', 'WIDTH', 'HEIGHT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.make:
+        make_image(args.make[0], (int(args.make[1]), int(args.make[2])))
+        return
+    if args.child:
+        run_child(args.child[1], args.child[0], args.repeat)
+        return
+
+    directory = tempfile.mkdtemp()
+    try:
+        print("{:>4} {:>11} {:>11} {:>8} {:>14} {:>14}".format(
+            "MP", "full (ms)", "draft (ms)", "speedup", "full RSS (MB)", "draft RSS (MB)"))
+        for megapixels, size in SIZES:
+            image_path = os.path.join(directory, '{}mp.jpg'.format(megapixels))
+            run_in_child('--make', image_path, str(size[0]), str(size[1]))
+            full = measure(image_path, 'full', args.repeat)
+            draft = measure(image_path, 'draft', args.repeat)
+            print("{:>4} {:>11.1f} {:>11.1f} {:>7.1f}x {:>14.1f} {:>14.1f}".format(
+                megapixels, full["ms"], draft["ms"], full["ms"] / draft["ms"], full["rss_mb"], draft["rss_mb"]))
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
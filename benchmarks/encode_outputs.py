@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# pylint: disable=I0011
+
+"""
+Compares saving a macro with a thumbnail and a WebP copy by re-decoding the saved macro for each copy, one after
+another, and by deriving every output from the rendered image with encode_outputs().
+
+    python -m benchmarks.encode_outputs [--repeat N]
+"""
+
+from __future__ import unicode_literals, print_function
+
+import argparse
+import io
+import timeit
+
+from PIL import Image
+
+from lolologist.encoders import encode_image, encode_outputs
+from lolologist.lolologist import MAX_WIDTH, MAX_HEIGHT
+
+OUTPUTS = (
+    ('macro.jpg', None, {'quality': 85}),
+    ('macro.thumb.jpg', (160, 120), {'quality': 85}),
+    ('macro.dashboard.webp', None, {'quality': 80}),
+)
+
+
+def make_macro():
+    """ Builds an image with enough detail to keep the encoders honest. """
+    size = (int(MAX_WIDTH), int(MAX_HEIGHT))
+    return Image.effect_mandelbrot(size, (-2.0, -1.25, 0.75, 1.25), 128).convert('RGB')
+
+
+def encode_separately(image):
+    """ Saves the macro, then decodes it again for each copy, as separate tools would. """
+    file_path, _, settings = OUTPUTS[0]
+    saved = encode_image(image, file_path, settings)
+    for file_path, size, settings in OUTPUTS[1:]:
+        copy = Image.open(io.BytesIO(saved))
+        if size is not None:
+            copy.thumbnail(size)
+        encode_image(copy, file_path, settings)
+
+
+def encode_together(image):
+    """ Encodes every output from the rendered image at once. """
+    encode_outputs(image, OUTPUTS)
+
+
+def main():
+    """ Runs the benchmark and prints a table. """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20, help="Number of timed runs of each")
+    args = parser.parse_args()
+
+    image = make_macro()
+    print("{:<12} {:>10}".format("outputs", "time (ms)"))
+    for label, encode in (('separately', encode_separately), ('together', encode_together)):
+        encode(image)
+        timing = min(timeit.repeat(lambda: encode(image), number=1, repeat=args.repeat))
+        print("{:<12} {:>10.1f}".format(label, timing * 1000))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# pylint: disable=I0011
+
+"""
+Shared fixtures for the lolologist benchmarks. Everything is generated, so runs are reproducible.
+"""
+
+from __future__ import unicode_literals
+
+from contextlib import contextmanager
+import io
+import os
+import re
+
+# The image, repository and configuration fixtures are shared with the tests
+from tests.helpers import make_image, make_repository, write_config #pylint: disable=W0611
+
+# Real-world commit messages, one per line
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'tests', 'data', 'commit_messages.txt')
+
+
+def load_corpus():
+    """ Gets the commit message corpus lines and their total word count. """
+    with io.open(CORPUS_PATH, encoding='utf-8') as corpus_file:
+        lines = corpus_file.read().splitlines()
+    return lines, sum(len(re.findall(r'\w+', line)) for line in lines)
+
+
+class FixtureCamera(object): #pylint: disable=R0903
+    """ A stand-in camera that always "captures" the same image """
+
+    image_path = None
+
+    def __init__(self, **kwargs):
+        pass
+
+    @contextmanager
+    def capture_photo(self):
+        """ Provides the fixture image. """
+        yield self.image_path
+
+
+def use_fixture_camera(image_path):
+    """ Replaces lolologist's cameras with one that returns the given image. """
+    from lolologist import lolologist
+    FixtureCamera.image_path = image_path
+    lolologist.MplayerCamera = FixtureCamera
+    lolologist.ImageSnapCamera = FixtureCamera
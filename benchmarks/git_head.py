@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# pylint: disable=I0011
+
+"""
+Compares reading HEAD with GitPython and with lolologist's own reader, from a cold start, on a large repository.
+
+    python -m benchmarks.git_head [--commits N] [--repeat N]
+
+The repository is generated with `git fast-import` and packed with `git gc`, so HEAD's commit and refs live in a
+big packfile and `packed-refs`. A loose HEAD (the usual case right after `git commit`) is measured too. Each
+measurement runs in a fresh interpreter, so module imports are counted as a post-commit hook would pay them.
+"""
+
+from __future__ import unicode_literals, print_function
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENVIRONMENT = dict(os.environ, GIT_AUTHOR_NAME='Bench', GIT_AUTHOR_EMAIL='bench@example.com',
+                   GIT_COMMITTER_NAME='Bench', GIT_COMMITTER_EMAIL='bench@example.com')
+
+
+def make_large_repository(path, commits):
+    """Creates a repository with many commits, each touching a few of many files, then packs it
+
+    :param path: The directory to create the repository in
+    :param commits: The number of commits to make
+    :returns: The repository path
+
+    """
+    subprocess.check_call(['git', 'init', '-q', path])
+    stream = []
+    for index in range(commits):
+        message = "Commit {}\n\nTouches files {} to {}.\n".format(index, index % 500, index % 500 + 3)
+        stream.append('commit refs/heads/master\nmark :{}\n'.format(index + 1))
+        stream.append('committer Bench <bench@example.com> {} +0000\n'.format(1466000000 + index))
+        stream.append('data {}\n{}\n'.format(len(message.encode('utf-8')), message))
+        if index:
+            stream.append('from :{}\n'.format(index))
+        for offset in range(4):
+            content = '{} {}\n'.format(index, 'x' * 2000)
+            stream.append('M 644 inline src/{}/file{}.txt\ndata {}\n{}\n'.format(
+                (index + offset) % 50, (index + offset) % 500, len(content), content))
+        stream.append('\n')
+    process = subprocess.Popen(['git', 'fast-import', '--quiet'], cwd=path, stdin=subprocess.PIPE)
+    process.communicate(''.join(stream).encode('utf-8'))
+    subprocess.check_call(['git', 'symbolic-ref', 'HEAD', 'refs/heads/master'], cwd=path)
+    subprocess.check_call(['git', 'checkout', '-q', '-f', 'master'], cwd=path)
+    subprocess.check_call(['git', 'gc', '-q', '--aggressive'], cwd=path)
+    return path
+
+
+def run_child(repository, mode):
+    """ Reads HEAD once, timing everything from the first import, and prints the time as JSON. """
+    started = timeit.default_timer()
+    if mode == 'gitpython':
+        import git
+        git.Repo(repository).commit('HEAD').message
+    else:
+        from lolologist.repository import GitRepository
+        GitRepository(repository).get_newest_commit()
+    print(json.dumps({"ms": (timeit.default_timer() - started) * 1000}))
+
+
+def measure(repository, mode, repeat):
+    """ Gets the best of several cold reads, each in a fresh interpreter. """
+    environment = dict(os.environ, PYTHONPATH=PROJECT_ROOT)
+    timings = []
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, '-m', 'benchmarks.git_head', '--child', mode, repository],
+                                         env=environment, cwd=PROJECT_ROOT)
+        timings.append(json.loads(output.decode('utf-8').strip().splitlines()[-1])["ms"])
+    return min(timings)
+
+
+def commit_loose(repository):
+    """ Makes a commit on top of the packed history, as the post-commit hook would see it. """
+    with open(os.path.join(repository, 'README'), 'w') as readme:
+        readme.write('Loose\n')
+    subprocess.check_call(['git', 'add', 'README'], cwd=repository, env=ENVIRONMENT)
+    subprocess.check_call(['git', 'commit', '-q', '-m', 'A fresh commit'], cwd=repository, env=ENVIRONMENT)
+
+
+def main():
+    """ Builds the repository and prints a table. """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--commits', type=int, default=20000, help="Commits in the generated repository")
+    parser.add_argument('--repeat', type=int, default=5, help="Cold reads per measurement")
+    parser.add_argument('--child', nargs=2, metavar=('MODE', 'REPOSITORY'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_child(args.child[1], args.child[0])
+        return
+
+    directory = tempfile.mkdtemp()
+    try:
+        repository = make_large_repository(os.path.join(directory, 'repo'), args.commits)
+        pack_size = sum(os.path.getsize(os.path.join(root, name))
+                        for root, _, names in os.walk(os.path.join(repository, '.git', 'objects', 'pack'))
+                        for name in names if name.endswith('.pack'))
+        print("{} commits, {:.1f} MB of packfiles".format(args.commits, pack_size / 1024.0 / 1024.0))
+        print("{:<8} {:>15} {:>15} {:>8}".format("HEAD", "GitPython (ms)", "lolologist (ms)", "speedup"))
+        for label in ('packed', 'loose'):
+            if label == 'loose':
+                commit_loose(repository)
+            slow = measure(repository, 'gitpython', args.repeat)
+            fast = measure(repository, 'lolologist', args.repeat)
+            print("{:<8} {:>15.1f} {:>15.1f} {:>7.1f}x".format(label, slow, fast, slow / fast))
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
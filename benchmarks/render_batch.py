@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# pylint: disable=I0011
+
+"""
+Compares the throughput of rendering one macro onto a batch of frames with a new ImageMacro per frame, from scratch,
+and with ImageMacro.render_many().
+
+    python -m benchmarks.render_batch [--repeat N]
+"""
+
+from __future__ import unicode_literals, print_function
+
+import argparse
+import timeit
+
+from PIL import Image
+
+from lolologist.lolologist import ImageMacro, FALLBACK_FONT, MAX_WIDTH, MAX_HEIGHT, clear_text_overlays
+
+BATCH_SIZES = (1, 4, 16, 64)
+SUMMARY = "Refactor the repository handler so submodules register their hooks"
+
+
+def make_frames(count):
+    """ Builds frames at the size macros are rendered at, so scaling doesn't dominate. """
+    size = (int(MAX_WIDTH), int(MAX_HEIGHT))
+    return [Image.new('RGB', size, (index * 3 % 256, 120, 200)) for index in range(count)]
+
+
+def render_each(count):
+    """ Renders every frame with its own macro, without any text rasterized beforehand, as lolologist used to. """
+    for frame in make_frames(count):
+        clear_text_overlays()
+        ImageMacro(frame, '0123456789', SUMMARY, FALLBACK_FONT).render()
+
+
+def render_batch(count):
+    """ Renders every frame with one macro. """
+    clear_text_overlays()
+    for _ in ImageMacro(None, '0123456789', SUMMARY, FALLBACK_FONT).render_many(make_frames(count)):
+        pass
+
+
+def frames_per_second(render, count, repeat):
+    """ Gets the best throughput of several runs, frame creation included. """
+    render(count)
+    return count / min(timeit.repeat(lambda: render(count), number=1, repeat=repeat))
+
+
+def main():
+    """ Runs the benchmark matrix and prints a table. """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help="Number of timed runs per cell")
+    args = parser.parse_args()
+
+    print("{:>6} {:>14} {:>16} {:>8}".format("frames", "each (fps)", "batched (fps)", "speedup"))
+    for count in BATCH_SIZES:
+        each = frames_per_second(render_each, count, args.repeat)
+        batched = frames_per_second(render_batch, count, args.repeat)
+        print("{:>6} {:>14.1f} {:>16.1f} {:>7.1f}x".format(count, each, batched, batched / each))
+
+if __name__ == '__main__':
+    main()
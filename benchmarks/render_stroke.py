@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# pylint: disable=I0011
+
+"""
+Compares ImageMacro.render() timings for the legacy offset-loop stroke and the single-pass mask stroke.
+
+    python -m benchmarks.render_stroke [--repeat N]
+"""
+
+from __future__ import unicode_literals, print_function
+
+import argparse
+import os
+import tempfile
+import timeit
+
+from PIL import Image, ImageDraw, ImageFont
+
+from lolologist import lolologist
+from lolologist.fonts import get_font, measure_text
+from lolologist.lolologist import ImageMacro, FALLBACK_FONT, STROKE_COLOR, TEXT_COLOR
+
+SUMMARY_WORDS = ("Refactor the repository handler so submodules register their hooks and wrap "
+                 "long commit summaries across several lines of text").split()
+
+
+class MeasuringImageMacro(ImageMacro):
+    """ An image macro that measures text with the font, so the stroke is only rasterized by the draw. """
+
+    def _ImageMacro__get_text_dimensions(self, text, font_size, stroke_width=3):
+        """ Measures the text without rasterizing it. """
+        return measure_text(get_font(self.font, font_size), text)
+
+
+class LegacyImageMacro(MeasuringImageMacro):
+    """ An image macro that strokes text with one draw.text call per offset, as lolologist used to. """
+
+    def __init__(self, *args, **kwargs):
+        super(LegacyImageMacro, self).__init__(*args, **kwargs)
+        self.stroke_width = 3
+
+    def _ImageMacro__draw_image(self, image, text, font_size, position, stroke_width=3):
+        """ Draws the text (2w+1)^2 times for the outline, then once for the fill. """
+        stroke_width = self.stroke_width
+        draw = ImageDraw.Draw(image)
+        font = ImageFont.truetype(self.font, font_size)
+        for x_off in range(-stroke_width, stroke_width + 1):
+            for y_off in range(-stroke_width, stroke_width + 1):
+                draw.text((position[0] + x_off, position[1] + y_off), text, STROKE_COLOR, font=font)
+        draw.text(position, text, TEXT_COLOR, font=font)
+
+
+class StrokeImageMacro(MeasuringImageMacro):
+    """ The current image macro with a configurable stroke width. """
+
+    def __init__(self, *args, **kwargs):
+        super(StrokeImageMacro, self).__init__(*args, **kwargs)
+        self.stroke_width = 3
+
+    def _ImageMacro__draw_image(self, image, text, font_size, position, stroke_width=3):
+        """ Defers to the single-pass implementation with the benchmarked stroke width. """
+        ImageMacro._ImageMacro__draw_image(self, image, text, font_size, position, self.stroke_width)
+
+
+def make_summary(lines, size):
+    """ Builds a summary that is laid out in exactly the given number of lines on an image of the given size. """
+    for count in range(1, len(SUMMARY_WORDS) + 1):
+        text = ' '.join(SUMMARY_WORDS[:count])
+        if len(ImageMacro(None, '', text, FALLBACK_FONT).layout_bottom_text(size).lines) == lines:
+            return text
+    raise ValueError("Not enough sample words for {} lines".format(lines))
+
+
+def time_render(macro_class, image_path, summary, stroke_width, repeat):
+    """ Returns the best per-render time in milliseconds. """
+    macro = macro_class(image_path, '0123456789', summary, FALLBACK_FONT)
+    macro.stroke_width = stroke_width
+
+    def render():
+        """ Renders from scratch, without the text rasterized by the previous run. """
+        lolologist.clear_text_overlays()
+        return macro.render()
+    return min(timeit.repeat(render, number=1, repeat=repeat)) * 1000
+
+
+def main():
+    """ Runs the benchmark matrix and prints a table. """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help="Number of timed renders per cell")
+    args = parser.parse_args()
+
+    lolologist.MAX_LINES = 4
+    handle, image_path = tempfile.mkstemp(suffix='.jpg')
+    os.close(handle)
+    try:
+        size = (int(lolologist.MAX_WIDTH), int(lolologist.MAX_HEIGHT))
+        Image.new('RGB', size, (90, 120, 200)).save(image_path)
+        print("{:>5} {:>6} {:>12} {:>12} {:>8}".format("lines", "stroke", "before (ms)", "after (ms)", "speedup"))
+        for lines in range(1, 5):
+            summary = make_summary(lines, size)
+            for stroke_width in range(1, 7):
+                before = time_render(LegacyImageMacro, image_path, summary, stroke_width, args.repeat)
+                after = time_render(StrokeImageMacro, image_path, summary, stroke_width, args.repeat)
+                print("{:>5} {:>6} {:>12.2f} {:>12.2f} {:>7.1f}x".format(
+                    lines, stroke_width, before, after, before / after))
+    finally:
+        os.remove(image_path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# pylint: disable=I0011
+
+"""
+Times each stage of the capture pipeline on generated fixtures and reports the results as JSON.
+
+    python -m benchmarks.suite run [--repeat N] [--output results.json] [--only NAME ...]
+    python -m benchmarks.suite compare [--baseline benchmarks/baseline.json] [--threshold 0.2] [results.json]
+
+`compare` runs the suite (or reads a previous run) and exits with a non-zero status if any benchmark's median is
+more than `threshold` (and more than `--noise-floor` milliseconds) slower than the baseline's. Refresh the baseline
+with `run --output benchmarks/baseline.json` on the machine the comparisons will run on.
+"""
+
+from __future__ import unicode_literals, print_function
+
+import argparse
+from collections import OrderedDict
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+
+from benchmarks.fixtures import load_corpus, make_image, make_repository, write_config, use_fixture_camera
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# How much slower than the baseline (as a fraction of it) a benchmark may get before it's flagged
+REGRESSION_THRESHOLD = 0.2
+# Slowdowns smaller than this (in milliseconds) are timer noise, however large they are relatively
+NOISE_FLOOR_MS = 0.1
+
+# Benchmarks, in the order they run: {name: setup}. A setup takes the workspace and returns the callable to time.
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(name):
+    """ Registers a benchmark setup under the given name. """
+    def decorator(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return decorator
+
+
+class Workspace(object): #pylint: disable=R0903
+    """ The fixtures shared by every benchmark: a home directory, a fixture frame and a synthetic repository """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.home = os.path.join(directory, 'home')
+        os.makedirs(self.home)
+        self.corpus, _ = load_corpus()
+        self.image_path = make_image(os.path.join(directory, 'frame.jpg'))
+        self.repository = make_repository(os.path.join(directory, 'repo'), summaries=self.corpus)
+        write_config(self.home, os.path.join(directory, 'out', '{project}'))
+
+
+@benchmark('render')
+def bench_render(workspace):
+    """ Renders a three-line macro onto the fixture frame, decode included. """
+    from lolologist.lolologist import ImageMacro, FALLBACK_FONT
+    summary = max(workspace.corpus, key=len)
+    return lambda: ImageMacro(workspace.image_path, '0123456789', summary, FALLBACK_FONT).render()
+
+
+@benchmark('layout_fit')
+def bench_layout_fit(workspace):
+    """ Fits a long summary into the bottom of a macro, with the font's glyphs already measured. """
+    from lolologist.layout import fit
+    from lolologist.lolologist import FALLBACK_FONT, get_font_path
+    summary, font_path = max(workspace.corpus, key=len), get_font_path(FALLBACK_FONT)
+    return lambda: fit(summary, font_path, 620, 192, 3)
+
+
+@benchmark('translate_sentence')
+def bench_translate(workspace):
+    """ Translates the whole corpus, one sentence at a time, from a cold word cache. """
+    from lolologist.lolz import Tranzlator
+    tranzlator = Tranzlator()
+
+    def translate_corpus():
+        """ Clears the word cache so every run does the same work. """
+        tranzlator.translate_word.cache_clear()
+        for line in workspace.corpus:
+            tranzlator.translate_sentence(line)
+    return translate_corpus
+
+
+@benchmark('get_newest_commit')
+def bench_newest_commit(workspace):
+    """ Opens the repository and reads HEAD, as a post-commit hook does. """
+    from lolologist.repository import GitRepository
+    return lambda: GitRepository(workspace.repository).get_newest_commit()
+
+
+@benchmark('config_load')
+def bench_config_load(workspace):
+    """ Loads the configuration as a new process would. """
+    from lolologist import lolologist
+
+    def load():
+        """ Forgets the parsed file first. """
+        lolologist._LOADED_CONFIGS.clear()
+        return lolologist.Config().max_size
+    return load
+
+
+@benchmark('config_update')
+def bench_config_update(workspace):
+    """ Applies a batch of settings. """
+    from lolologist.lolologist import Config
+    config = Config()
+    return lambda: config.update({'LolSpeak': 'off', 'JpegQuality': '85', 'MaxWidth': '640'})
+
+
+@benchmark('config_command')
+def bench_config_command(workspace):
+    """ Runs a configuration-only command in a new process, so interpreter startup and imports are included. """
+    script = "import sys; from lolologist.lolologist import main; sys.argv = ['lolologist', 'speaklolz', 'off']; main()"
+    environment = dict(os.environ, HOME=workspace.home,
+                       PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return lambda: subprocess.check_call([sys.executable, '-c', script], env=environment, stdout=subprocess.PIPE)
+
+
+@benchmark('capture')
+def bench_capture(workspace):
+    """ Captures HEAD end to end with a camera that returns the fixture frame. """
+    from lolologist.lolologist import Lolologist
+    use_fixture_camera(workspace.image_path)
+    app = Lolologist(workspace.repository)
+    return lambda: app.capture_commit(workspace.repository)
+
+
+def run(names=None, repeat=10):
+    """Runs the benchmarks in a throwaway workspace
+
+    :param names: The benchmarks to run. Defaults to all of them.
+    :param repeat: How many timed runs each benchmark gets, after one untimed warmup run
+    :returns: The results, ready to be dumped as JSON
+
+    """
+    names = names or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        raise ValueError("Unknown benchmark(s): {}".format(', '.join(unknown)))
+    directory = tempfile.mkdtemp(prefix='lolologist-bench-')
+    home = os.environ.get('HOME')
+    try:
+        workspace = Workspace(directory)
+        os.environ['HOME'] = workspace.home
+        results = OrderedDict()
+        for name in names:
+            function = BENCHMARKS[name](workspace)
+            function()
+            samples = sorted(time * 1000 for time in timeit.repeat(function, number=1, repeat=repeat))
+            results[name] = OrderedDict([
+                ("min_ms", samples[0]),
+                ("median_ms", samples[len(samples) // 2]),
+                ("max_ms", samples[-1]),
+                ("runs", len(samples)),
+            ])
+    finally:
+        if home is None:
+            os.environ.pop('HOME', None)
+        else:
+            os.environ['HOME'] = home
+        shutil.rmtree(directory)
+    return OrderedDict([("environment", describe_environment()), ("results", results)])
+
+
+def describe_environment():
+    """ Records what the results were measured on, since they're only comparable on the same setup. """
+    from PIL import Image
+    return OrderedDict([
+        ("python", platform.python_version()),
+        ("implementation", platform.python_implementation()),
+        ("platform", platform.platform()),
+        ("machine", platform.machine()),
+        ("pillow", getattr(Image, '__version__', getattr(Image, 'PILLOW_VERSION', None))),
+    ])
+
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD, noise_floor=NOISE_FLOOR_MS):
+    """Compares two runs' medians
+
+    :param baseline: The results of the reference run
+    :param current: The results of the run being checked
+    :param threshold: How much slower, as a fraction of the baseline, counts as a regression
+    :param noise_floor: The smallest slowdown, in milliseconds, that counts as a regression
+    :returns: `(name, baseline ms, current ms, change, regressed)` tuples for the benchmarks both runs have
+
+    """
+    rows = []
+    for name, result in current["results"].items():
+        reference = baseline["results"].get(name)
+        if reference is None:
+            continue
+        change = result["median_ms"] / reference["median_ms"] - 1
+        regressed = change > threshold and result["median_ms"] - reference["median_ms"] > noise_floor
+        rows.append((name, reference["median_ms"], result["median_ms"], change, regressed))
+    return rows
+
+
+def main():
+    """ Runs the suite or compares it against the baseline. """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command')
+    run_parser = subparsers.add_parser('run', help="Run the suite and print (or save) the results as JSON")
+    run_parser.add_argument('--output', help="Where to save the results")
+    compare_parser = subparsers.add_parser('compare', help="Flag regressions against a baseline")
+    compare_parser.add_argument('results', nargs='?', help="A saved run to check. Runs the suite if omitted.")
+    compare_parser.add_argument('--baseline', default=BASELINE_PATH, help="The run to compare against")
+    compare_parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                                help="The slowdown, as a fraction of the baseline, that counts as a regression")
+    compare_parser.add_argument('--noise-floor', type=float, default=NOISE_FLOOR_MS,
+                                help="The smallest slowdown, in milliseconds, that counts as a regression")
+    for subparser in (run_parser, compare_parser):
+        subparser.add_argument('--repeat', type=int, default=10, help="Timed runs per benchmark")
+        subparser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help="The benchmarks to run")
+    args = parser.parse_args()
+    if args.command is None:
+        parser.error("choose 'run' or 'compare'")
+
+    if args.command == 'run':
+        output = json.dumps(run(args.only, args.repeat), indent=2)
+        if args.output:
+            with open(args.output, 'w') as output_file:
+                output_file.write(output + '\n')
+        print(output)
+        return 0
+
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    if args.results:
+        with open(args.results) as results_file:
+            current = json.load(results_file)
+    else:
+        current = run(args.only, args.repeat)
+    if baseline["environment"] != current["environment"]:
+        print("warning: the baseline was measured on a different setup", file=sys.stderr)
+    rows = compare(baseline, current, args.threshold, args.noise_floor)
+    print("{:<20} {:>14} {:>14} {:>9}".format("benchmark", "baseline (ms)", "current (ms)", "change"))
+    for name, reference, median, change, regressed in rows:
+        print("{:<20} {:>14.2f} {:>14.2f} {:>+8.0%}{}".format(name, reference, median, change,
+                                                             "  REGRESSION" if regressed else ""))
+    return 1 if any(row[-1] for row in rows) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
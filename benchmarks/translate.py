@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# pylint: disable=I0011
+
+"""
+Measures how long the lolz dictionary takes to load, and Tranzlator throughput (in words per second) on the
+commit message corpus.
+
+    python -m benchmarks.translate [--passes N]
+"""
+
+from __future__ import unicode_literals, print_function
+
+import argparse
+import json
+import time
+import timeit
+
+from lolologist import lolz
+from lolologist.lolz import Tranzlator, DEFAULT_LOLZ_DB
+from benchmarks.fixtures import load_corpus
+from tests.legacy_lolz import LegacyTranzlator
+
+
+def words_per_second(translate_all, lines, words, passes):
+    """ Times `passes` runs over the corpus. """
+    started = time.time()
+    for _ in range(passes):
+        translate_all(lines)
+    return words * passes / (time.time() - started)
+
+
+def load_json():
+    """ Loads the dictionary the way Tranzlator used to. """
+    with open(DEFAULT_LOLZ_DB, 'r') as db_file:
+        return json.load(db_file)
+
+
+def load_compiled():
+    """ Loads the compiled dictionary, as a new process would. """
+    lolz._LOADED_DBS.clear()
+    return lolz.load_db()
+
+
+def print_load_times():
+    """ Prints the best time to load the dictionary each way. """
+    lolz.load_db()
+    print("{:<28} {:>14}".format("dictionary load", "best (ms)"))
+    for name, load in [("json.load", load_json), ("compiled (new process)", load_compiled),
+                       ("compiled (same process)", lolz.load_db)]:
+        print("{:<28} {:>14.3f}".format(name, min(timeit.repeat(load, number=1, repeat=50)) * 1000))
+    print()
+
+
+def main():
+    """ Prints cold (fresh cache) and warm throughput for each engine. """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--passes', type=int, default=200, help="Warm passes over the corpus")
+    args = parser.parse_args()
+    lines, words = load_corpus()
+    print_load_times()
+
+    legacy, current = LegacyTranzlator(), Tranzlator()
+    engines = [
+        ("legacy translate_sentence", lambda batch: [legacy.translate_sentence(line) for line in batch]),
+        ("translate_sentence", lambda batch: [current.translate_sentence(line) for line in batch]),
+        ("translate_many", lambda batch: list(current.translate_many(batch))),
+    ]
+    print("corpus: {} lines, {} words".format(len(lines), words))
+    print("{:<28} {:>14} {:>14}".format("engine", "cold (w/s)", "warm (w/s)"))
+    for name, translate_all in engines:
+        legacy.cached = {}
+        current.translate_word.cache_clear()
+        cold = words_per_second(translate_all, lines, words, 1)
+        warm = words_per_second(translate_all, lines, words, args.passes)
+        print("{:<28} {:>14,.0f} {:>14,.0f}".format(name, cold, warm))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# pylint: disable=I0011
+
+"""
+Renders macros for existing history from still images, spread across a process pool.
+
+    Aru Sahni <arusahni@gmail.com>
+"""
+
+from __future__ import unicode_literals
+
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import os
+import os.path
+
+from .utils import LRUCache, LolologistError, open_image, write_atomic
+
+# How many renders may be queued per worker process. Keeps memory flat however long the history is.
+TASKS_PER_WORKER = 4
+
+# How many decoded base images each worker process keeps. Backfilling from a directory of thousands of photos would
+# otherwise leave every worker holding all of them.
+MAX_BASE_IMAGES = 4
+
+# Base images recently loaded and scaled by this worker process, by path
+_BASE_IMAGES = LRUCache(MAX_BASE_IMAGES)
+
+def find_images(source):
+    """Lists the still images to render onto
+
+    :param source: An image, or a directory of images
+    :returns: A sorted list of image paths
+
+    """
+    from PIL import Image
+    if os.path.isfile(source):
+        return [source]
+    if not os.path.isdir(source):
+        raise LolologistError("The image source '{}' does not exist.".format(source))
+    Image.init()
+    images = sorted(os.path.join(source, name) for name in os.listdir(source)
+                    if os.path.splitext(name)[1].lower() in Image.EXTENSION)
+    if not images:
+        raise LolologistError("There are no images in '{}'.".format(source))
+    return images
+
+def pick_image(images, revision):
+    """ Picks a base image for a revision. The same revision always gets the same image. """
+    return images[int(revision, 16) % len(images)]
+
+def _get_base_image(path, max_size, resample):
+    """ Loads and scales a base image, reusing it while this worker process still has it, and returns a copy to draw
+    on. """
+    from .lolologist import scale_down
+    key = (path, max_size, resample)
+    image = _BASE_IMAGES.get(key)
+    if image is None:
+        image = open_image(path, max_size)
+        scale_down(image, max_size, resample)
+        _BASE_IMAGES[key] = image
+    return image.copy()
+
+def render_task(task):
+    """Renders and saves one macro. Runs in a worker process.
+
+    :param task: A `(image_path, revision, summary, font, output_path, max_size, resample, encoder_settings)` tuple
+    :returns: The output path, the macro's `(width, height)` and its size in bytes
+
+    """
+    from .encoders import encode_image
+    from .lolologist import ImageMacro
+    image_path, revision, summary, font, output_path, max_size, resample, encoder_settings = task
+    image = ImageMacro(_get_base_image(image_path, max_size, resample), revision, summary, font, max_size=max_size,
+                       resample=resample).render()
+    data = encode_image(image, output_path, encoder_settings)
+    # Written atomically, so an interrupted backfill never leaves a partial image that a resumed one would skip
+    write_atomic(output_path, data, sync=False)
+    return output_path, image.size, len(data)
+
+def run(tasks, jobs=None, on_result=None):
+    """Renders tasks across a process pool, only pulling more tasks from the iterator as renders finish
+
+    :param tasks: An iterator of `render_task` tuples
+    :param jobs: The number of worker processes. Defaults to the number of CPUs.
+    :param on_result: Called with `(task, result, error)` as each render finishes, `result` being what
+        `render_task` returned
+    :returns: A `(rendered, failed)` tuple of counts
+
+    """
+    if not jobs:
+        import multiprocessing
+        jobs = multiprocessing.cpu_count()
+    rendered, failed = 0, 0
+    tasks = iter(tasks)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        in_flight = {}
+        exhausted = False
+        while in_flight or not exhausted:
+            while not exhausted and len(in_flight) < jobs * TASKS_PER_WORKER:
+                try:
+                    task = next(tasks)
+                except StopIteration:
+                    exhausted = True
+                    break
+                in_flight[executor.submit(render_task, task)] = task
+            if not in_flight:
+                break
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = in_flight.pop(future)
+                error = future.exception()
+                if error is None:
+                    rendered += 1
+                else:
+                    failed += 1
+                if on_result:
+                    on_result(task, None if error else future.result(), error)
+    return rendered, failed
@@ -10,37 +10,131 @@ Aru Sahni <arusahni@gmail.com>
 
 from __future__ import unicode_literals
 
+from collections import deque
 from contextlib import contextmanager
+import io
 import os
 import os.path
+import sys
+import threading
+import time
 from shutil import rmtree
-from subprocess import call, STDOUT
+from subprocess import call, Popen, STDOUT
+
+from .utils import LolologistError, open_image
 
 try:
     from subprocess import DEVNULL # pylint:disable=no-name-in-module
 except ImportError:
     DEVNULL = open(os.devnull, 'wb')
 
+# How long (in seconds) a camera session keeps the device open after its last capture
+IDLE_TIMEOUT = 60
+# The time between imagesnap snapshots (in seconds) while a session is open
+SNAPSHOT_INTERVAL = 0.5
+
+# Maps studio-swing (BT.601) luma and chroma to the full range PIL's YCbCr mode expects
+LUMA_TO_FULL_RANGE = [min(255, max(0, int(round((value - 16) * 255 / 219.0)))) for value in range(256)]
+CHROMA_TO_FULL_RANGE = [min(255, max(0, int(round((value - 128) * 255 / 224.0 + 128)))) for value in range(256)]
+
+def _read_exactly(stream, buffer):
+    """ Fills the buffer from the stream, returning `False` if the stream ended first. """
+    view = memoryview(buffer)
+    filled = 0
+    while filled < len(buffer):
+        count = stream.readinto(view[filled:])
+        if not count:
+            return False
+        filled += count
+    return True
+
+def iter_frames(stream):
+    """Reads frames from a YUV4MPEG2 stream until it ends
+
+    Every frame is read into the same buffer, so frames that are skipped are never decoded or copied.
+
+    :param stream: A binary file object positioned at the start of the stream
+    :returns: An iterator of `(width, height, data)` tuples, where `data` is the frame's planar 4:2:0 bytes.
+        `data` is overwritten by the next frame.
+
+    """
+    header = stream.readline().split()
+    if not header or header[0] != b'YUV4MPEG2':
+        raise LolologistError("The camera didn't produce a video stream.")
+    parameters = dict((token[:1], token[1:]) for token in header[1:])
+    try:
+        width, height = int(parameters[b'W']), int(parameters[b'H'])
+    except (KeyError, ValueError):
+        raise LolologistError("The camera's video stream didn't say how big its frames are.")
+    if not parameters.get(b'C', b'420').startswith(b'420'):
+        raise LolologistError("Unsupported camera colorspace: {}".format(parameters[b'C'].decode('ascii')))
+    chroma_size = ((width + 1) // 2) * ((height + 1) // 2)
+    frame = bytearray(width * height + 2 * chroma_size)
+    while True:
+        marker = stream.readline()
+        if not marker:
+            return
+        if not marker.startswith(b'FRAME') or not _read_exactly(stream, frame):
+            raise LolologistError("The camera's video stream was cut short.")
+        yield width, height, frame
+
+def read_last_frame(stream):
+    """Reads a YUV4MPEG2 stream to its end, keeping only the final frame
+
+    :param stream: A binary file object positioned at the start of the stream
+    :returns: A `(width, height, data)` tuple, where `data` is the frame's planar 4:2:0 bytes
+
+    """
+    last = None
+    for last in iter_frames(stream):
+        pass
+    if last is None:
+        raise LolologistError("The camera didn't capture any frames.")
+    return last
+
+def yuv420_to_image(width, height, data):
+    """Converts a planar 4:2:0 frame into an RGB image
+
+    :param width: The frame width
+    :param height: The frame height
+    :param data: The Y, U and V planes
+    :returns: The frame as a PIL `Image`
+
+    """
+    from PIL import Image
+    chroma_dimensions = ((width + 1) // 2, (height + 1) // 2)
+    luma_size = width * height
+    chroma_size = chroma_dimensions[0] * chroma_dimensions[1]
+    luma = Image.frombytes('L', (width, height), bytes(data[:luma_size])).point(LUMA_TO_FULL_RANGE)
+    planes = [luma]
+    for offset in (luma_size, luma_size + chroma_size):
+        plane = Image.frombytes('L', chroma_dimensions, bytes(data[offset:offset + chroma_size]))
+        planes.append(plane.resize((width, height), Image.BILINEAR).point(CHROMA_TO_FULL_RANGE))
+    return Image.merge('YCbCr', planes).convert('RGB')
+
 class Camera(object):
     """A base camera object"""
 
-    def __init__(self, warmup_time, directory='/tmp/lolologist/', device=None):
+    def __init__(self, warmup_time, directory='/tmp/lolologist/', device=None, frame_size=None):
         """A base implementation of the webcam, not directly callable
 
         :param warmup_time: How long to wait until the image gets captured
         :param directory: The temp directory to write to
         :param device: The camera device to use
+        :param frame_size: The `(width, height)` captures are scaled down to, so compressed frames can be
+            decoded at a reduced resolution
 
         """
         self._warmup_time = warmup_time
         self._output_directory = directory
         self._device = device
+        self._frame_size = frame_size
 
     @contextmanager
     def capture_photo(self):
-        """Captures a photo from the camera and provides its path for further processing
+        """Captures a photo from the camera and provides it for further processing
 
-        :returns: The path to the captured image
+        :returns: The captured image, as a PIL `Image`
 
         """
         try:
@@ -74,15 +168,82 @@ class MplayerCamera(Camera): #pylint: disable=R0903
         """
         super(MplayerCamera, self).__init__(warmup_time, **kwargs)
 
-    def _capture(self):
-        """ Captures a photo and provides it for further processing. """
-        params = ['mplayer', 'tv://', '-vo', 'jpeg:outdir={}'.format(self._output_directory), '-frames',
-              str(self._warmup_time)]
+    def _setup(self):
+        """Frames are streamed over a pipe, so there's no temp directory to set up."""
+        pass
+
+    def _cleanup(self):
+        """Frames are streamed over a pipe, so there's no temp directory to clean up."""
+        pass
+
+    def _start(self, frames=None):
+        """Starts mplayer, streaming raw frames to a pipe
+
+        :param frames: How many frames to capture. Streams until killed if `None`
+        :returns: A `(process, stream)` tuple
+
+        """
+        read_fd, write_fd = os.pipe()
+        params = ['mplayer', 'tv://', '-vo', 'yuv4mpeg:file=/dev/fd/{}'.format(write_fd)]
+        if frames is not None:
+            params.extend(['-frames', str(frames)])
         if self._device:
             params.extend(['-tv', 'device={}'.format(self._device)])
-        call(params, stdout=DEVNULL, stderr=STDOUT)
-        # get the last captured frame
-        return os.path.join(self._output_directory, '{0:08d}.jpg'.format(self._warmup_time))
+        # Python 2 has no pass_fds, but doesn't mark pipes close-on-exec either
+        fd_kwargs = {'pass_fds': (write_fd,)} if sys.version_info >= (3,) else {'close_fds': False}
+        try:
+            process = Popen(params, stdout=DEVNULL, stderr=STDOUT, **fd_kwargs)
+        except OSError:
+            os.close(read_fd)
+            raise
+        finally:
+            os.close(write_fd)
+        return process, os.fdopen(read_fd, 'rb')
+
+    def _capture(self):
+        """ Captures a photo and provides it for further processing.
+
+        mplayer streams raw frames to a pipe. The warmup frames are read and discarded, and only the last one
+        is decoded.
+
+        """
+        process, stream = self._start(self._warmup_time)
+        try:
+            frame = read_last_frame(stream)
+        except BaseException:
+            # mplayer may still be writing, and would block on the full pipe forever if it were only waited on
+            stream.close()
+            process.kill()
+            process.wait()
+            raise
+        stream.close()
+        process.wait()
+        return yuv420_to_image(*frame)
+
+    @property
+    def settle_frames(self):
+        """ How many frames a freshly opened device needs before its exposure settles. """
+        return self._warmup_time
+
+    def stream_frames(self):
+        """Keeps the device open, yielding a copy of every frame until the generator is closed
+
+        :returns: An iterator of raw frames, to be passed to `decode_frame`
+
+        """
+        process, stream = self._start()
+        try:
+            for width, height, frame in iter_frames(stream):
+                yield (width, height, bytes(frame))
+        finally:
+            process.kill()
+            stream.close()
+            process.wait()
+
+    @staticmethod
+    def decode_frame(frame):
+        """ Converts a raw frame from `stream_frames` into an image. """
+        return yuv420_to_image(*frame)
 
 
 class ImageSnapCamera(Camera):
@@ -97,9 +258,12 @@ class ImageSnapCamera(Camera):
         super(ImageSnapCamera, self).__init__(warmup_time, **kwargs)
 
     def _capture(self):
-        """Captures a photo using imagesnap and provides the path for further processing
+        """Captures a photo using imagesnap and provides it for further processing
+
+        imagesnap can only write to a file, so the snapshot is loaded into memory before the temp directory is
+        cleaned up.
 
-        :returns: the full path of the captured image
+        :returns: the captured image
 
         """
         outpath = os.path.join(self._output_directory, 'snapshot.jpg')
@@ -108,5 +272,161 @@ class ImageSnapCamera(Camera):
             params.insert(-1, "-d")
             params.insert(-1, self._device)
         call(params, stdout=DEVNULL, stderr=STDOUT)
-        return outpath
+        return open_image(outpath, self._frame_size)
+
+    @property
+    def settle_frames(self):
+        """ imagesnap waits out the warmup itself before its first snapshot. """
+        return 1
+
+    def stream_frames(self, interval=SNAPSHOT_INTERVAL):
+        """Keeps imagesnap running in time-lapse mode, yielding every snapshot until the generator is closed
+
+        Snapshots are read into memory and deleted as soon as they're complete.
+
+        :param interval: The time between snapshots, in seconds
+        :returns: An iterator of encoded snapshots, to be passed to `decode_frame`
+
+        """
+        self._setup()
+        params = ['imagesnap', '-q', '-w', str(self._warmup_time), '-t', str(interval)]
+        if self._device:
+            params.extend(['-d', self._device])
+        process = Popen(params, cwd=self._output_directory, stdout=DEVNULL, stderr=STDOUT)
+        sizes = {}
+        try:
+            while process.poll() is None:
+                time.sleep(interval / 2.0)
+                for name in sorted(os.listdir(self._output_directory)):
+                    path = os.path.join(self._output_directory, name)
+                    size = os.path.getsize(path)
+                    # A snapshot is complete once it stops growing
+                    if size == 0 or sizes.get(name) != size:
+                        sizes[name] = size
+                        continue
+                    with open(path, 'rb') as snapshot:
+                        data = snapshot.read()
+                    os.remove(path)
+                    del sizes[name]
+                    yield data
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+            self._cleanup()
+
+    def decode_frame(self, frame):
+        """ Decodes a snapshot from `stream_frames` into an image. """
+        return open_image(io.BytesIO(frame), self._frame_size)
+
+
+class CameraSession(object):
+    """A camera that stays open between captures
+
+    A background thread keeps the device running and stores its newest frames in a small ring buffer, so a
+    capture returns an exposure-settled frame immediately instead of paying the warmup again. The device is
+    closed after it has gone unused for `idle_timeout` seconds, and reopened on the next capture.
+
+    """
+
+    def __init__(self, camera, idle_timeout=IDLE_TIMEOUT, buffer_size=3, settle_timeout=30):
+        """Wraps a camera in a session
+
+        :param camera: A camera with `stream_frames`, `decode_frame` and `settle_frames`
+        :param idle_timeout: How long (in seconds) to keep the device open after the last capture
+        :param buffer_size: How many of the newest frames to keep
+        :param settle_timeout: How long (in seconds) to wait for the device to produce a settled frame
+
+        """
+        self._camera = camera
+        self._idle_timeout = idle_timeout
+        self._settle_timeout = settle_timeout
+        self._frames = deque(maxlen=buffer_size)
+        self._frame_count = 0
+        self._error = None
+        self._last_used = 0
+        # Captures waiting on a settled frame. The session is never idle while there are any.
+        self._waiting = 0
+        self._running = False
+        self._closing = False
+        self._thread = None
+        self._condition = threading.Condition()
+
+    @property
+    def is_open(self):
+        """ Whether the device is currently running. """
+        return self._running
+
+    def _run(self):
+        """ Reads frames into the ring buffer until the session goes idle or is closed. """
+        frames = self._camera.stream_frames()
+        try:
+            for frame in frames:
+                with self._condition:
+                    self._frames.append(frame)
+                    self._frame_count += 1
+                    self._condition.notify_all()
+                    idle = not self._waiting and time.time() - self._last_used > self._idle_timeout
+                    if self._closing or idle:
+                        break
+        except Exception as exc: #pylint: disable=W0703
+            with self._condition:
+                self._error = exc
+        finally:
+            frames.close()
+            with self._condition:
+                self._running = False
+                self._frames.clear()
+                self._condition.notify_all()
+
+    def latest_frame(self):
+        """Gets the newest settled frame, opening the device if it isn't running
+
+        :returns: The frame as a PIL `Image`
+
+        """
+        with self._condition:
+            self._last_used = time.time()
+            if not self._running:
+                self._frames.clear()
+                self._frame_count, self._error, self._closing = 0, None, False
+                self._running = True
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+            deadline = time.time() + self._settle_timeout
+            self._waiting += 1
+            try:
+                while self._frame_count < self._camera.settle_frames or not self._frames:
+                    if self._error is not None:
+                        raise LolologistError("The camera stopped: {}".format(self._error))
+                    if not self._running:
+                        raise LolologistError("The camera stopped before producing a frame.")
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise LolologistError("Timed out waiting for the camera.")
+                    self._condition.wait(remaining)
+            finally:
+                self._waiting -= 1
+            frame = self._frames[-1]
+            # The idle timeout counts from when the capture got its frame, not from when it asked for one
+            self._last_used = time.time()
+        return self._camera.decode_frame(frame)
+
+    @contextmanager
+    def capture_photo(self):
+        """Provides the newest settled frame, like `Camera.capture_photo`
+
+        :returns: The captured image, as a PIL `Image`
+
+        """
+        yield self.latest_frame()
+
+    def close(self):
+        """ Closes the device, waiting for the reader to finish its current frame. """
+        with self._condition:
+            self._closing = True
+            thread = self._thread
+        if thread is not None:
+            thread.join()
 
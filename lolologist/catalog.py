@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# pylint: disable=I0011
+
+"""
+The macro catalog: an SQLite index of every saved macro, the commit it was made for, and where it was uploaded,
+so finding a macro doesn't mean scanning the output directory.
+
+    Aru Sahni <arusahni@gmail.com>
+"""
+
+from __future__ import unicode_literals
+
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+import os
+import os.path
+import time
+
+# Bump this when the schema changes. A catalog of another version is emptied, for `reindex` to fill again.
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS macros (
+    path TEXT PRIMARY KEY,
+    project TEXT,
+    revision TEXT,
+    time REAL,
+    author TEXT,
+    summary TEXT,
+    width INTEGER,
+    height INTEGER,
+    bytes INTEGER,
+    url TEXT
+);
+CREATE INDEX IF NOT EXISTS macros_revision ON macros (revision);
+CREATE INDEX IF NOT EXISTS macros_project_time ON macros (project, time);
+CREATE INDEX IF NOT EXISTS macros_time ON macros (time);
+"""
+
+COLUMNS = ('path', 'project', 'revision', 'time', 'author', 'summary', 'width', 'height', 'bytes', 'url')
+
+# A catalogued macro. `time` is the commit's, as a `datetime`, and `bytes` the file's size.
+Entry = namedtuple('Entry', COLUMNS)
+
+# How long a write waits for another process's to finish, in seconds
+BUSY_TIMEOUT = 10
+
+def _to_timestamp(value):
+    """ Converts a local `datetime` to a Unix timestamp. """
+    return time.mktime(value.timetuple()) + value.microsecond / 1e6 if value is not None else None
+
+def _to_entry(row):
+    """ Converts a row to an `Entry`. """
+    values = list(row)
+    values[3] = datetime.fromtimestamp(values[3]) if values[3] is not None else None
+    return Entry(*values)
+
+def _find_query(revision, project=None):
+    """ Builds the query `Catalog.find` runs, as a `(query, parameters)` tuple. """
+    # Revisions are stored abbreviated, so a full sha is cut down to match. Prefixes are looked up as a range on the
+    # indexed column, rather than with LIKE, which SQLite won't use the index for.
+    query = "SELECT {} FROM macros WHERE revision >= ? AND revision < ?".format(', '.join(COLUMNS))
+    parameters = [revision[:10], revision[:10] + '\x7f']
+    if project is not None:
+        query += " AND project = ?"
+        parameters.append(project)
+    return query + " ORDER BY time DESC", parameters
+
+def _search_query(text=None, project=None, author=None, since=None, until=None, limit=50):
+    """ Builds the query `Catalog.search` runs, as a `(query, parameters)` tuple. """
+    clauses, parameters = [], []
+    for column, value in (('summary', text), ('author', author)):
+        if value:
+            clauses.append("{} LIKE ? ESCAPE '\\'".format(column))
+            parameters.append('%' + value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+    if project is not None:
+        clauses.append("project = ?")
+        parameters.append(project)
+    if since is not None:
+        clauses.append("time >= ?")
+        parameters.append(_to_timestamp(since))
+    if until is not None:
+        clauses.append("time < ?")
+        parameters.append(_to_timestamp(until))
+    query = "SELECT {} FROM macros".format(', '.join(COLUMNS))
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += " ORDER BY time DESC"
+    if limit is not None:
+        query += " LIMIT ?"
+        parameters.append(limit)
+    return query, parameters
+
+def read_entry(path):
+    """Catalogs a saved macro from the file alone, using the commit embedded in it
+
+    :param path: The macro
+    :returns: An `Entry` without a URL, or `None` if the file isn't an image
+
+    """
+    from PIL import Image
+    from .encoders import read_metadata
+    try:
+        metadata = read_metadata(path) or {}
+        image = Image.open(path)
+        size = image.size
+        image.close()
+        stat = os.stat(path)
+    except (IOError, OSError, SyntaxError):
+        return None
+    return Entry(os.path.abspath(path), metadata.get('project'), metadata.get('revision'),
+                 metadata.get('time') or datetime.fromtimestamp(stat.st_mtime), metadata.get('author'),
+                 metadata.get('summary'), size[0], size[1], stat.st_size, None)
+
+def read_entries(paths, jobs=None):
+    """Catalogs saved macros from their files, several at a time
+
+    :param paths: The macros
+    :param jobs: How many macros are read at once. Defaults to the number of CPUs.
+    :returns: A list of `Entry`s. Files that aren't images are left out.
+
+    """
+    import multiprocessing
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=jobs or multiprocessing.cpu_count()) as executor:
+        return [entry for entry in executor.map(read_entry, paths) if entry is not None]
+
+
+class Catalog(object):
+    """ The SQLite index of saved macros """
+
+    def __init__(self, path):
+        """Opens the catalog, creating it if needed
+
+        :param path: The database file
+
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with self.__connect() as connection:
+            # Write-ahead logging lets searches run while a capture is being recorded
+            connection.execute("PRAGMA journal_mode=WAL")
+            version = connection.execute("PRAGMA user_version").fetchone()[0]
+            if version != SCHEMA_VERSION:
+                connection.execute("DROP TABLE IF EXISTS macros")
+                connection.execute("PRAGMA user_version = {}".format(SCHEMA_VERSION))
+            connection.executescript(SCHEMA)
+
+    @contextmanager
+    def __connect(self):
+        """ Opens a connection for a single transaction. Connections aren't shared, so threads can't trip on each
+        other. """
+        import sqlite3
+        connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+        # With write-ahead logging, this only risks the latest writes on power loss, and saves a sync per write
+        connection.execute("PRAGMA synchronous=NORMAL")
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def add(self, entry):
+        """Records a macro, replacing any earlier record of the same file
+
+        :param entry: An `Entry`. If its `url` is `None`, any URL the file was already recorded with is kept.
+
+        """
+        self.add_many([entry])
+
+    def add_many(self, entries):
+        """ Records several macros in a single transaction. See `add`. """
+        with self.__connect() as connection:
+            self.__insert(connection, entries)
+
+    @staticmethod
+    def __insert(connection, entries):
+        """ Records macros as part of a connection's transaction. """
+        rows = [(os.path.abspath(entry.path),) + tuple(entry[1:3]) + (_to_timestamp(entry.time),) + tuple(entry[4:])
+                for entry in entries]
+        connection.executemany(
+            "INSERT OR REPLACE INTO macros ({columns}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, "
+            "COALESCE(?, (SELECT url FROM macros WHERE path = ?)))".format(columns=', '.join(COLUMNS)),
+            [row + (row[0],) for row in rows])
+
+    def set_url(self, path, url):
+        """Records where a macro was uploaded
+
+        :param path: The macro. If it isn't catalogued yet, the URL is kept for when it is.
+        :param url: Its URL
+
+        """
+        path = os.path.abspath(path)
+        with self.__connect() as connection:
+            if not connection.execute("UPDATE macros SET url = ? WHERE path = ?", (url, path)).rowcount:
+                connection.execute("INSERT INTO macros (path, url) VALUES (?, ?)", (path, url))
+
+    def find(self, revision, project=None):
+        """Finds the macros for a commit
+
+        :param revision: The commit's sha, or the start of it
+        :param project: Only look in this project
+        :returns: The matching `Entry`s, newest first
+
+        """
+        with self.__connect() as connection:
+            rows = connection.execute(*_find_query(revision, project)).fetchall()
+        return [_to_entry(row) for row in rows]
+
+    def search(self, text=None, project=None, author=None, since=None, until=None, limit=50):
+        """Searches the catalog
+
+        :param text: Only include macros whose summary contains this, ignoring case
+        :param project: Only include this project's macros
+        :param author: Only include commits whose author's name contains this, ignoring case
+        :param since: Only include commits made at or after this `datetime`
+        :param until: Only include commits made before this `datetime`
+        :param limit: The most macros to return. `None` returns every match.
+        :returns: The matching `Entry`s, newest first
+
+        """
+        with self.__connect() as connection:
+            rows = connection.execute(*_search_query(text, project, author, since, until, limit)).fetchall()
+        return [_to_entry(row) for row in rows]
+
+    def count(self):
+        """ Gets how many macros are catalogued. """
+        with self.__connect() as connection:
+            return connection.execute("SELECT COUNT(*) FROM macros").fetchone()[0]
+
+    def reindex(self, directory, jobs=None):
+        """Rebuilds the catalog from the macros saved under a directory, reading several at a time
+
+        Upload URLs aren't stored in the files, so those already in the catalog are kept.
+
+        :param directory: The directory to search
+        :param jobs: How many macros are read at once. Defaults to the number of CPUs.
+        :returns: The number of macros catalogued
+
+        """
+        from .timelapse import find_macros
+        entries = read_entries(find_macros(directory), jobs)
+        with self.__connect() as connection:
+            # One transaction, so searches keep seeing the old catalog until the new one is complete, and a failure
+            # part way through leaves the old one as it was
+            connection.execute("BEGIN IMMEDIATE")
+            urls = dict(connection.execute("SELECT path, url FROM macros WHERE url IS NOT NULL"))
+            connection.execute("DELETE FROM macros")
+            self.__insert(connection, [entry._replace(url=urls.get(entry.path)) for entry in entries])
+        return len(entries)
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# pylint: disable=I0011
+
+"""
+A long-lived lolologist process that serves capture requests over a Unix domain socket, along with the
+client used by the post-commit hook. Keep the imports here light; the client runs on every commit.
+
+    Aru Sahni <arusahni@gmail.com>
+"""
+
+from __future__ import unicode_literals
+
+import errno
+import json
+import logging
+import os
+import socket
+import time
+
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver # pylint: disable=import-error
+
+from .utils import LolologistError
+
+LOG = logging.getLogger("lolologist")
+
+# How long (in seconds) the client waits for the daemon to finish a capture
+CLIENT_TIMEOUT = 60
+
+
+class DaemonUnavailableError(LolologistError):
+    """ Raised when no daemon is listening on the socket """
+    pass
+
+
+class _CaptureHandler(socketserver.StreamRequestHandler):
+    """ Handles a single JSON-line capture request """
+
+    def handle(self):
+        """ Reads the request, captures the commit, and writes back the result. """
+        started = time.time()
+        try:
+            request = json.loads(self.rfile.readline().decode('utf-8'))
+            result = self.server.app.capture_commit(request['repository'], request.get('revision', 'HEAD'))
+            response = dict(result, status='ok')
+        except LolologistError as exc:
+            response = {'status': 'error', 'message': exc.message}
+        except Exception as exc: #pylint: disable=W0703
+            LOG.exception("Capture request failed")
+            response = {'status': 'error', 'message': str(exc)}
+        response['elapsed'] = time.time() - started
+        LOG.info("Handled capture request in %.1f ms", response['elapsed'] * 1000)
+        self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+
+class CaptureServer(socketserver.UnixStreamServer):
+    """ Serves capture requests one at a time, sharing a single warm application instance """
+
+    def __init__(self, socket_path, app):
+        """Binds the server to the given socket
+
+        :param socket_path: The path of the Unix domain socket
+        :param app: The `Lolologist` instance that performs the captures
+
+        """
+        self.app = app
+        self.socket_path = socket_path
+        _remove_stale_socket(socket_path)
+        socketserver.UnixStreamServer.__init__(self, socket_path, _CaptureHandler)
+        os.chmod(socket_path, 0o600)
+
+    def server_close(self):
+        """ Closes the server and removes its socket. """
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+def _remove_stale_socket(socket_path):
+    """ Removes a socket left behind by a daemon that has died, refusing to replace a live one. """
+    if not os.path.exists(socket_path):
+        directory = os.path.dirname(socket_path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except socket.error:
+        os.remove(socket_path)
+    else:
+        raise LolologistError("A lolologist daemon is already listening on '{}'.".format(socket_path))
+    finally:
+        probe.close()
+
+def request_capture(socket_path, repository, revision='HEAD', timeout=CLIENT_TIMEOUT):
+    """Asks the daemon to capture a commit
+
+    :param socket_path: The path of the daemon's Unix domain socket
+    :param repository: The full path to the repository
+    :param revision: The revision to capture
+    :param timeout: How long to wait for the capture to finish
+    :returns: The daemon's response, including the time it spent on the request
+    :raises DaemonUnavailableError: If the daemon isn't running
+
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+    try:
+        try:
+            client.connect(socket_path)
+        except socket.error as exc:
+            if exc.errno in (errno.ENOENT, errno.ECONNREFUSED):
+                raise DaemonUnavailableError("No lolologist daemon is listening on '{}'.".format(socket_path))
+            raise
+        request = {'repository': repository, 'revision': revision}
+        client.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        line = client.makefile('rb').readline()
+    except socket.timeout:
+        raise LolologistError("Timed out waiting for the lolologist daemon.")
+    finally:
+        client.close()
+    if not line:
+        raise LolologistError("The lolologist daemon hung up without responding.")
+    response = json.loads(line.decode('utf-8'))
+    if response.get('status') != 'ok':
+        raise LolologistError(response.get('message', "The lolologist daemon failed to capture the commit."))
+    return response
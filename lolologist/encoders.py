@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# pylint: disable=I0011
+
+"""
+Image encoding for lolologist: picking the encoder for an output file, its settings, and comparing encoders.
+
+    Aru Sahni <arusahni@gmail.com>
+"""
+
+from __future__ import unicode_literals
+
+from collections import namedtuple
+from datetime import datetime
+import io
+import os.path
+import re
+import timeit
+
+from .utils import LolologistError
+
+# The encoder settings that can be configured per format, and how each is read from the configuration
+ENCODER_SETTINGS = (
+    ('Quality', 'quality', 'int'),
+    ('Optimize', 'optimize', 'boolean'),
+    ('Progressive', 'progressive', 'boolean'),
+    ('Method', 'method', 'int'),
+    ('Lossless', 'lossless', 'boolean'),
+)
+
+# The encoders `bench-encode` compares: (label, extension, settings)
+PRESETS = (
+    ('jpeg', 'jpg', {}),
+    ('jpeg q85 optimized', 'jpg', {'quality': 85, 'optimize': True}),
+    ('jpeg q85 progressive', 'jpg', {'quality': 85, 'optimize': True, 'progressive': True}),
+    ('webp q80', 'webp', {'quality': 80}),
+    ('webp q80 method 6', 'webp', {'quality': 80, 'method': 6}),
+    ('webp lossless', 'webp', {'lossless': True}),
+    ('avif q60', 'avif', {'quality': 60}),
+    ('png', 'png', {}),
+    ('png optimized', 'png', {'optimize': True}),
+)
+
+# Formats that can carry EXIF, and so the commit a macro was made for
+METADATA_FORMATS = ('JPEG', 'PNG', 'WEBP')
+# The EXIF tags each commit field is kept in
+METADATA_TAGS = (
+    ('project', 0x010D), # DocumentName
+    ('summary', 0x010E), # ImageDescription
+    ('revision', 0x011D), # PageName
+    ('time', 0x0132), # DateTime
+    ('author', 0x013B), # Artist
+)
+EXIF_SOFTWARE = 0x0131
+EXIF_TIME_FORMAT = '%Y:%m:%d %H:%M:%S'
+
+# An extra output saved alongside each macro, e.g. a thumbnail or a copy in another format. `size` is the
+# `(width, height)` it's scaled down to fit in, or `None` to keep the macro's.
+OutputVariant = namedtuple('OutputVariant', ['name', 'extension', 'size'])
+
+_VARIANT_PATTERN = re.compile(r'^(?P<name>\w+):(?P<extension>\w+)(?::(?P<width>\d+)x(?P<height>\d+))?$')
+
+def get_image_format(file_path):
+    """Gets the Pillow format that an output path's extension calls for
+
+    :param file_path: The path the image will be saved to
+    :returns: The format's name, e.g. `JPEG`
+    :raises LolologistError: If Pillow can't write that kind of file
+
+    """
+    from PIL import Image
+    Image.init()
+    extension = os.path.splitext(file_path)[1].lower()
+    image_format = Image.EXTENSION.get(extension)
+    if image_format is None or image_format not in Image.SAVE:
+        raise LolologistError("Pillow can't write '{}' files here.".format(extension))
+    return image_format
+
+def encode_image(image, file_path, settings=None):
+    """Encodes an image in memory, in the format its destination's extension calls for
+
+    :param image: A PIL `Image`
+    :param file_path: Where the image will be saved
+    :param settings: Keyword arguments for the encoder, e.g. `{'quality': 85}`
+    :returns: The encoded image's bytes
+
+    """
+    buffer = io.BytesIO()
+    image.save(buffer, get_image_format(file_path), **(settings or {}))
+    return buffer.getvalue()
+
+def parse_output_variants(text):
+    """Parses the `OutputVariants` setting
+
+    :param text: Comma-separated `name:extension` or `name:extension:WIDTHxHEIGHT` entries, e.g.
+        `thumb:jpg:160x120, dashboard:webp`
+    :returns: A list of `OutputVariant`s
+    :raises LolologistError: If an entry isn't understood, or two share a name
+
+    """
+    variants = []
+    for entry in (text or '').split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        match = _VARIANT_PATTERN.match(entry)
+        if match is None:
+            raise LolologistError("'{}' isn't a valid output variant. Use name:extension[:WIDTHxHEIGHT], e.g. "
+                                  "thumb:jpg:160x120.".format(entry))
+        size = (int(match.group('width')), int(match.group('height'))) if match.group('width') else None
+        if size is not None and 0 in size:
+            raise LolologistError("The output variant '{}' must be at least a pixel wide and tall.".format(entry))
+        if match.group('name') in [variant.name for variant in variants]:
+            raise LolologistError("There's more than one output variant named '{}'.".format(match.group('name')))
+        variants.append(OutputVariant(match.group('name'), match.group('extension'), size))
+    return variants
+
+def _encode_output(image, file_path, size, settings, resample):
+    """ Scales an image down, if need be, and encodes it. """
+    if size is not None:
+        image = image.copy()
+        if resample is None:
+            image.thumbnail(size)
+        else:
+            image.thumbnail(size, resample)
+    return file_path, encode_image(image, file_path, settings), image.size
+
+def encode_outputs(image, outputs, resample=None):
+    """Encodes several outputs of one image at once, e.g. the macro, a thumbnail and a copy in another format
+
+    Pillow releases the GIL while it scales and encodes, so the outputs are encoded on a thread pool.
+
+    :param image: A PIL `Image`
+    :param outputs: `(file_path, size, settings)` tuples. `size` is the `(width, height)` an output is scaled down
+        to fit in, or `None` to keep the image's, and `settings` are keyword arguments for its encoder.
+    :param resample: The filter outputs are scaled down with. Defaults to Pillow's.
+    :returns: A list of `(file_path, data, size)` tuples, in the same order
+
+    """
+    if len(outputs) == 1:
+        return [_encode_output(image, file_path, size, settings, resample) for file_path, size, settings in outputs]
+    from concurrent.futures import ThreadPoolExecutor
+    image.load()
+    with ThreadPoolExecutor(max_workers=len(outputs)) as executor:
+        # Pillow keeps a save's settings on the image being saved, so each output saves an image of its own
+        futures = [executor.submit(_encode_output, image if size is not None else image.copy(), file_path, size,
+                                   settings, resample)
+                   for file_path, size, settings in outputs]
+        return [future.result() for future in futures]
+
+def make_metadata(image_format, commit):
+    """Gets the encoder settings that embed a commit in a macro
+
+    :param image_format: The format the macro is saved in, e.g. `JPEG`
+    :param commit: The commit's fields, as `GitRepository.get_commit` returns them
+    :returns: Keyword arguments for the encoder. Empty if the format (or this Pillow) can't carry EXIF.
+
+    """
+    from PIL import Image
+    if image_format not in METADATA_FORMATS or not hasattr(Image, 'Exif'):
+        return {}
+    exif = Image.Exif()
+    exif[EXIF_SOFTWARE] = 'lolologist'
+    for field, tag in METADATA_TAGS:
+        value = commit.get(field)
+        if isinstance(value, datetime):
+            value = value.strftime(EXIF_TIME_FORMAT)
+        if value:
+            # Pillow writes text tags as ASCII, so anything else is passed through as UTF-8 bytes
+            exif[tag] = value.encode('utf-8')
+    return {'exif': exif.tobytes()}
+
+def read_metadata(file_path):
+    """Reads the commit a macro was made for
+
+    :param file_path: The macro
+    :returns: The commit's `project`, `summary`, `revision`, `time` and `author`, or `None` if the macro doesn't
+        have them (e.g. it predates them, or its format can't carry them)
+    :raises IOError: If the file isn't an image
+
+    """
+    from PIL import Image
+    image = Image.open(file_path)
+    try:
+        exif = image.getexif() if hasattr(image, 'getexif') else {}
+        if exif.get(EXIF_SOFTWARE) != 'lolologist':
+            return None
+        metadata = {}
+        for field, tag in METADATA_TAGS:
+            value = exif.get(tag)
+            if isinstance(value, bytes):
+                value = value.decode('utf-8', 'replace')
+            elif value is not None:
+                try:
+                    value = value.encode('latin-1').decode('utf-8')
+                except (UnicodeEncodeError, UnicodeDecodeError):
+                    pass
+            metadata[field] = value
+        if metadata['time']:
+            try:
+                metadata['time'] = datetime.strptime(metadata['time'], EXIF_TIME_FORMAT)
+            except ValueError:
+                metadata['time'] = None
+        return metadata
+    finally:
+        image.close()
+
+def benchmark(image, presets=PRESETS, repeat=5):
+    """Times each encoder on an image
+
+    :param image: The PIL `Image` to encode
+    :param presets: `(label, extension, settings)` tuples of the encoders to compare
+    :param repeat: How many times each encoder is timed. The best time is kept.
+    :returns: An iterator of `(label, milliseconds, size in bytes)` tuples. Encoders this Pillow lacks are skipped.
+
+    """
+    for label, extension, settings in presets:
+        file_path = 'sample.' + extension
+        try:
+            data = encode_image(image, file_path, settings)
+        except LolologistError:
+            continue
+        timing = min(timeit.repeat(lambda: encode_image(image, file_path, settings), number=1, repeat=repeat))
+        yield label, timing * 1000, len(data)
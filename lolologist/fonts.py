@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# pylint: disable=I0011
+
+"""
+Font handling for lolologist.
+
+    Aru Sahni <arusahni@gmail.com>
+"""
+
+from __future__ import unicode_literals
+
+import json
+import os
+import os.path
+import threading
+
+from . import tracing
+from .utils import LRUCache, write_atomic
+
+# The most font objects (one per path and size) that are kept alive at once. Fitting the bottom text may try a
+# dozen or so sizes of each font.
+MAX_CACHED_FONTS = 64
+
+# Where fonts are installed, most permanent first. Directories that don't exist are skipped.
+FONT_DIRECTORIES = (
+    '/usr/share/fonts',
+    '/usr/local/share/fonts',
+    '/Library/Fonts',
+    '/System/Library/Fonts',
+    os.path.join('~', 'Library', 'Fonts'),
+    os.path.join('~', '.local', 'share', 'fonts'),
+    os.path.join('~', '.fonts'),
+)
+FONT_EXTENSIONS = ('.ttf', '.otf', '.ttc')
+# The styles a bare family name refers to
+REGULAR_STYLES = (None, 'Regular', 'Book', 'Normal', 'Roman')
+
+# The font manifest lives here, next to the compiled lolz dictionaries
+FONT_MANIFEST_PATH = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join('~', '.cache')), 'lolologist',
+                                  'fonts.json')
+
+_FONT_CACHE = LRUCache(MAX_CACHED_FONTS)
+_FONT_CACHE_LOCK = threading.Lock()
+# Glyph advance tables, by the same keys as the fonts they measure
+_ADVANCES_CACHE = LRUCache(MAX_CACHED_FONTS)
+
+# The font index for this process, once it has been validated: {name: path}
+_FONT_INDEX = None
+_FONT_INDEX_LOCK = threading.Lock()
+
+def _get_mtime(path):
+    """ Gets the modification time of a font file, or `None` if Pillow will have to resolve the path. """
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+def get_font(path, size):
+    """Gets a font object, only parsing the font file if it hasn't been loaded at this size already
+
+    :param path: The full path to the font file
+    :param size: The font size, in pixels
+    :returns: The `FreeTypeFont` for the given path and size
+
+    """
+    from PIL import ImageFont
+    key = (path, size, _get_mtime(path))
+    with _FONT_CACHE_LOCK:
+        font = _FONT_CACHE.get(key)
+        if font is None:
+            with tracing.span('font_load'):
+                font = ImageFont.truetype(path, size)
+            _FONT_CACHE[key] = font
+    return font
+
+def measure_text(font, text):
+    """Measures how much room a line of text takes up when drawn at the origin
+
+    :param font: The `FreeTypeFont` to measure with
+    :param text: The text
+    :returns: `(width, height)`, in pixels
+
+    """
+    # Pillow 8 added `getbbox`, and Pillow 10 removed `getsize`. Both include the offset from the origin.
+    if hasattr(font, 'getbbox'):
+        _, _, width, height = font.getbbox(text)
+        return width, height
+    return font.getsize(text)
+
+class GlyphAdvances(object):
+    """ How far each character of a font at one size advances the pen, measured the first time it's needed """
+
+    def __init__(self, font):
+        """Starts an empty table
+
+        :param font: The `FreeTypeFont` to measure
+
+        """
+        self.font = font
+        self.__advances = {}
+        # Pillow 8 added `getlength`, which measures the advance rather than the inked box
+        self.__measure_glyph = getattr(font, 'getlength', None) or (lambda char: font.getsize(char)[0])
+
+    def measure(self, text):
+        """Measures the width of a line of text, ignoring kerning
+
+        :param text: The text
+        :returns: The width, in pixels
+
+        """
+        advances = self.__advances
+        width = 0
+        for char in text:
+            advance = advances.get(char)
+            if advance is None:
+                advance = advances[char] = self.__measure_glyph(char)
+            width += advance
+        return width
+
+def get_advances(path, size):
+    """Gets the glyph advance table for a font at a size, shared by every layout that uses it
+
+    :param path: The full path to the font file
+    :param size: The font size, in pixels
+    :returns: A `GlyphAdvances`
+
+    """
+    key = (path, size, _get_mtime(path))
+    with _FONT_CACHE_LOCK:
+        advances = _ADVANCES_CACHE.get(key)
+    if advances is None:
+        advances = GlyphAdvances(get_font(path, size))
+        with _FONT_CACHE_LOCK:
+            _ADVANCES_CACHE[key] = advances
+    return advances
+
+def preload_fonts(paths, sizes):
+    """Loads every combination of the given fonts and sizes into the cache
+
+    :param paths: The full paths of the fonts to load
+    :param sizes: The font sizes to load each font at
+
+    """
+    for path in paths:
+        for size in sizes:
+            try:
+                get_font(path, size)
+            except IOError:
+                pass
+
+def clear_font_cache():
+    """ Drops every cached font object. """
+    with _FONT_CACHE_LOCK:
+        _FONT_CACHE.clear()
+        _ADVANCES_CACHE.clear()
+
+
+def _read_font_names(path):
+    """ Gets the `(family, style)` of a font file, or `None` if Pillow can't read it. """
+    from PIL import ImageFont
+    try:
+        return ImageFont.truetype(path, 12).getname()
+    except (IOError, OSError, ValueError):
+        return None
+
+def _scan_directory(directory, mtime):
+    """Lists the fonts directly inside a directory
+
+    :param directory: The directory to scan
+    :param mtime: The directory's modification time, which the manifest entry is keyed by
+    :returns: A manifest entry with the directory's `fonts` as `[path, family, style]` lists, and its `subdirectories`
+
+    """
+    fonts, subdirectories = [], []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if os.path.isdir(path):
+            subdirectories.append(path)
+        elif os.path.splitext(name)[1].lower() in FONT_EXTENSIONS:
+            names = _read_font_names(path) or (os.path.splitext(name)[0], None)
+            fonts.append([path, names[0], names[1]])
+    return {"mtime": mtime, "fonts": fonts, "subdirectories": subdirectories}
+
+def _update_manifest(manifest, directory):
+    """Brings the manifest entries for a directory tree up to date, rescanning only directories that changed
+
+    :param manifest: The old manifest, `{directory: entry}`
+    :param directory: The root of the tree
+    :returns: The tree's up-to-date entries, in scan order
+
+    """
+    entries = []
+    pending = [directory]
+    while pending:
+        current = pending.pop(0)
+        try:
+            mtime = os.stat(current).st_mtime
+        except OSError:
+            continue
+        entry = manifest.get(current)
+        if entry is None or entry["mtime"] != mtime:
+            try:
+                entry = _scan_directory(current, mtime)
+            except OSError:
+                continue
+        entries.append((current, entry))
+        pending.extend(entry["subdirectories"])
+    return entries
+
+def _read_manifest(path):
+    """ Loads the font manifest, or returns an empty one if it's missing or corrupt. """
+    try:
+        with open(path, 'rb') as manifest_file:
+            manifest = json.loads(manifest_file.read().decode('utf-8'))
+    except (IOError, OSError, ValueError):
+        return {}
+    return manifest if isinstance(manifest, dict) else {}
+
+def _build_index(entries):
+    """Maps lowercased family names, `family style` names and file names to font paths
+
+    Earlier fonts win, except that a bare family name prefers the family's regular style.
+
+    """
+    index, styled = {}, {}
+    for _, entry in entries:
+        for path, family, style in entry["fonts"]:
+            index.setdefault(os.path.splitext(os.path.basename(path))[0].lower(), path)
+            if style:
+                index.setdefault('{} {}'.format(family, style).lower(), path)
+            if style in REGULAR_STYLES:
+                index.setdefault(family.lower(), path)
+            else:
+                styled.setdefault(family.lower(), path)
+    for family, path in styled.items():
+        index.setdefault(family, path)
+    return index
+
+def load_font_index(directories=None, manifest_path=None):
+    """Gets the index of installed fonts, only rescanning font directories that changed since the last scan
+
+    :param directories: The font directories to index, most permanent first. Defaults to `FONT_DIRECTORIES`.
+    :param manifest_path: Where the scanned fonts are cached between runs. Defaults to `FONT_MANIFEST_PATH`.
+    :returns: A dictionary of lowercased font names to paths
+
+    """
+    directories = FONT_DIRECTORIES if directories is None else directories
+    manifest_path = os.path.expanduser(FONT_MANIFEST_PATH if manifest_path is None else manifest_path)
+    manifest = _read_manifest(manifest_path)
+    entries = []
+    for directory in directories:
+        entries.extend(_update_manifest(manifest, os.path.expanduser(directory)))
+    updated = dict(entries)
+    if updated != manifest:
+        try:
+            manifest_directory = os.path.dirname(manifest_path)
+            if not os.path.isdir(manifest_directory):
+                os.makedirs(manifest_directory)
+            write_atomic(manifest_path, json.dumps(updated).encode('utf-8'), sync=False)
+        except (IOError, OSError):
+            pass # a read-only cache just means scanning again next time
+    return _build_index(entries)
+
+def find_font(name):
+    """Finds an installed font by family (e.g. `Impact`), family and style (e.g. `DejaVu Sans Bold`) or file name
+
+    The font directories are only checked once per process.
+
+    :param name: The font to look for. Case doesn't matter.
+    :returns: The full path to the font, or `None` if it isn't installed
+
+    """
+    global _FONT_INDEX
+    with _FONT_INDEX_LOCK:
+        if _FONT_INDEX is None:
+            _FONT_INDEX = load_font_index()
+        return _FONT_INDEX.get(name.lower())
+
+def clear_font_index():
+    """ Forgets this process's font index, so the next lookup checks the font directories again. """
+    global _FONT_INDEX
+    with _FONT_INDEX_LOCK:
+        _FONT_INDEX = None
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# pylint: disable=I0011
+
+"""
+A minimal reader for git commits. It resolves refs and reads commit objects straight from the repository, so
+the common case of describing HEAD doesn't pay for starting GitPython. Anything it doesn't handle raises
+`Unsupported`, and the caller falls back to GitPython.
+
+    Aru Sahni <arusahni@gmail.com>
+"""
+
+from __future__ import unicode_literals
+
+from collections import namedtuple
+import os
+import os.path
+import re
+import zlib
+from subprocess import CalledProcessError, check_output
+
+from .utils import LolologistError
+
+SHA_PATTERN = re.compile(r'^[0-9a-f]{40}$')
+
+# How many symbolic refs are followed before giving up, as git does
+MAX_SYMREF_DEPTH = 5
+
+# Where a repository keeps things: the top of its work tree, its git directory, and the directory it shares
+# objects and refs with (which differs from `git_dir` in linked work trees)
+Layout = namedtuple('Layout', ['work_tree', 'git_dir', 'common_dir'])
+
+# The commit fields lolologist uses. `committed_date` is a Unix timestamp, and `author` the author's name.
+Commit = namedtuple('Commit', ['hexsha', 'summary', 'message', 'committed_date', 'author'])
+
+class Unsupported(LolologistError):
+    """ The repository or revision needs something only GitPython handles """
+    pass
+
+def _read_text(path):
+    """ Reads a small text file, or returns `None` if it doesn't exist. """
+    try:
+        with open(path, 'rb') as text_file:
+            return text_file.read().decode('utf-8').strip()
+    except (IOError, OSError):
+        return None
+
+def find_repository(path):
+    """Finds the repository a path is in
+
+    :param path: A path inside a work tree
+    :returns: The repository's `Layout`
+    :raises Unsupported: If the path isn't in a work tree this reader understands (e.g. a bare repository)
+
+    """
+    current = os.path.abspath(path)
+    if not os.path.isdir(current):
+        raise Unsupported("'{}' isn't a directory.".format(path))
+    while True:
+        dot_git = os.path.join(current, '.git')
+        if os.path.isdir(dot_git):
+            git_dir = dot_git
+            break
+        if os.path.isfile(dot_git):
+            # Linked work trees and submodules point at their git directory
+            pointer = _read_text(dot_git) or ''
+            if not pointer.startswith('gitdir:'):
+                raise Unsupported("'{}' isn't a git directory pointer.".format(dot_git))
+            git_dir = os.path.normpath(os.path.join(current, pointer[len('gitdir:'):].strip()))
+            break
+        parent = os.path.dirname(current)
+        if parent == current:
+            raise Unsupported("'{}' isn't in a git work tree.".format(path))
+        current = parent
+    common_dir = _read_text(os.path.join(git_dir, 'commondir'))
+    common_dir = os.path.normpath(os.path.join(git_dir, common_dir)) if common_dir else git_dir
+    if not os.path.isfile(os.path.join(git_dir, 'HEAD')):
+        raise Unsupported("'{}' isn't a git directory.".format(git_dir))
+    # Grafts and replacements change which commit a sha names
+    if os.path.exists(os.path.join(common_dir, 'info', 'grafts')) or \
+            os.path.isdir(os.path.join(common_dir, 'refs', 'replace')):
+        raise Unsupported("Commits in '{}' are grafted or replaced.".format(git_dir))
+    return Layout(current, git_dir, common_dir)
+
+def _read_packed_ref(layout, name):
+    """ Looks a ref up in `packed-refs`. """
+    try:
+        with open(os.path.join(layout.common_dir, 'packed-refs'), 'rb') as packed_refs:
+            for line in packed_refs:
+                line = line.decode('utf-8').strip()
+                if line.startswith('#') or line.startswith('^'):
+                    continue
+                sha, _, ref = line.partition(' ')
+                if ref == 'refs/replace' or ref.startswith('refs/replace/'):
+                    raise Unsupported("Commits in '{}' are replaced.".format(layout.git_dir))
+                if ref == name:
+                    return sha
+    except (IOError, OSError):
+        pass
+    return None
+
+def resolve(layout, revision='HEAD'):
+    """Resolves a revision to a commit sha
+
+    :param layout: The repository's `Layout`
+    :param revision: `HEAD`, a full ref name such as `refs/heads/master`, or a full sha
+    :returns: The 40 character sha
+    :raises Unsupported: For any other kind of revision, or a ref that can't be resolved
+
+    """
+    name = revision
+    for _ in range(MAX_SYMREF_DEPTH):
+        if SHA_PATTERN.match(name):
+            return name
+        if name != 'HEAD' and not name.startswith('refs/'):
+            raise Unsupported("'{}' needs GitPython to resolve.".format(revision))
+        # HEAD belongs to the work tree. Everything else is shared between work trees.
+        directory = layout.git_dir if name == 'HEAD' else layout.common_dir
+        value = _read_text(os.path.join(directory, name))
+        if value is None:
+            value = _read_packed_ref(layout, name)
+        if value is None:
+            raise Unsupported("'{}' doesn't exist.".format(name))
+        name = value[len('ref:'):].strip() if value.startswith('ref:') else value
+    raise Unsupported("'{}' refers to too many refs.".format(revision))
+
+def read_object(layout, sha):
+    """Reads a raw commit object
+
+    Loose objects are inflated in-process. Packed ones are read with a single `git cat-file`.
+
+    :param layout: The repository's `Layout`
+    :param sha: The commit's sha
+    :returns: The commit object's contents, without the object header
+
+    """
+    path = os.path.join(layout.common_dir, 'objects', sha[:2], sha[2:])
+    try:
+        with open(path, 'rb') as loose:
+            data = zlib.decompress(loose.read())
+    except (IOError, OSError):
+        try:
+            with open(os.devnull, 'wb') as devnull:
+                return check_output(['git', '--git-dir', layout.git_dir, 'cat-file', 'commit', sha], stderr=devnull)
+        except (CalledProcessError, OSError):
+            raise Unsupported("The commit {} couldn't be read.".format(sha))
+    except zlib.error:
+        raise Unsupported("The object {} is corrupt.".format(sha))
+    header, _, body = data.partition(b'\0')
+    if not header.startswith(b'commit '):
+        raise Unsupported("{} isn't a commit.".format(sha))
+    return body
+
+def parse_commit(sha, data):
+    """Gets the fields lolologist uses from a raw commit object
+
+    :param sha: The commit's sha
+    :param data: The object's contents
+    :returns: A `Commit`
+
+    """
+    headers, _, message = data.partition(b'\n\n')
+    committed_date, author, encoding = None, b'', 'utf-8'
+    for line in headers.split(b'\n'):
+        if line.startswith(b'committer '):
+            committed_date = int(line.rsplit(b' ', 2)[1])
+        elif line.startswith(b'author '):
+            author = line[len(b'author '):].rsplit(b' <', 1)[0]
+        elif line.startswith(b'encoding '):
+            encoding = line[len(b'encoding '):].decode('ascii').strip()
+    if committed_date is None:
+        raise Unsupported("The commit {} has no committer.".format(sha))
+    try:
+        message, author = message.decode(encoding, 'replace'), author.decode(encoding, 'replace')
+    except LookupError:
+        message, author = message.decode('utf-8', 'replace'), author.decode('utf-8', 'replace')
+    return Commit(sha, message.split('\n', 1)[0], message, committed_date, author)
+
+def read_commit(layout, revision='HEAD'):
+    """Reads a commit without GitPython
+
+    :param layout: The repository's `Layout`
+    :param revision: The revision to read. See `resolve`.
+    :returns: A `Commit`
+    :raises Unsupported: If GitPython is needed
+
+    """
+    sha = resolve(layout, revision)
+    return parse_commit(sha, read_object(layout, sha))
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# pylint: disable=I0011
+
+"""
+Text layout for lolologist: wrapping text by its rendered width, and finding the largest font size it fits at.
+
+    Aru Sahni <arusahni@gmail.com>
+"""
+
+from __future__ import unicode_literals
+
+from collections import namedtuple
+
+from .fonts import get_advances
+
+ELLIPSIS = '\u2026'
+
+# The font sizes text may be laid out at, smallest first. Stepping by a few pixels keeps the number of fonts
+# loaded (and cached) small without a visible difference.
+FONT_SIZES = tuple(range(16, 73, 4))
+
+# Text laid out in lines at a font size. `truncated` is set if it didn't fit even at the smallest size.
+Layout = namedtuple('Layout', ['lines', 'font_size', 'truncated'])
+
+def _longest_prefix(word, width, measure):
+    """ Gets the longest start of a word that fits in the width. It's at least one character long. """
+    fitted = 0
+    for end in range(1, len(word) + 1):
+        if measure(word[:end]) > width:
+            break
+        fitted = end
+    return word[:max(fitted, 1)]
+
+def wrap(text, width, measure, max_lines=None):
+    """Wraps text into lines no wider than a number of pixels
+
+    Words are kept whole unless they're wider than a line on their own, in which case they're broken wherever
+    they have to be.
+
+    :param text: The text to wrap
+    :param width: The widest a line may be, in pixels
+    :param measure: A function that measures a string's width in pixels
+    :param max_lines: Stops wrapping once there's one line more than this, as the text won't fit anyway
+    :returns: The lines
+
+    """
+    lines = []
+    line, line_width = '', 0
+    space = measure(' ')
+    for word in text.split():
+        word_width = measure(word)
+        if line and line_width + space + word_width <= width:
+            line, line_width = line + ' ' + word, line_width + space + word_width
+            continue
+        if line:
+            lines.append(line)
+        while word_width > width and len(word) > 1:
+            head = _longest_prefix(word, width, measure)
+            lines.append(head)
+            word = word[len(head):]
+            word_width = measure(word)
+        line, line_width = word, word_width
+        if max_lines is not None and len(lines) > max_lines:
+            return lines
+    if line:
+        lines.append(line)
+    return lines
+
+def truncate(lines, max_lines, width, measure):
+    """Cuts lines down to a maximum, ending the last one with an ellipsis
+
+    :param lines: The wrapped lines
+    :param max_lines: The most lines to keep
+    :param width: The widest a line may be, in pixels
+    :param measure: A function that measures a string's width in pixels
+    :returns: The lines that are kept
+
+    """
+    if len(lines) <= max_lines:
+        return lines
+    last = lines[max_lines - 1]
+    while last and measure(last + ELLIPSIS) > width:
+        last = last[:-1]
+    return lines[:max_lines - 1] + [last.rstrip() + ELLIPSIS]
+
+def fit(text, font_path, width, height, max_lines, sizes=FONT_SIZES):
+    """Lays text out at the largest font size at which it fits in a box, in no more than a number of lines
+
+    :param text: The text to lay out
+    :param font_path: The full path to the font
+    :param width: The width of the box, in pixels
+    :param height: The height of the box, in pixels. Lines are spaced one font size apart.
+    :param max_lines: The most lines the text may take up
+    :param sizes: The font sizes to choose from, smallest first
+    :returns: A `Layout`. Text that doesn't fit at the smallest size is truncated with an ellipsis.
+
+    """
+    best = None
+    low, high = 0, len(sizes) - 1
+    while low <= high:
+        middle = (low + high) // 2
+        size = sizes[middle]
+        lines = wrap(text, width, get_advances(font_path, size).measure, max_lines)
+        if len(lines) <= max_lines and len(lines) * size <= height:
+            best = Layout(lines, size, False)
+            low = middle + 1
+        else:
+            high = middle - 1
+    if best is not None:
+        return best
+    measure = get_advances(font_path, sizes[0]).measure
+    lines = wrap(text, width, measure, max_lines)
+    return Layout(truncate(lines, max_lines, width, measure), sizes[0], len(lines) > max_lines)
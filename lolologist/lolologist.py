@@ -16,27 +16,52 @@ lolologist - an automated image macro generator for your commits. Simply tack it
 from __future__ import unicode_literals, print_function
 
 import configparser
-import argparse, os, textwrap, sys, logging
-from PIL import Image, ImageFont, ImageDraw
-from subprocess import CalledProcessError, check_output, STDOUT
-
-from .lolz import Tranzlator
-
-from .cameras import MplayerCamera, ImageSnapCamera
-from .utils import LolologistError, upload
-from .repository import GitRepository
+import argparse, os, sys, logging, threading, time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from subprocess import CalledProcessError, check_output, Popen
+
+# Pillow, GitPython, requests and friends are imported by the code paths that need them, so that
+# configuration-only commands start quickly. tests/test_startup.py enforces this.
+from .cameras import MplayerCamera, ImageSnapCamera, CameraSession, DEVNULL, IDLE_TIMEOUT
+from .encoders import ENCODER_SETTINGS, encode_outputs, get_image_format, make_metadata, parse_output_variants
+from . import tracing
+from .utils import LRUCache, LolologistError, open_image, write_atomic
 
 LOG = logging.getLogger("lolologist")
 
 # Maximum width and height of the rendered image (in pixels). These MUST be floats.
 MAX_WIDTH = 640.0
 MAX_HEIGHT = 480.0
+# The filter images are scaled down with. Any of Pillow's filters, by name (e.g. `bicubic`).
+DEFAULT_RESAMPLE = 'antialias'
+RESAMPLE_FILTERS = ('nearest', 'box', 'bilinear', 'hamming', 'bicubic', 'lanczos', 'antialias')
 
 MAX_LINES = 3
+TOP_FONT_SIZE = 32
+# The bottom text is sized to fit this share of the image's height, inside these margins (in pixels)
+BOTTOM_TEXT_HEIGHT = 0.4
+BOTTOM_MARGIN = 15
+SIDE_MARGIN = 10
 STROKE_COLOR = (0, 0, 0)
+STROKE_WIDTH = 3
 TEXT_COLOR = (255, 255, 255)
 FALLBACK_FONT = "LeagueGothic-Regular.otf" # Change in setup.py, too
 DEFAULT_UPLOAD_URL = 'http://uploads.im/api?upload'
+DEFAULT_SPOOL_DIRECTORY = os.path.join('~', '.lolologist', '.spool')
+DEFAULT_DAEMON_SOCKET = os.path.join('~', '.lolologist', '.daemon.sock')
+DEFAULT_UPLOAD_SPOOL_DIRECTORY = os.path.join('~', '.lolologist', '.uploads')
+DEFAULT_TRACE_LOG = os.path.join('~', '.lolologist', 'trace.jsonl')
+DEFAULT_CATALOG = os.path.join('~', '.lolologist', 'catalog.sqlite')
+
+# Configuration files already parsed by this process, by path: {path: (signature, ConfigParser)}
+_LOADED_CONFIGS = {}
+
+# The most rasterized lines of text kept for reuse, and the cache itself: {(font, size, text, stroke): overlay}
+MAX_TEXT_OVERLAYS = 64
+_TEXT_OVERLAYS = LRUCache(MAX_TEXT_OVERLAYS)
+_TEXT_OVERLAYS_LOCK = threading.Lock()
 
 CURRENT_PLATFORM = 0
 PLATFORM_LINUX = 1
@@ -46,6 +71,14 @@ POST_COMMIT_FILE = """#!/bin/sh
 lolologist capture
 """
 
+POST_COMMIT_DETACHED_FILE = """#!/bin/sh
+lolologist capture --detach
+"""
+
+POST_COMMIT_DAEMON_FILE = """#!/bin/sh
+lolologist capture --daemon
+"""
+
 def detect_platform():
     """ Detects which platform is currently being used."""
     global CURRENT_PLATFORM
@@ -73,60 +106,213 @@ def is_osx():
     return CURRENT_PLATFORM == PLATFORM_OSX
 
 
+def get_font_path(font):
+    """Resolves a configured font to a full path
+
+    :param font: The configured font. Relative paths are relative to the lolologist package
+    :returns: The full path to the font
+
+    """
+    return os.path.join(os.path.dirname(__file__), font)
+
+
+def get_resample_filter(name):
+    """Resolves the name of a resampling filter
+
+    :param name: The name of one of Pillow's filters, e.g. `antialias` or `bicubic`
+    :returns: The Pillow filter
+
+    """
+    from PIL import Image
+    name = name.lower()
+    # Pillow 10 removed `ANTIALIAS`, which was always another name for `LANCZOS`
+    if name == 'antialias':
+        name = 'lanczos'
+    resample = getattr(Image, name.upper(), None) if name in RESAMPLE_FILTERS else None
+    if resample is None:
+        raise LolologistError("'{}' isn't a resampling filter this version of Pillow supports.".format(name))
+    return resample
+
+def scale_down(image, max_size=(MAX_WIDTH, MAX_HEIGHT), resample=DEFAULT_RESAMPLE):
+    """If the image is bigger than desired, scale it down in place (maintain the aspect ratio)
+
+    :param image: A PIL `Image`
+    :param max_size: The `(width, height)` the image has to fit in. These MUST be floats.
+    :param resample: The name of the resampling filter to scale with
+
+    """
+    max_width, max_height = max_size
+    if image.size[0] > max_width or image.size[1] > max_height:
+        scaling_ratio = min(max_width/image.size[0], max_height/image.size[1])
+        image.thumbnail((scaling_ratio * image.size[0], scaling_ratio * image.size[1]),
+                        get_resample_filter(resample))
+
+
 class ImageMacro(object):
     """ An image macro """
-    def __init__(self, image, top, bottom, font):
-        """ Initializes the macro with a base image, two lines of text and an optional font """
-        self.font = os.path.join(os.path.dirname(__file__), font)
+    def __init__(self, image, top, bottom, font, max_size=(MAX_WIDTH, MAX_HEIGHT), resample=DEFAULT_RESAMPLE):
+        """ Initializes the macro with a base image (a path or a PIL `Image`, which is drawn on in place), two
+        lines of text, an optional font, and the size (and filter) the image is scaled down to """
+        self.font = get_font_path(font)
+        self.max_size = max_size
+        self.resample = resample
         self.top_text = top
-        self.bottom_text = textwrap.wrap(bottom, 30)
-        if len(self.bottom_text) > MAX_LINES:
-            self.bottom_text[MAX_LINES - 1] = self.bottom_text[MAX_LINES - 1] + '\u2026' #pylint: disable=W1402
-        self.image_path = image
+        self.summary = bottom
+        # The bottom text's lines and font size, once it has been laid out to fit the image
+        self.bottom_text = []
+        self.bottom_font_size = None
+        # Layouts of the bottom text, by the size of the image they were laid out for
+        self.__layouts = {}
+        self.image = image
         self.size = (0, 0)
 
     def render(self):
         """ Returns the rendered macro. """
-        image = Image.open(self.image_path)
+        return self.__render_onto(self.__open(self.image))
+
+    def render_many(self, images):
+        """Renders the macro onto several base frames
 
-        # If the image is bigger than desired, scale it down (maintain the aspect ratio)
-        if image.size[0] > MAX_WIDTH or image.size[1] > MAX_HEIGHT:
-            scaling_ratio = min(MAX_WIDTH/image.size[0], MAX_HEIGHT/image.size[1])
-            image.thumbnail((scaling_ratio * image.size[0], scaling_ratio * image.size[1]), Image.ANTIALIAS)
+        The text is laid out once per frame size, and each line is rasterized once and composited onto every
+        frame, so a batch costs little more than its decoding and compositing.
+
+        :param images: The base frames: paths, or PIL `Image`s (which are drawn on in place)
+        :returns: An iterator of the rendered macros, in order
+
+        """
+        for image in images:
+            yield self.__render_onto(self.__open(image))
+
+    def __open(self, image):
+        """ Opens a base frame, unless it's already a PIL `Image`. """
+        from PIL import Image
+        return image if isinstance(image, Image.Image) else open_image(image, self.max_size)
+
+    def __render_onto(self, image):
+        """ Draws the text onto a base frame. """
+        scale_down(image, self.max_size, self.resample)
 
         self.size = image.size
-        top_font_size = 32
-        bottom_font_size = 48
+        top_font_size = TOP_FONT_SIZE
+        layout = self.__layouts.get(self.size)
+        if layout is None:
+            layout = self.__layouts[self.size] = self.layout_bottom_text(self.size)
+        self.bottom_text, self.bottom_font_size = layout.lines, layout.font_size
+        bottom_font_size = layout.font_size
 
         top_dimensions = self.__get_text_dimensions(self.top_text, top_font_size)
         top_position = (self.size[0] - 5 - top_dimensions[0], 3)
 
-        draw = ImageDraw.Draw(image)
-        self.__draw_image(draw, self.top_text, top_font_size, top_position)
+        self.__draw_image(image, self.top_text, top_font_size, top_position)
 
-        lines = min(len(self.bottom_text), MAX_LINES)
+        lines = len(self.bottom_text)
 
         for row in range(lines):
-            bottom_offset = ((lines - 1 - row) * bottom_font_size) + 15
+            bottom_offset = ((lines - 1 - row) * bottom_font_size) + BOTTOM_MARGIN
             bottom_dimensions = self.__get_text_dimensions(self.bottom_text[row], bottom_font_size)
             bottom_position = (self.size[0]/2 - bottom_dimensions[0]/2,
                     self.size[1] - bottom_offset - bottom_dimensions[1])
-            self.__draw_image(draw, self.bottom_text[row], bottom_font_size, bottom_position)
+            self.__draw_image(image, self.bottom_text[row], bottom_font_size, bottom_position)
 
         return image
 
-    def __draw_image(self, draw, text, font_size, position, stroke_width=3):
+    def layout_bottom_text(self, size):
+        """Wraps the bottom text at the largest font size that fits it in `MAX_LINES` across the image
+
+        :param size: The `(width, height)` of the image being drawn on
+        :returns: A `layout.Layout`
+
+        """
+        from .layout import fit
+        with tracing.span('layout'):
+            return fit(self.summary, self.font, size[0] - 2 * SIDE_MARGIN, size[1] * BOTTOM_TEXT_HEIGHT, MAX_LINES)
+
+    def __draw_image(self, image, text, font_size, position, stroke_width=STROKE_WIDTH):
         """ Draws the text with the given attributes to the image. """
-        font = ImageFont.truetype(self.font, font_size)
-        for x_off in range(-stroke_width, stroke_width + 1):
-            for y_off in range(-stroke_width, stroke_width + 1):
-                draw.text((position[0] + x_off, position[1] + y_off), text, STROKE_COLOR, font=font)
-        draw.text(position, text, TEXT_COLOR, font=font)
+        mask, outline = get_text_overlay(self.font, font_size, text, stroke_width)
+        origin = (int(position[0]) - stroke_width, int(position[1]) - stroke_width)
+        image.paste(STROKE_COLOR, origin, outline)
+        image.paste(TEXT_COLOR, origin, mask)
 
-    def __get_text_dimensions(self, text, font_size):
+    def __get_text_dimensions(self, text, font_size, stroke_width=STROKE_WIDTH):
         """ Gets the measurements of text rendered at a specific font size. """
-        font = ImageFont.truetype(self.font, font_size)
-        return font.getsize(text)
+        mask, _ = get_text_overlay(self.font, font_size, text, stroke_width)
+        return mask.size[0] - 2 * stroke_width, mask.size[1] - 2 * stroke_width
+
+
+def get_text_overlay(font_path, font_size, text, stroke_width=STROKE_WIDTH):
+    """Rasterizes a line of text, reusing the result if the same text has been drawn at the same size before
+
+    The glyphs are rasterized once into a mask, which is dilated to produce the outline. Both are then composited
+    onto each image the text is drawn on.
+
+    :param font_path: The full path to the font
+    :param font_size: The font size, in pixels
+    :param text: The line of text
+    :param stroke_width: How thick the outline is, in pixels
+    :returns: `(mask, outline)`, `L` mode images padded by `stroke_width` on every side
+
+    """
+    from PIL import Image, ImageDraw, ImageFilter
+    from .fonts import get_font, measure_text
+    key = (font_path, font_size, text, stroke_width)
+    with _TEXT_OVERLAYS_LOCK:
+        overlay = _TEXT_OVERLAYS.get(key)
+    if overlay is None:
+        font = get_font(font_path, font_size)
+        width, height = measure_text(font, text)
+        mask = Image.new('L', (width + 2 * stroke_width, height + 2 * stroke_width), 0)
+        ImageDraw.Draw(mask).text((stroke_width, stroke_width), text, 255, font=font)
+        outline = mask.filter(ImageFilter.MaxFilter(2 * stroke_width + 1)) if stroke_width > 0 else mask
+        overlay = (mask, outline)
+        with _TEXT_OVERLAYS_LOCK:
+            _TEXT_OVERLAYS[key] = overlay
+    return overlay
+
+def clear_text_overlays():
+    """ Drops every cached text overlay. """
+    with _TEXT_OVERLAYS_LOCK:
+        _TEXT_OVERLAYS.clear()
+
+
+def _parse_config(path):
+    """ Parses a configuration file. """
+    config = configparser.ConfigParser()
+    config.read(path)
+    return config
+
+def _read_config(path):
+    """ Gets the parsed configuration file, only parsing it again if it has changed since it was last read. """
+    try:
+        stat = os.stat(path)
+        signature = (stat.st_mtime, stat.st_size, stat.st_ino)
+    except OSError:
+        signature = None
+    cached = _LOADED_CONFIGS.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    config = _parse_config(path)
+    _LOADED_CONFIGS[path] = (signature, config)
+    return config
+
+def _write_config(path, config):
+    """ Replaces the configuration file in a single step. Callers must hold the configuration lock. """
+    import io
+    contents = io.StringIO()
+    config.write(contents)
+    write_atomic(path, contents.getvalue().encode('utf-8'))
+    _LOADED_CONFIGS.pop(path, None)
+
+@contextmanager
+def _config_lock(path):
+    """ Serializes changes to a configuration file across processes. """
+    import fcntl
+    with open(path + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
 
 
 class Config(object): #pylint: disable=R0903
@@ -136,29 +322,31 @@ class Config(object): #pylint: disable=R0903
         self.config_file = os.path.expanduser('~/.lolologistrc')
         if not os.path.isfile(self.config_file):
             self.__create_config()
-        config = configparser.ConfigParser()
-        config.read(self.config_file)
-        if section not in config:
-            self.__section = "DEFAULT"
-        else:
-            self.__section = section
-        self.__parser = config[self.__section]
+        self.__requested_section = section
+
+    @property
+    def __parser(self):
+        """ The configured section, re-read if the file has changed since it was last parsed. """
+        config = _read_config(self.config_file)
+        return config[self.__requested_section if self.__requested_section in config else "DEFAULT"]
 
     def __create_config(self):
         """ Creates the file with acceptable defaults """
-        config = configparser.ConfigParser()
-        config['DEFAULT'] = {
-            "OutputDirectory" : os.path.join(os.path.expanduser('~'), '.lolologist', '{project}'),
-            "OutputFileName" : '{revision}',
-            "OutputFormat" : 'jpg',
-        }
-
-        font_path = get_impact()
-        if font_path:
-            config['DEFAULT']['FontPath'] = font_path
-
-        with open(self.config_file, 'w') as config_file:
-            config.write(config_file)
+        with _config_lock(self.config_file):
+            if os.path.isfile(self.config_file):
+                return
+            config = configparser.ConfigParser()
+            config['DEFAULT'] = {
+                "OutputDirectory" : os.path.join(os.path.expanduser('~'), '.lolologist', '{project}'),
+                "OutputFileName" : '{revision}',
+                "OutputFormat" : 'jpg',
+            }
+
+            font_path = get_impact()
+            if font_path:
+                config['DEFAULT']['FontPath'] = font_path
+
+            _write_config(self.config_file, config)
 
     def __getitem__(self, field):
         """ Gets the value of a specific field """
@@ -168,6 +356,33 @@ class Config(object): #pylint: disable=R0903
         """ Required for Lintin'"""
         return len(self.__parser)
 
+    def get_output_path(self, variant=None, **commit):
+        """Gets where the macro for a commit is saved
+
+        :param variant: The `OutputVariant` to get the path of instead. It's named from `OutputFileName` too, with
+            `{variant}` filled in with its name, or its name added on if the template doesn't say where it goes.
+        :param commit: The commit's fields, which the `Output*` settings may refer to
+        :returns: The full path of the image
+
+        """
+        file_name, extension = self.__parser['OutputFileName'], self.__parser["OutputFormat"]
+        if variant is not None:
+            extension = variant.extension
+            if '{variant' not in file_name:
+                file_name += '.{variant}'
+        return os.path.join(self.__parser['OutputDirectory'], file_name).format(
+            variant=variant.name if variant is not None else '', **commit
+        ) + '.' + extension
+
+    def get_output_variants(self):
+        """Gets the extra outputs saved alongside each macro
+
+        :returns: A list of `OutputVariant`s
+        :raises LolologistError: If `OutputVariants` isn't understood
+
+        """
+        return parse_output_variants(self.__parser.get('OutputVariants'))
+
     def get_font(self):
         """ Gets the configuration entry for the macro font. """
         font = self.__parser.get('FontPath', FALLBACK_FONT)
@@ -175,6 +390,24 @@ class Config(object): #pylint: disable=R0903
             LOG.warning("No font found. Using fallback. Run `lolologist setfont --help` for more information.")
         return font
 
+    def get_encoder_settings(self, image_format):
+        """Gets the configured encoder settings for an image format, e.g. `JpegQuality` and `JpegProgressive`
+
+        :param image_format: The Pillow format, e.g. `JPEG` or `WEBP`
+        :returns: Keyword arguments for the encoder. Settings that aren't configured are left to Pillow.
+
+        """
+        settings = {}
+        for suffix, argument, kind in ENCODER_SETTINGS:
+            setting = image_format.capitalize() + suffix
+            if setting in self.__parser:
+                try:
+                    settings[argument] = getattr(self.__parser, 'get' + kind)(setting)
+                except ValueError:
+                    raise LolologistError("'{}' isn't a valid {} for {}.".format(
+                        self.__parser[setting], 'number' if kind == 'int' else "'on' or 'off'", setting))
+        return settings
+
     def get_camera(self):
         """Gets the configuration entry for the active camera device
 
@@ -183,32 +416,57 @@ class Config(object): #pylint: disable=R0903
         """
         return self.__parser.get("Camera")
 
+    @property
+    def camera_idle_timeout(self):
+        """ How long (in seconds) a long-lived process keeps the camera open after a capture. """
+        return self.__parser.getfloat('CameraIdleTimeout', IDLE_TIMEOUT)
+
+    @property
+    def max_size(self):
+        """ The `(width, height)` macros are scaled down to fit in. """
+        return (self.__parser.getfloat('MaxWidth', MAX_WIDTH), self.__parser.getfloat('MaxHeight', MAX_HEIGHT))
+
+    @property
+    def resample_filter(self):
+        """ The name of the filter macros are scaled down with. """
+        return self.__parser.get('ResampleFilter', DEFAULT_RESAMPLE)
+
+    @property
+    def backfill_image(self):
+        """ The still image, or directory of images, that `backfill` renders onto. """
+        path = self.__parser.get('BackfillImage')
+        return os.path.expanduser(path) if path else None
+
     @property
     def lol_speak(self):
         """ Returns `True` if the lolspeak translator is enabled. """
         return self.__parser.getboolean('LolSpeak', False)
 
-    def update_config(self, setting, value):
-        """ Sets a value for the specific setting in the DEFAULT section. """
-        config = configparser.ConfigParser()
-        config.read(self.config_file)
-        config["DEFAULT"][setting] = value
+    def update(self, settings):
+        """Applies several settings to the DEFAULT section in a single write
 
-        with open(self.config_file, 'w') as config_file:
-            config.write(config_file)
+        The file is re-read under a lock and replaced atomically, so concurrent writers never lose each other's
+        changes or leave a partially written file behind.
 
-        self.__parser = config[self.__section]
+        :param settings: A dictionary of settings to values. Settings whose value is `None` are removed.
 
-    def clear_setting(self, setting):
-        """ Removes a setting from the DEFAULT section. """
-        config = configparser.ConfigParser()
-        config.read(self.config_file)
-        config.remove_option('DEFAULT', setting)
+        """
+        with _config_lock(self.config_file):
+            config = _parse_config(self.config_file)
+            for setting, value in settings.items():
+                if value is None:
+                    config.remove_option('DEFAULT', setting)
+                else:
+                    config["DEFAULT"][setting] = value
+            _write_config(self.config_file, config)
 
-        with open(self.config_file, 'w') as config_file:
-            config.write(config_file)
+    def update_config(self, setting, value):
+        """ Sets a value for the specific setting in the DEFAULT section. """
+        self.update({setting: value})
 
-        self.__parser = config[self.__section]
+    def clear_setting(self, setting):
+        """ Removes a setting from the DEFAULT section. """
+        self.update({setting: None})
 
     @property
     def upload(self):
@@ -220,6 +478,43 @@ class Config(object): #pylint: disable=R0903
         """ The URL to upload to. """
         return self.__parser.get('UploadUrl', DEFAULT_UPLOAD_URL)
 
+    @property
+    def upload_spool_directory(self):
+        """ The directory macros are queued in until they are uploaded. """
+        return os.path.expanduser(self.__parser.get('UploadSpoolDirectory', DEFAULT_UPLOAD_SPOOL_DIRECTORY))
+
+    @property
+    def upload_concurrency(self):
+        """ How many uploads may be in flight at once. """
+        from .uploads import UPLOAD_CONCURRENCY
+        return self.__parser.getint('UploadConcurrency', UPLOAD_CONCURRENCY)
+
+    @property
+    def upload_timeout(self):
+        """ The connect and read timeouts (in seconds) for each upload. """
+        from .utils import UPLOAD_TIMEOUT
+        return self.__parser.getfloat('UploadTimeout', None) or UPLOAD_TIMEOUT
+
+    @property
+    def spool_directory(self):
+        """ The directory that detached captures are queued in. """
+        return os.path.expanduser(self.__parser.get('SpoolDirectory', DEFAULT_SPOOL_DIRECTORY))
+
+    @property
+    def daemon_socket(self):
+        """ The Unix domain socket the daemon listens on. """
+        return os.path.expanduser(self.__parser.get('DaemonSocket', DEFAULT_DAEMON_SOCKET))
+
+    @property
+    def trace_log(self):
+        """ The file traced captures append their timing spans to. """
+        return os.path.expanduser(self.__parser.get('TraceLog', DEFAULT_TRACE_LOG))
+
+    @property
+    def catalog_path(self):
+        """ The SQLite database saved macros are catalogued in. """
+        return os.path.expanduser(self.__parser.get('Catalog', DEFAULT_CATALOG))
+
 
 class Lolologist(object):
     """ The main application """
@@ -230,57 +525,509 @@ class Lolologist(object):
         detect_platform()
         self.config = Config()
         self.repo_path = repo_path
+        self.__tranzlator = None
+        self.__repositories = {}
+        self.__camera = None
+        self.__upload_queue = None
+        self.__catalog = None
+        self.__uploader = None
+        self.trace = tracing.enabled_by_environment()
+
+    def preload_fonts(self):
+        """ Loads the configured and fallback fonts at the macro sizes so renders never open a font file. """
+        from .fonts import preload_fonts
+        fonts = set([get_font_path(self.config.get_font()), get_font_path(FALLBACK_FONT)])
+        from .layout import FONT_SIZES
+        preload_fonts(fonts, (TOP_FONT_SIZE,) + FONT_SIZES)
+
+    def __create_camera(self):
+        """ Creates the camera for the current platform. """
+        if is_osx():
+            return ImageSnapCamera(device=self.config.get_camera(), frame_size=self.config.max_size)
+        return MplayerCamera(device=self.config.get_camera(), frame_size=self.config.max_size)
+
+    def __get_camera(self):
+        """ Gets the camera session if one is open, or a camera that's opened for a single capture. """
+        return self.__camera if self.__camera is not None else self.__create_camera()
+
+    def open_camera_session(self):
+        """ Keeps the camera warm between captures. Meant for long-lived processes. """
+        if self.__camera is None:
+            self.__camera = CameraSession(self.__create_camera(), idle_timeout=self.config.camera_idle_timeout)
+
+    def close_camera_session(self):
+        """ Closes the camera session, if one is open. """
+        if self.__camera is not None:
+            self.__camera.close()
+            self.__camera = None
 
     def __make_macro(self, revision, summary, **kwargs):
         """ Creates an image macro with the given text.
 
        :param revision: The SHA-1 hash of the commit
        :param summary: The short description of the commit
-       :returns: The full path to the saved image
+       :returns: A list of `(file_path, data, size)` tuples of where each output belongs, its encoded bytes and its
+           dimensions. The macro comes first, followed by each of its `OutputVariants`.
 
         """
-        if is_osx():
-            camera = ImageSnapCamera(device=self.config.get_camera())
-        else:
-            camera = MplayerCamera(device=self.config.get_camera())
-        with camera.capture_photo() as photo:
-            macro = ImageMacro(photo, revision, summary, self.config.get_font())
-            image = macro.render()
-            directory_path = self.config['OutputDirectory'].format(revision=revision, **kwargs)
-            if not os.path.isdir(directory_path):
-                os.makedirs(directory_path)
-            file_path = os.path.join(self.config['OutputDirectory'], self.config['OutputFileName']).format(
-                revision=revision,
-                **kwargs
-            ) + '.' + self.config["OutputFormat"]
-            image.save(file_path)
-            return file_path
-
-    def __get_newest_commit(self):
-        """ Retrieves the data for the most recent commit. """
-        loltranz = Tranzlator()
-        translator = loltranz.translate_sentence if self.config.lol_speak else None
-        return GitRepository(self.repo_path).get_newest_commit(translator=translator)
-
-    def capture(self, args): #pylint: disable=W0613
+        started = tracing.now()
+        with self.__get_camera().capture_photo() as photo:
+            tracing.record_span('camera', started)
+            macro = ImageMacro(photo, revision, summary, self.config.get_font(), max_size=self.config.max_size,
+                               resample=self.config.resample_filter)
+            with tracing.span('render'):
+                image = macro.render()
+        commit = dict(kwargs, revision=revision, summary=summary)
+        outputs = []
+        # Every output is derived from the rendered image, rather than by decoding the saved macro again
+        for variant in [None] + self.config.get_output_variants():
+            file_path = self.config.get_output_path(variant=variant, **commit)
+            image_format = get_image_format(file_path)
+            settings = dict(self.config.get_encoder_settings(image_format), **make_metadata(image_format, commit))
+            outputs.append((file_path, variant.size if variant is not None else None, settings))
+        with tracing.span('encode'):
+            return encode_outputs(image, outputs, get_resample_filter(self.config.resample_filter))
+
+    @staticmethod
+    def __save_macro(outputs):
+        """ Writes a macro's encoded outputs to their destinations. """
+        with tracing.span('save'):
+            for file_path, data, _ in outputs:
+                directory_path = os.path.dirname(file_path)
+                if not os.path.isdir(directory_path):
+                    os.makedirs(directory_path)
+                write_atomic(file_path, data, sync=False)
+
+    def __get_repository(self, repo_path):
+        """ Gets the repository at the given path, reusing it if it has been opened before. """
+        from .repository import GitRepository
+        repo_path = os.path.abspath(repo_path)
+        if repo_path not in self.__repositories:
+            self.__repositories[repo_path] = GitRepository(repo_path)
+        return self.__repositories[repo_path]
+
+    def __get_translator(self):
+        """ Gets the lolspeak translator for free text, if it's enabled. """
+        if not self.config.lol_speak:
+            return None
+        if self.__tranzlator is None:
+            with tracing.span('translator_load'):
+                from .lolz import Tranzlator
+                self.__tranzlator = Tranzlator()
+
+        def translate(sentence):
+            """ Translates a sentence, timing it as part of the trace. """
+            with tracing.span('translate'):
+                return self.__tranzlator.translate_sentence(sentence)
+        return translate
+
+    def __get_commit(self, repo_path, revision):
+        """ Retrieves the data for a commit. Its `git` span includes translating the commit message. """
+        with tracing.span('git'):
+            return self.__get_repository(repo_path).get_commit(revision, translator=self.__get_translator())
+
+    def capture_commit(self, repo_path, revision='HEAD'):
+        """Captures a photo and macros it with the given commit
+
+        :param repo_path: The path to the repository
+        :param revision: The revision to capture
+        :returns: A dictionary with the saved image's `path`, and `upload` if it was queued for upload
+
+        """
+        with tracing.trace('capture', self.config.trace_log if self.trace else None):
+            return self.__capture_commit(repo_path, revision)
+
+    def __capture_commit(self, repo_path, revision):
+        """ Captures and saves a macro, and uploads it or queues it for upload. """
+        commit = self.__get_commit(repo_path, revision)
+        outputs = self.__make_macro(**commit)
+        file_path, data, _ = outputs[0]
+        result = {"path" : file_path}
+        if len(outputs) > 1:
+            result["variants"] = [output[0] for output in outputs[1:]]
+        upload = self.config.upload
+        if upload and self.__camera is not None:
+            # Long-lived processes upload the encoded macro straight from memory while it's saved, and the hook
+            # waiting on this capture gets its reply without waiting on the upload, so a slow host never holds up a
+            # commit
+            with tracing.span('upload'):
+                self.__start_upload(file_path, data)
+            result["upload"] = "started"
+        self.__save_macro(outputs)
+        self.__catalog_macro(commit, outputs)
+        if upload and self.__camera is None:
+            # Without a camera session this is a one-shot hook, so the upload is left to a background flush
+            self.__queue_upload(result)
+        return result
+
+    def __catalog_macro(self, commit, outputs):
+        """ Records a saved macro's outputs in the catalog. They're already saved, so failing to is only a warning. """
+        import sqlite3
+        from .catalog import Entry
+        with tracing.span('catalog'):
+            try:
+                self.get_catalog().add_many(
+                    Entry(file_path, commit.get("project"), commit.get("revision"), commit.get("time"),
+                          commit.get("author"), commit.get("summary"), size[0], size[1], len(data), None)
+                    for file_path, data, size in outputs)
+            except sqlite3.Error as exc:
+                LOG.warning("Couldn't catalog %s: %s", outputs[0][0], exc)
+
+    def __start_upload(self, file_path, data):
+        """ Uploads a macro from memory on a background thread. """
+        # Created here, so the upload thread and this one never race to create them
+        self.get_upload_queue()
+        self.get_catalog()
+        if self.__uploader is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self.__uploader = ThreadPoolExecutor(max_workers=1)
+        self.__uploader.submit(self.__upload_encoded, file_path, data)
+
+    def __upload_encoded(self, file_path, data):
+        """ Uploads a macro and records its URL, queueing it for a later flush if it can't be uploaded. """
+        import sqlite3
+        try:
+            image_url = self.get_upload_queue().upload(self.config.upload_url, file_path, data)
+        except LolologistError as exc:
+            LOG.warning("Couldn't upload %s, queueing it for later: %s", file_path, exc)
+            self.__queue_upload({"path": file_path})
+            return
+        except Exception: #pylint: disable=W0703
+            # Nothing waits on this thread's result, so anything else would otherwise vanish
+            LOG.exception("Uploading %s failed, queueing it for later", file_path)
+            self.__queue_upload({"path": file_path})
+            return
+        LOG.info("Uploaded %s -> %s", file_path, image_url)
+        try:
+            self.get_catalog().set_url(file_path, image_url)
+        except sqlite3.Error as exc:
+            LOG.warning("Couldn't catalog the URL of %s: %s", file_path, exc)
+
+    def finish_uploads(self):
+        """ Waits for the uploads started in the background to finish. """
+        if self.__uploader is not None:
+            self.__uploader.shutdown(wait=True)
+            self.__uploader = None
+
+    def __queue_upload(self, result):
+        """ Queues a saved macro for upload and makes sure something is around to upload it. """
+        with tracing.span('queue_upload'):
+            self.get_upload_queue().push(self.config.upload_url, result["path"])
+            self.__spawn_background('uploads', '--flush')
+        result["upload"] = "queued"
+
+    def get_upload_queue(self):
+        """ Gets the queue of macros waiting to be uploaded, reusing its connections between captures. """
+        if self.__upload_queue is None:
+            from .uploads import UploadQueue
+            self.__upload_queue = UploadQueue(self.config.upload_spool_directory,
+                                              concurrency=self.config.upload_concurrency,
+                                              timeout=self.config.upload_timeout)
+        return self.__upload_queue
+
+    def get_catalog(self):
+        """ Gets the catalog of saved macros. """
+        if self.__catalog is None:
+            from .catalog import Catalog
+            self.__catalog = Catalog(self.config.catalog_path)
+        return self.__catalog
+
+    @staticmethod
+    def __print_capture(result):
+        """ Reports where a macro ended up. """
+        if "url" in result:
+            print("Uploaded:", result["url"])
+        elif result.get("upload") == "queued":
+            print("Upload queued. Run `lolologist uploads` to check on it.")
+        elif result.get("upload") == "started":
+            print("Uploading in the background. Run `lolologist search` for its URL.")
+        print("Macro saved:", result["path"])
+        for path in result.get("variants", ()):
+            print("Variant saved:", path)
+
+    @staticmethod
+    def __spawn_background(*command):
+        """ Runs a lolologist command in a background process that outlives this one. """
+        # Hooks export GIT_DIR and friends, which would pin the process to this repository
+        environment = dict((key, value) for key, value in os.environ.items() if not key.startswith('GIT_'))
+        Popen([sys.executable, '-m', 'lolologist.lolologist'] + list(command), stdin=DEVNULL, stdout=DEVNULL,
+              stderr=DEVNULL, close_fds=True, preexec_fn=os.setsid, env=environment)
+
+    def __enqueue_capture(self):
+        """ Queues a capture of the most recent commit and makes sure a worker is around to process it. """
+        from .spool import JobSpool
+        repo_path = os.path.abspath(self.repo_path)
+        try:
+            revision = check_output(['git', 'rev-parse', 'HEAD'], cwd=repo_path, stderr=DEVNULL)
+        except (CalledProcessError, OSError):
+            raise LolologistError("The path '{}' must contain a valid git repository.".format(repo_path))
+        JobSpool(self.config.spool_directory).push({
+            "repository" : repo_path,
+            "revision" : revision.decode('utf-8').strip(),
+            "queued" : time.time(),
+        })
+        self.__spawn_background('worker')
+
+    def capture(self, args):
         """ Capture the most recent commit and macro it! """
-        commit = self.__get_newest_commit()
-        image = self.__make_macro(**commit)
-        if self.config.upload:
-            url = upload(self.config.upload_url, image)
-            print("Uploaded:", url)
-        print("Macro saved:", image)
+        if getattr(args, 'trace', False):
+            self.trace = True
+        if getattr(args, 'profile', None):
+            import cProfile
+            profiler = cProfile.Profile()
+            try:
+                profiler.runcall(self.__capture, args)
+            finally:
+                profiler.dump_stats(args.profile)
+                print("Profile saved:", args.profile)
+            return
+        self.__capture(args)
+
+    def __capture(self, args):
+        """ Captures the most recent commit the way the arguments ask for. """
+        if getattr(args, 'detach', False):
+            self.__enqueue_capture()
+            return
+        if getattr(args, 'daemon', False):
+            from .daemon import DaemonUnavailableError, request_capture
+            try:
+                result = request_capture(self.config.daemon_socket, os.path.abspath(self.repo_path))
+            except DaemonUnavailableError:
+                LOG.info("The daemon isn't running. Capturing in-process.")
+            else:
+                self.__print_capture(result)
+                return
+        self.__print_capture(self.capture_commit(self.repo_path))
+
+    def daemon(self, args): #pylint: disable=W0613
+        """ Serves capture requests from post-commit hooks until interrupted. """
+        from .daemon import CaptureServer
+        from .lolz import Tranzlator
+        self.preload_fonts()
+        self.open_camera_session()
+        if self.config.lol_speak:
+            self.__tranzlator = Tranzlator()
+        server = CaptureServer(self.config.daemon_socket, self)
+        print("Listening on '{}'".format(self.config.daemon_socket))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.close_camera_session()
+            self.finish_uploads()
+
+    def worker(self, args): #pylint: disable=W0613
+        """ Processes every queued capture, retrying failures. """
+        from .spool import JobSpool
+        spool = JobSpool(self.config.spool_directory)
+        handler = lambda job: self.__print_capture(self.capture_commit(job['repository'], job['revision']))
+        self.open_camera_session()
+        try:
+            completed, failed = spool.drain_exclusively(handler)
+        finally:
+            self.close_camera_session()
+            self.finish_uploads()
+        print("Processed {} queued capture(s), {} failed.".format(completed, failed))
+
+    def uploads(self, args):
+        """ Lists the queued and failed uploads, uploading anything that's queued when asked to. """
+        queue = self.get_upload_queue()
+        if args.flush:
+            catalog = self.get_catalog()
+
+            def on_upload(record, image_url):
+                """ Reports each upload and records its URL. """
+                print("Uploaded:", record["path"], "->", image_url)
+                catalog.set_url(record["path"], image_url)
+            try:
+                completed, failed = queue.flush(on_upload=on_upload)
+            except LolologistError:
+                print("Uploads are already being processed by another lolologist.")
+            else:
+                print("Uploaded {} macro(s), {} failed.".format(completed, failed))
+            finally:
+                queue.close()
+        pending, failed = queue.pending(), queue.failed()
+        now = time.time()
+        print("{} upload(s) pending, {} failed.".format(len(pending), len(failed)))
+        for _, record in pending:
+            retry = ""
+            if record.get("not_before", 0) > now:
+                retry = " (attempt {}, retrying in {:.0f}s: {})".format(
+                    record["attempts"] + 1, record["not_before"] - now, record.get("error"))
+            print("  pending: {}{}".format(record["path"], retry))
+        for _, record in failed:
+            print("  failed:  {} ({})".format(record["path"], record.get("error")))
+
+    def backfill(self, args):
+        """ Renders macros for every commit in a revision range that doesn't have one yet. """
+        import sqlite3
+        from . import backfill
+        from .catalog import Entry
+        source = args.image or self.config.backfill_image
+        if not source:
+            raise LolologistError("Pass --image, or set BackfillImage, to say which image to render onto.")
+        images = backfill.find_images(os.path.expanduser(source))
+        font = self.config.get_font()
+        max_size, resample = self.config.max_size, self.config.resample_filter
+        image_format = get_image_format('macro.' + self.config['OutputFormat'])
+        encoder_settings = self.config.get_encoder_settings(image_format)
+        skipped = [0]
+        directories = set()
+        # The commits being rendered, by output path, until their renders finish
+        in_flight = {}
+        catalog = self.get_catalog()
+
+        def get_tasks():
+            """ Streams a render task for each commit without a macro. """
+            commits = self.__get_repository(self.repo_path).iter_commits(args.rev_range,
+                                                                          translator=self.__get_translator())
+            for commit in commits:
+                file_path = self.config.get_output_path(**commit)
+                if os.path.exists(file_path):
+                    skipped[0] += 1
+                    continue
+                directory_path = os.path.dirname(file_path)
+                if directory_path not in directories:
+                    if not os.path.isdir(directory_path):
+                        os.makedirs(directory_path)
+                    directories.add(directory_path)
+                in_flight[file_path] = commit
+                yield (backfill.pick_image(images, commit["revision"]), commit["revision"], commit["summary"], font,
+                       file_path, max_size, resample, dict(encoder_settings, **make_metadata(image_format, commit)))
+
+        def report(task, rendered, error):
+            """ Reports and catalogs each render as it finishes, so an interrupted backfill loses none. """
+            commit = in_flight.pop(task[4])
+            if error is not None:
+                print("Failed to render {}: {}".format(task[1], error), file=sys.stderr)
+                return
+            file_path, size, byte_size = rendered
+            LOG.info("Macro saved: %s", file_path)
+            try:
+                catalog.add(Entry(file_path, commit.get("project"), commit["revision"], commit.get("time"),
+                                  commit.get("author"), commit["summary"], size[0], size[1], byte_size, None))
+            except sqlite3.Error as exc:
+                LOG.warning("Couldn't catalog %s: %s", file_path, exc)
+
+        rendered, failed = backfill.run(get_tasks(), jobs=args.jobs, on_result=report)
+        print("Rendered {} macro(s), skipped {} that already existed, {} failed.".format(
+            rendered, skipped[0], failed))
+
+    def timelapse(self, args):
+        """ Builds an animated recap of the saved macros, in commit order. """
+        from . import timelapse
+        directory = self.__get_macro_directory(args.directory)
+        since, until = parse_date(args.since), parse_date(args.until)
+        if until is not None:
+            until += timedelta(days=1)
+        macros = timelapse.select(timelapse.scan(os.path.expanduser(directory), jobs=args.jobs),
+                                  project=args.project, author=args.author, since=since, until=until)
+        if not macros:
+            raise LolologistError("There are no macros in '{}' that match.".format(directory))
+        size = tuple(int(dimension) for dimension in self.config.max_size)
+        frames = timelapse.build(os.path.expanduser(args.output), macros, size, args.fps, jobs=args.jobs,
+                                 command=args.command)
+        print("Saved a {}-frame timelapse to {}".format(frames, args.output))
+
+    def __get_macro_directory(self, directory=None):
+        """ Gets where to look for saved macros: the given directory, or else the part of the output directory that
+        doesn't depend on the commit. """
+        if not directory:
+            directory = self.config['OutputDirectory']
+            if '{' in directory:
+                directory = os.path.dirname(directory.split('{', 1)[0])
+        return os.path.expanduser(directory)
+
+    def show(self, args):
+        """ Shows the catalogued macros of a commit. """
+        entries = self.get_catalog().find(args.revision, project=args.project)
+        if not entries:
+            raise LolologistError("There are no catalogued macros for '{}'. Run `lolologist reindex` if they were "
+                                  "made before the catalog was.".format(args.revision))
+        for index, entry in enumerate(entries):
+            if index:
+                print()
+            print_entry(entry)
+
+    def search(self, args):
+        """ Lists the catalogued macros that match, newest first. """
+        since, until = parse_date(args.since), parse_date(args.until)
+        if until is not None:
+            until += timedelta(days=1)
+        entries = self.get_catalog().search(args.text, project=args.project, author=args.author, since=since,
+                                            until=until, limit=args.limit or None)
+        for entry in entries:
+            print("{} {:<10} {:<16} {}  {}".format(entry.time.strftime('%Y-%m-%d %H:%M'), entry.revision or '-',
+                                                   entry.project or '-', entry.summary or '', entry.path))
+        print("{} macro(s) found.".format(len(entries)))
+
+    def reindex(self, args):
+        """ Rebuilds the catalog from the macros on disk. """
+        directory = self.__get_macro_directory(args.directory)
+        count = self.get_catalog().reindex(directory, jobs=args.jobs)
+        print("Catalogued {} macro(s) from {}".format(count, directory))
+
+    def stats(self, args):
+        """ Reports the median and 95th percentile time of each stage of the traced captures. """
+        log_path = os.path.expanduser(args.log) if args.log else self.config.trace_log
+        if not os.path.isfile(log_path):
+            raise LolologistError("There's no trace log at '{}'. Run `lolologist capture --trace` or set {} "
+                                  "to record one.".format(log_path, tracing.TRACE_ENVIRONMENT_VARIABLE))
+        print("{:<16} {:>7} {:>10} {:>10}".format("stage", "count", "p50 (ms)", "p95 (ms)"))
+        for name, count, median, slow in tracing.summarize(log_path):
+            print("{:<16} {:>7} {:>10.1f} {:>10.1f}".format(name, count, median, slow))
+
+    def bench_encode(self, args):
+        """ Reports how long each encoder takes on a sample macro, and how big its output is. """
+        from PIL import Image
+        from .encoders import PRESETS, benchmark
+        if args.image:
+            base = open_image(os.path.expanduser(args.image), self.config.max_size)
+        else:
+            # A fractal has enough detail to keep the encoders honest
+            size = tuple(int(dimension) for dimension in self.config.max_size)
+            base = Image.effect_mandelbrot(size, (-2.0, -1.25, 0.75, 1.25), 128).convert('RGB')
+        image = ImageMacro(base, '0123456789', "Compare the encoders on a sample macro", self.config.get_font(),
+                           max_size=self.config.max_size, resample=self.config.resample_filter).render()
+        output_format = self.config['OutputFormat']
+        configured = self.config.get_encoder_settings(get_image_format('macro.' + output_format))
+        presets = (('configured ({})'.format(output_format), output_format, configured),) + PRESETS
+        print("{:<24} {:>10} {:>10}".format("encoder", "time (ms)", "size (KB)"))
+        for label, milliseconds, size in benchmark(image, presets, repeat=args.repeat):
+            print("{:<24} {:>10.1f} {:>10.1f}".format(label, milliseconds, size / 1024.0))
 
     @staticmethod
     def register(args): #pylint: disable=W0613
-        """ Register lolologist with a git repo. """
+        """ Register lolologist with a git repo, or every repo under a directory. """
+        hook_text = POST_COMMIT_FILE
+        if getattr(args, 'detach', False):
+            hook_text = POST_COMMIT_DETACHED_FILE
+        elif getattr(args, 'daemon', False):
+            hook_text = POST_COMMIT_DAEMON_FILE
+        if getattr(args, 'recursive', False):
+            from .repository import register_tree
+            print("Attempting to register with every repository under '{}'".format(args.repository))
+            report_tree(register_tree(args.repository, hook_text, jobs=args.jobs), "Registered",
+                        "already had a post-commit hook")
+            return
         print("Attempting to register with the repository '{}'".format(args.repository))
-        GitRepository(args.repository).register(POST_COMMIT_FILE)
+        from .repository import GitRepository
+        GitRepository(args.repository).register(hook_text)
 
     @staticmethod
     def deregister(args): #pylint: disable=W0613
-        """ Remove lolologist from a git repo. """
+        """ Remove lolologist from a git repo, or every repo under a directory. """
+        if getattr(args, 'recursive', False):
+            from .repository import deregister_tree
+            print("Attempting to deregister from every repository under '{}'".format(args.repository))
+            report_tree(deregister_tree(args.repository, jobs=args.jobs), "Deregistered",
+                        "didn't have lolologist's hook")
+            return
         print("Attempting to deregister from the repository '{}'".format(args.repository))
+        from .repository import GitRepository
         GitRepository(args.repository).deregister()
         print("Post-commit event successfully deregistered. I haz a sad.")
 
@@ -311,37 +1058,81 @@ class Lolologist(object):
         elif args.url:
             self.config.update_config("UploadUrl", args.url)
 
+    def set_config(self, args):
+        """ Applies several `Setting=value` assignments in one write. An empty value removes the setting. """
+        settings = {}
+        for assignment in args.settings:
+            setting, separator, value = assignment.partition('=')
+            if not separator or not setting.strip():
+                raise LolologistError("Settings must look like 'Setting=value', not '{}'.".format(assignment))
+            settings[setting.strip()] = value.strip() or None
+        self.config.update(settings)
+        for setting in sorted(settings):
+            if settings[setting] is None:
+                print("Cleared {}".format(setting))
+            else:
+                print("Set {} to '{}'".format(setting, settings[setting]))
+
+
+def report_tree(results, verb, skip_reason):
+    """Prints what happened to each repository in a tree, followed by a summary
+
+    :param results: `(path, outcome, message)` tuples from `register_tree` or `deregister_tree`
+    :param verb: What was done to changed repositories, e.g. `Registered`
+    :param skip_reason: Why a repository would have been skipped
 
-def get_impact_locations():
-    """ Gets allthe locations of the Impact font for the current operating system
+    """
+    from .repository import FAILED, SKIPPED
+    counts = Counter(outcome for _, outcome, _ in results)
+    for path, outcome, message in results:
+        if outcome == FAILED:
+            print("Failed on '{}': {}".format(path, message), file=sys.stderr)
+        else:
+            LOG.info("%s: %s", outcome, path)
+    changed = len(results) - counts[SKIPPED] - counts[FAILED]
+    print("{} {} repositories, skipped {} that {}, {} failed.".format(verb, changed, counts[SKIPPED], skip_reason,
+                                                                     counts[FAILED]))
+    if counts[FAILED]:
+        raise LolologistError("{} of {} repositories couldn't be changed.".format(counts[FAILED], len(results)))
+
+def print_entry(entry):
+    """ Prints everything the catalog knows about a macro. """
+    fields = (
+        ("Revision", entry.revision),
+        ("Project", entry.project),
+        ("Author", entry.author),
+        ("Time", entry.time),
+        ("Summary", entry.summary),
+        ("Path", entry.path),
+        ("Size", "{}x{}, {:.1f} KB".format(entry.width, entry.height, (entry.bytes or 0) / 1024.0)),
+        ("URL", entry.url),
+    )
+    for label, value in fields:
+        if value is not None:
+            print("{:<9} {}".format(label + ':', value))
 
-    :returns: A collection of all the Impact locations
+def parse_date(text):
+    """Parses a `YYYY-MM-DD` date from the command line
+
+    :param text: The date, or `None`
+    :returns: A `datetime` at the start of the day, or `None`
 
     """
-    if is_osx():
-        return check_output(['locate', '-i', 'Impact.ttf'], stderr=STDOUT)
-    return check_output(['locate', '--regex', '-i', 'Impact.ttf$'], stderr=STDOUT)
+    if text is None:
+        return None
+    try:
+        return datetime.strptime(text, '%Y-%m-%d')
+    except ValueError:
+        raise LolologistError("'{}' isn't a YYYY-MM-DD date.".format(text))
 
 def get_impact():
-    """ Finds Impact.ttf on one's system
+    """ Finds Impact on one's system
 
-    :returns: The full path to the Impact font
+    :returns: The full path to the Impact font, or `None` if it isn't installed
 
     """
-    font_path = None
-    try:
-        locs = get_impact_locations()
-        for loc in locs.splitlines():
-            if isinstance(loc, bytes):
-                loc = loc.decode("utf-8")
-            if loc.startswith("/usr") or loc.startswith("/Library"): #most likely a permanent font
-                font_path = loc
-                break
-            elif font_path is None:
-                font_path = loc
-    except CalledProcessError:
-        pass
-    return font_path
+    from .fonts import find_font
+    return find_font('Impact')
 
 def parse_args(app):
     """Gets the arguments passed to lolologist
@@ -354,16 +1145,100 @@ def parse_args(app):
     subparsers = parser.add_subparsers(title="action commands")
 
     capture_parser = subparsers.add_parser('capture', help="Capture a snapshot and apply the most recent commit")
+    capture_mode = capture_parser.add_mutually_exclusive_group()
+    capture_mode.add_argument('--detach', action='store_true',
+            help="Queue the capture and return immediately. A background worker takes the photo.")
+    capture_mode.add_argument('--daemon', action='store_true',
+            help="Hand the capture to `lolologist daemon`, capturing in-process if it isn't running.")
+    capture_parser.add_argument('--trace', action='store_true',
+            help="Append the time each stage took to the trace log. `lolologist stats` summarizes it.")
+    capture_parser.add_argument('--profile', metavar='PATH', help="Save a cProfile dump of the capture to PATH")
     capture_parser.set_defaults(func=app.capture)
 
+    daemon_parser = subparsers.add_parser('daemon', help="Serve captures from a warm, long-lived process")
+    daemon_parser.set_defaults(func=app.daemon)
+
+    worker_parser = subparsers.add_parser('worker', help="Process captures queued with `capture --detach`")
+    worker_parser.set_defaults(func=app.worker)
+
+    backfill_parser = subparsers.add_parser('backfill', help="Render macros for existing commits from still images")
+    backfill_parser.add_argument('rev_range', nargs='?', default='HEAD',
+            help="The commits to render, e.g. 'v0.4.0..HEAD'. Defaults to the whole history.")
+    backfill_parser.add_argument('--image', default=None,
+            help="An image, or a directory of images, to render onto. Defaults to the BackfillImage setting.")
+    backfill_parser.add_argument('--jobs', '-j', type=int, default=None,
+            help="The number of processes to render with. Defaults to the number of CPUs.")
+    backfill_parser.set_defaults(func=app.backfill)
+
+    bench_parser = subparsers.add_parser('bench-encode', help="Compare encoders' speed and output size")
+    bench_parser.add_argument('--image', help="The image to render the sample macro onto")
+    bench_parser.add_argument('--repeat', type=int, default=5, help="How many times each encoder is timed")
+    bench_parser.set_defaults(func=app.bench_encode)
+
+    timelapse_parser = subparsers.add_parser('timelapse', help="Build an animation of the saved macros")
+    timelapse_parser.add_argument('output',
+            help="Where to save it. A .gif is encoded by lolologist, anything else (e.g. .mp4) with ffmpeg.")
+    timelapse_parser.add_argument('--directory',
+            help="Where the macros are. Defaults to the part of OutputDirectory that doesn't vary by commit.")
+    timelapse_parser.add_argument('--project', help="Only include this project's macros")
+    timelapse_parser.add_argument('--author', help="Only include commits by authors whose name contains this")
+    timelapse_parser.add_argument('--since', help="Only include commits made on or after this YYYY-MM-DD date")
+    timelapse_parser.add_argument('--until', help="Only include commits made on or before this YYYY-MM-DD date")
+    timelapse_parser.add_argument('--fps', type=float, default=4, help="Frames per second")
+    timelapse_parser.add_argument('--jobs', '-j', type=int, default=None,
+            help="The number of macros to decode at once. Defaults to the number of CPUs.")
+    timelapse_parser.add_argument('--command',
+            help="The encoder to pipe raw RGB frames to, with {output}, {width}, {height} and {fps} filled in")
+    timelapse_parser.set_defaults(func=app.timelapse)
+
+    show_parser = subparsers.add_parser('show', help="Show the catalogued macros of a commit")
+    show_parser.add_argument('revision', help="The commit's sha, or the start of it")
+    show_parser.add_argument('--project', help="Only look in this project")
+    show_parser.set_defaults(func=app.show)
+
+    search_parser = subparsers.add_parser('search', help="Search the catalogued macros")
+    search_parser.add_argument('text', nargs='?', help="Only list macros whose summary contains this")
+    search_parser.add_argument('--project', help="Only list this project's macros")
+    search_parser.add_argument('--author', help="Only list commits by authors whose name contains this")
+    search_parser.add_argument('--since', help="Only list commits made on or after this YYYY-MM-DD date")
+    search_parser.add_argument('--until', help="Only list commits made on or before this YYYY-MM-DD date")
+    search_parser.add_argument('--limit', type=int, default=50, help="The most macros to list. 0 lists them all.")
+    search_parser.set_defaults(func=app.search)
+
+    reindex_parser = subparsers.add_parser('reindex', help="Rebuild the catalog from the saved macros")
+    reindex_parser.add_argument('--directory',
+            help="Where the macros are. Defaults to the part of OutputDirectory that doesn't vary by commit.")
+    reindex_parser.add_argument('--jobs', '-j', type=int, default=None,
+            help="The number of macros to read at once. Defaults to the number of CPUs.")
+    reindex_parser.set_defaults(func=app.reindex)
+
+    stats_parser = subparsers.add_parser('stats', help="Summarize how long each stage of traced captures took")
+    stats_parser.add_argument('--log', help="The trace log to read. Defaults to the configured TraceLog.")
+    stats_parser.set_defaults(func=app.stats)
+
+    uploads_parser = subparsers.add_parser('uploads', help="Show the macros waiting to be uploaded")
+    uploads_parser.add_argument('--flush', action='store_true', help="Upload everything that's queued now")
+    uploads_parser.set_defaults(func=app.uploads)
+
     register_parser = subparsers.add_parser('register', help="Register lolologist with a git repository")
     register_parser.add_argument('repository', nargs='?', default='.', help="The repository to register")
+    register_mode = register_parser.add_mutually_exclusive_group()
+    register_mode.add_argument('--detach', action='store_true',
+            help="Install a hook that queues captures instead of blocking the commit")
+    register_mode.add_argument('--daemon', action='store_true',
+            help="Install a hook that hands captures to `lolologist daemon`")
     register_parser.set_defaults(func=Lolologist.register)
 
     deregister_parser = subparsers.add_parser('deregister', help="Deregister lolologist from a git repository")
     deregister_parser.add_argument('repository', nargs='?', default='.', help="The repository to deregister")
     deregister_parser.set_defaults(func=Lolologist.deregister)
 
+    for tree_parser, verb in ((register_parser, "Register"), (deregister_parser, "Deregister")):
+        tree_parser.add_argument('--recursive', '-r', action='store_true',
+                help="{} every repository and submodule under the directory".format(verb))
+        tree_parser.add_argument('--jobs', '-j', type=int, default=None,
+                help="The number of repositories to change at once, with --recursive")
+
     setfont_parser = subparsers.add_parser('setfont', help="Set the font to use for image macros.")
     setfont_parser.add_argument('font_path', nargs="?",
             help="The full path to the desired font. If none is specified, attempt to find the system's Impact font."
@@ -381,6 +1256,13 @@ def parse_args(app):
     uploader_parser.add_argument('url', nargs='?', default=None, help="The URL to POST the image to.")
     uploader_parser.set_defaults(func=app.set_uploader)
 
+    config_parser = subparsers.add_parser('config', help="Change configuration settings.")
+    config_subparsers = config_parser.add_subparsers(title="config commands")
+    config_set_parser = config_subparsers.add_parser('set', help="Apply one or more settings at once.")
+    config_set_parser.add_argument('settings', nargs='+', metavar='Setting=value',
+            help="A setting to change, e.g. 'OutputFormat=png'. Leave the value empty to remove the setting.")
+    config_set_parser.set_defaults(func=app.set_config)
+
     return parser.parse_args()
 
 def main():
@@ -14,10 +14,108 @@
 #
 from __future__ import print_function
 
-import json, sys, os.path, re
+import json, sys, os, os.path, re, marshal, hashlib
+from bisect import bisect_left
+
+from .utils import lru_cache, write_atomic
 
 DEFAULT_LOLZ_DB = os.path.join(os.path.split(__file__)[0], 'tranzlator.json') # Change in setup.py, too
 
+# Compiled dictionaries live here, one per source database and Python version
+COMPILED_DB_DIRECTORY = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join('~', '.cache')), 'lolologist')
+
+# Dictionaries already loaded by this process, by source path: {path: (signature, dictionary)}
+_LOADED_DBS = {}
+
+class CompiledDictionary(object):
+    """
+    A read-only word -> translation mapping backed by two sorted tuples,
+    which marshal loads far faster than json builds a dict.
+    """
+
+    def __init__(self, words, translations):
+        self.words = words
+        self.translations = translations
+
+    def get(self, word, default=None):
+        index = bisect_left(self.words, word)
+        if index < len(self.words) and self.words[index] == word:
+            return self.translations[index]
+        return default
+
+    def __getitem__(self, word):
+        translation = self.get(word)
+        if translation is None:
+            raise KeyError(word)
+        return translation
+
+    def __contains__(self, word):
+        return self.get(word) is not None
+
+    def __len__(self):
+        return len(self.words)
+
+def _compiled_db_path(db):
+    """ Where the compiled form of a source database is kept. """
+    digest = hashlib.sha1(os.path.abspath(db).encode('utf-8')).hexdigest()[:16]
+    name = 'lolz-%s-py%d%d-m%d.marshal' % ((digest,) + tuple(sys.version_info[:2]) + (marshal.version,))
+    return os.path.join(os.path.expanduser(COMPILED_DB_DIRECTORY), name)
+
+def _read_compiled_db(path, signature):
+    """ Loads a compiled database, or returns None if it's missing, corrupt or out of date. """
+    try:
+        with open(path, 'rb') as f:
+            compiled_signature, words, translations = marshal.loads(f.read())
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return None
+    if tuple(compiled_signature) != signature:
+        return None
+    return CompiledDictionary(words, translations)
+
+def _compile_db(db, path, signature):
+    """ Parses a JSON database and saves its compiled form. """
+    try:
+        f = open(db, 'r')
+    except:
+        raise IOError("Unable to open lolz database: %s" % db)
+    try:
+        source = json.load(f)
+    except:
+        raise IOError("Specified lolz database unreadable.")
+    finally:
+        f.close()
+    words = tuple(sorted(source))
+    translations = tuple(source[word] for word in words)
+    try:
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        write_atomic(path, marshal.dumps((signature, words, translations)), sync=False)
+    except (IOError, OSError):
+        pass # a read-only cache just means compiling again next time
+    return CompiledDictionary(words, translations)
+
+def load_db(db=DEFAULT_LOLZ_DB):
+    """
+    Gets a lolz database, compiling it if the JSON source changed since it was last compiled.
+    Databases are only loaded once per process.
+    """
+    try:
+        stat = os.stat(db)
+    except OSError:
+        raise IOError("Unable to open lolz database: %s" % db)
+    signature = (stat.st_mtime, stat.st_size)
+    path = os.path.abspath(db)
+    loaded = _LOADED_DBS.get(path)
+    if loaded is not None and loaded[0] == signature:
+        return loaded[1]
+    compiled_path = _compiled_db_path(path)
+    dictionary = _read_compiled_db(compiled_path, signature)
+    if dictionary is None:
+        dictionary = _compile_db(db, compiled_path, signature)
+    _LOADED_DBS[path] = (signature, dictionary)
+    return dictionary
+
 class Tranzlator(object):
     """
     LOLz Translator Class
@@ -29,91 +127,86 @@ class Tranzlator(object):
     >>> t = Tranzlator()
     >>> t.translate_sentence("Hello. My English is perfect and produces a lot of statisfaction with intentional misspellings.")
     'y halo thar. mah english iz perfik an producez lot ov statisfacshun wif intentional misspellingz.'
-    >>> t.cached
-    {'': '', 'statisfaction': 'statisfacshun', 'lot': 'lot', 'english': 'english', 'intentional': 'intentional', 'misspellings': 'misspellingz'}
+    >>> list(t.translate_many(["Cats are awesome", "I'm processing"]))
+    ['catz r awsum', "i'm processin"]
+    >>> t.translate_word.cache_info().currsize
+    21
 
     """
 
+    # reminder to self...
+    # ([\w]*) - match 0 or more a-zA-Z0-9_ group
+    # ([\W]*) - match 0 or more non-(see above) group
+    tokenizer = re.compile(r"([\w]*)([\W]*)")
+
+    # a possesive apostrophy or the like
+    apostrophy = re.compile(r"(?P<prefix>.*)(?P<suffix>[']\w*)")
+
+    # Every heuristic rewrites a word ending. No word can end in more than one of them, so they're matched in a
+    # single pass; the name of the last group that matched says which rule fired.
+    suffixes = re.compile(r"(?:(?P<ed>.*)ed|(?P<ing>.*)ing|(?P<ss>.*)ss|(?P<er>.*)er"
+                          r"|(?P<tion>.*)tion(?P<tions>s?)|(?P<stoz>\w+)(?<!ou)s)$")
+
     # simple search/replace of word endings
-    easy_regex = [
-            (re.compile("(.*)ed$"), 'd'),
-            (re.compile("(.*)ing$"), 'in'),
-            (re.compile("(.*)ss$"), 's'),
-            (re.compile("(.*)er$"), 'r'),
-            ]
-
-    # more complicated search/replace operations
-    regex = {
-            'apostrophy' : re.compile('(?P<prefix>.*)(?P<suffix>[\']\w*)'),
-            'tion' : re.compile("(.*)tion(s?)$"),
-            'stoz' : re.compile("^([\w]+)s$"),
-            'ous' : re.compile("ous$"),
-            }
+    easy_replacements = {'ed': 'd', 'ing': 'in', 'ss': 's', 'er': 'r'}
+
+    # the most words to remember translations for
+    max_cached_words = 10000
 
     def __init__(self, db=DEFAULT_LOLZ_DB, heuristics=True):
         super(Tranzlator, self).__init__()
         self.heuristics = heuristics
-        self.cached = {}
-        try:
-            f = open(db, 'r')
-        except:
-            raise IOError("Unable to open lolz database: %s" % db)
-        try:
-            self.db = json.load(f)
-        except:
-            raise IOError("Specified lolz database unreadable.")
-        f.close()
+        # Each instance gets its own bounded cache of translated words
+        self.translate_word = lru_cache(maxsize=self.max_cached_words)(self.translate_word)
+        self.db = load_db(db)
+
+    def __apply_heuristics(self, word):
+        match = self.suffixes.match(word)
+        if match is None:
+            return word
+        rule = match.lastgroup
+        if rule == 'tions':
+            return match.group('tion') + 'shun' + match.group('tions')
+        if rule == 'stoz':
+            return match.group('stoz') + 'z'
+        return match.group(rule) + self.easy_replacements[rule]
 
     def translate_word(self, word):
+        # the instance's LRU cache wraps this, so it only runs for words that haven't been seen recently
         # lower case lolz pleaz, ph is pronounces f!
-        word = word.lower()
-        word = word.replace('ph', 'f')
-
-        # fastest, check the cache...
-        if word in self.cached:
-            return self.cached[word]
+        word = word.lower().replace('ph', 'f')
 
         # easiest first, look in dictionary
-        if word in self.db:
-            return self.db[word]
+        translation = self.db.get(word)
+        if translation is not None:
+            return translation
 
         # not found, perhaps a possesive apostrophy or the like?
-        if self.regex['apostrophy'].search(word):
-            result = self.regex['apostrophy'].search(word).groupdict()
-            if result['prefix'] in self.db:
-                self.cached[word] = '%s%s' % (self.db[result['prefix']], result['suffix'])
-                return self.cached[word]
+        if "'" in word:
+            result = self.apostrophy.match(word)
+            if result and result.group('prefix') in self.db:
+                return self.db[result.group('prefix')] + result.group('suffix')
 
         # no matches? try heuristics unless we've been told otherwise
         if self.heuristics is True:
-            for regex, replace in self.easy_regex:
-                match = regex.search(word)
-                if match:
-                    self.cached[word] = match.group(1)+replace
-                    return self.cached[word]
-            tion = self.regex['tion'].search(word)
-            if tion:
-                self.cached[word] = tion.group(1)+'shun'+tion.group(2)
-                return self.cached[word]
-            stoz = self.regex['stoz'].search(word)
-            if stoz and not self.regex['ous'].search(word):
-                self.cached[word] = stoz.group(1)+'z'
-                return self.cached[word]
+            return self.__apply_heuristics(word)
 
         # no matches, leave it alone!
-        self.cached[word] = word
         return word
 
     def translate_sentence(self, sentence):
-        new_sentence = ''
-        # reminder to self...
-        # ([\w]*) - match 0 or more a-zA-Z0-9_ group
-        # ([\W]*) - match 0 or more non-(see above) group
-        for word, space in re.findall("([\w]*)([\W]*)", sentence):
-            word = self.translate_word(word)
+        translate = self.translate_word
+        parts = []
+        for word, space in self.tokenizer.findall(sentence):
+            word = translate(word)
             if word != '':
-                new_sentence += word + space
-        return new_sentence
+                parts.append(word)
+                parts.append(space)
+        return ''.join(parts)
+
+    def translate_many(self, sentences):
+        """ Lazily translates each of the sentences, sharing one word cache across all of them. """
+        return (self.translate_sentence(sentence) for sentence in sentences)
 
 def _test():
     import doctest
@@ -11,23 +11,70 @@ Repository handlers for lolologist.
 from __future__ import unicode_literals, print_function
 
 from datetime import datetime
-import git
 import os
 import os.path
 import stat
 
+from . import gitobjects
 from .utils import LolologistError
 
+# How many repositories `register_tree` and `deregister_tree` change at once
+TREE_JOBS = 16
+
+# What happened to each repository in a tree
+INSTALLED, REMOVED, SKIPPED, FAILED = 'installed', 'removed', 'skipped', 'failed'
+
+class HookUnchanged(LolologistError):
+    """ The post-commit hook was left alone, because it's already there or isn't lolologist's """
+    pass
+
+def bad_revision_errors():
+    """ Gets the errors GitPython raises for unresolvable revisions. Older releases lack `BadName`. """
+    import git
+    return (git.BadObject, ValueError) + ((git.BadName,) if hasattr(git, 'BadName') else ())
+
 class GitRepository(object):
-    """ A git repository """
+    """ A git repository
+
+    Reading HEAD (or any full ref or sha) goes through `gitobjects`, which doesn't start GitPython. GitPython is
+    only loaded for what that can't handle, such as abbreviated revisions, revision ranges, or bare repositories.
+
+    """
 
     def __init__(self, repository):
+        self.path = repository
+        self.__repo = None
         try:
-            self.repo = git.Repo(repository)
+            self.layout = gitobjects.find_repository(repository)
+            if self.layout.work_tree != os.path.abspath(repository):
+                # GitPython doesn't search parent directories, so neither does lolologist
+                raise gitobjects.Unsupported("'{}' isn't the top of a work tree.".format(repository))
+        except gitobjects.Unsupported:
+            # Let GitPython decide whether it's a repository at all, and report why not
+            self.layout = None
+            self.__open()
+
+    def __open(self):
+        """ Opens the repository with GitPython. """
+        import git
+        try:
+            self.__repo = git.Repo(self.path)
         except git.InvalidGitRepositoryError:
-            raise LolologistError("The path '{}' must contain a valid git repository.".format(repository))
+            raise LolologistError("The path '{}' must contain a valid git repository.".format(self.path))
         except git.NoSuchPathError:
-            raise LolologistError("The path '{}' is invalid.".format(repository))
+            raise LolologistError("The path '{}' is invalid.".format(self.path))
+
+    @property
+    def repo(self):
+        """ The GitPython repository, opened the first time it's needed. """
+        if self.__repo is None:
+            self.__open()
+        return self.__repo
+
+    @property
+    def git_dir(self):
+        """ The repository's git directory. """
+        return self.layout.git_dir if self.layout else self.repo.git_dir
 
     def __get_hooks_dir(self, base_dir_path):
         """ Gets the path to the hooks directory, creating it if it doesn't exist
@@ -46,7 +93,7 @@ class GitRepository(object):
         hooks_dir = self.__get_hooks_dir(base_dir_path)
         hook_file = os.path.join(hooks_dir, 'post-commit')
         if os.path.isfile(hook_file): #TODO: Handle multiple post-commit events in the future
-            raise LolologistError("There is already a post-commit hook registered for this repository.")
+            raise HookUnchanged("There is already a post-commit hook registered for this repository.")
 
         with open(hook_file, 'w') as script:
             script.write(hook_text)
@@ -58,38 +105,127 @@ class GitRepository(object):
     def register(self, hook_text):
         """ Registers the githooks """
         print("Adding hook to main repository.")
-        self._add_hook(self.repo.git_dir, hook_text)
-
-        # The below code won't work until gitpython fixes their submodule support
-        # modules_dir = os.path.join(self.repo.git_dir, 'modules')
-        # if os.path.isdir(modules_dir):
-        #     for submodule in self.repo.submodules:
-        #         print("Adding hook to subrepository: ", submodule.path)
-        #         self.__add_hook(os.path.join(modules_dir, submodule.path), hook_text)
-        #
+        self._add_hook(self.git_dir, hook_text)
+        # Submodules are registered by `register_tree`, since each has its own git directory
         return True
 
 
     def deregister(self):
         """ Removes the commit hook from the repository. """
-        hooks_dir = os.path.join(self.repo.git_dir, 'hooks')
+        hooks_dir = os.path.join(self.git_dir, 'hooks')
         hook_file = os.path.join(hooks_dir, 'post-commit')
         if not os.path.isdir(hooks_dir) or not os.path.isfile(hook_file):
-            raise LolologistError("lolologist does not appear to be registered with this repository.")
+            raise HookUnchanged("lolologist does not appear to be registered with this repository.")
+        with open(hook_file, 'rb') as script:
+            if b'lolologist' not in script.read():
+                raise HookUnchanged("The post-commit hook in this repository isn't lolologist's.")
 
-        os.remove(hook_file) #TODO: ensure this is actually lolologist's
+        os.remove(hook_file)
 
 
     def get_newest_commit(self, translator=None):
         """ Gets the latest commit in the repository, with an optional formatter for free text areas. """
+        return self.get_commit('HEAD', translator=translator)
+
+    def get_commit(self, revision, translator=None):
+        """ Gets a specific commit in the repository, with an optional formatter for free text areas. """
+        if self.layout is not None:
+            try:
+                return self.__describe(gitobjects.read_commit(self.layout, revision), translator)
+            except gitobjects.Unsupported:
+                pass
+        try:
+            commit = self.repo.commit(revision)
+        except bad_revision_errors():
+            raise LolologistError("The revision '{}' could not be found.".format(revision))
+        return self.__describe(commit, translator)
+
+    def iter_commits(self, rev_range, translator=None):
+        """Streams the commits in a revision range, newest first, without loading them all up front
+
+        :param rev_range: Anything `git rev-list` accepts, e.g. `v0.4.0..HEAD`
+        :param translator: An optional formatter for free text areas
+        :returns: An iterator of commit dictionaries, like `get_commit`
+
+        """
+        import git
+        try:
+            for commit in self.repo.iter_commits(rev_range):
+                yield self.__describe(commit, translator)
+        except git.GitCommandError:
+            raise LolologistError("The revision range '{}' could not be found.".format(rev_range))
+
+    def __describe(self, commit, translator=None):
+        """ Gets the fields lolologist uses from a commit, either GitPython's or a `gitobjects.Commit`. """
         if not translator:
             translator = lambda x: x
-        head_ref = self.repo.head.commit
+        work_tree = self.layout.work_tree if self.layout else self.repo.working_dir
         return {
-            "project" : os.path.basename(self.repo.working_dir),
-            "revision" : head_ref.hexsha[0:10],
-            "summary" : translator(head_ref.summary),
-            "message" : translator(head_ref.message),
-            "time" : datetime.fromtimestamp(head_ref.committed_date),
+            "project" : os.path.basename(work_tree),
+            "revision" : commit.hexsha[0:10],
+            "summary" : translator(commit.summary),
+            "message" : translator(commit.message),
+            "time" : datetime.fromtimestamp(commit.committed_date),
+            # GitPython's commits have an `Actor`
+            "author" : getattr(commit.author, 'name', commit.author),
         }
 
+
+def find_repositories(root):
+    """Finds the work trees under a directory, including checked out submodules and nested repositories
+
+    :param root: The directory to search
+    :returns: An iterator of work tree paths, parents before their children
+
+    """
+    for directory, subdirectories, files in os.walk(root):
+        if '.git' in subdirectories or '.git' in files:
+            yield directory
+        subdirectories[:] = sorted(name for name in subdirectories if name != '.git')
+
+def _change_tree(root, change, done, jobs):
+    """Applies a change to every repository under a directory, several at a time
+
+    :param root: The directory to search
+    :param change: Called with each `GitRepository`. Raises `HookUnchanged` to skip the repository.
+    :param done: The outcome when `change` succeeds
+    :param jobs: How many repositories are changed at once
+    :returns: A list of `(path, outcome, message)` tuples, in the order the repositories were found
+
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def apply(path):
+        """ Changes one repository, turning errors into an outcome. """
+        try:
+            change(GitRepository(path))
+            return path, done, None
+        except HookUnchanged as err:
+            return path, SKIPPED, str(err)
+        except (LolologistError, IOError, OSError) as err:
+            return path, FAILED, str(err)
+
+    with ThreadPoolExecutor(max_workers=jobs or TREE_JOBS) as executor:
+        return list(executor.map(apply, find_repositories(root)))
+
+def register_tree(root, hook_text, jobs=None):
+    """Adds the post-commit hook to every repository under a directory
+
+    :param root: The directory to search
+    :param hook_text: The hook script
+    :param jobs: How many repositories are registered at once. Defaults to `TREE_JOBS`.
+    :returns: `(path, outcome, message)` tuples, where outcome is `INSTALLED`, `SKIPPED` or `FAILED`
+
+    """
+    return _change_tree(root, lambda repository: repository._add_hook(repository.git_dir, hook_text),
+                        INSTALLED, jobs)
+
+def deregister_tree(root, jobs=None):
+    """Removes lolologist's post-commit hook from every repository under a directory
+
+    :param root: The directory to search
+    :param jobs: How many repositories are deregistered at once. Defaults to `TREE_JOBS`.
+    :returns: `(path, outcome, message)` tuples, where outcome is `REMOVED`, `SKIPPED` or `FAILED`
+
+    """
+    return _change_tree(root, lambda repository: repository.deregister(), REMOVED, jobs)
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# pylint: disable=I0011
+
+"""
+An on-disk job spool for lolologist. Jobs are small JSON records that survive crashes, sleeps and reboots;
+a job is only removed once it has been processed successfully.
+
+    Aru Sahni <arusahni@gmail.com>
+"""
+
+from __future__ import unicode_literals
+
+from contextlib import contextmanager
+import errno
+import fcntl
+import json
+import logging
+import os
+import os.path
+import random
+import time
+import uuid
+
+from .utils import LolologistError, write_atomic
+
+LOG = logging.getLogger("lolologist")
+
+# How many times a job is attempted before it is moved to the failed directory
+MAX_ATTEMPTS = 5
+# The delay (in seconds) before the first retry. Doubles with each subsequent attempt.
+RETRY_DELAY = 30
+
+class JobSpool(object):
+    """ An ordered, durable queue of jobs backed by a directory """
+
+    def __init__(self, directory, max_attempts=MAX_ATTEMPTS, retry_delay=RETRY_DELAY):
+        """Opens (and creates, if necessary) the spool
+
+        :param directory: The directory holding the spool
+        :param max_attempts: How many times a job is tried before it is considered failed
+        :param retry_delay: The base delay (in seconds) between attempts
+
+        """
+        self.directory = os.path.expanduser(directory)
+        self.pending_directory = os.path.join(self.directory, 'pending')
+        self.failed_directory = os.path.join(self.directory, 'failed')
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        for path in (self.pending_directory, self.failed_directory):
+            if not os.path.isdir(path):
+                try:
+                    os.makedirs(path)
+                except OSError as exc:
+                    if exc.errno != errno.EEXIST:
+                        raise
+
+    @staticmethod
+    def _read(path):
+        """ Reads a job record, returning `None` if it vanished or is unreadable. """
+        try:
+            with open(path, 'rb') as job_file:
+                return json.loads(job_file.read().decode('utf-8'))
+        except (IOError, OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _list(directory):
+        """ Lists the job names in a directory in the order they were enqueued. """
+        return sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+
+    def push(self, record):
+        """Adds a job to the end of the spool
+
+        :param record: A JSON-serializable dictionary describing the job
+        :returns: The name of the job
+
+        """
+        name = '{:020d}-{}.json'.format(int(time.time() * 1000000), uuid.uuid4().hex[:8])
+        record = dict(record, attempts=0, not_before=0)
+        write_atomic(os.path.join(self.pending_directory, name), json.dumps(record).encode('utf-8'))
+        return name
+
+    def pending(self):
+        """Lists the pending jobs, oldest first
+
+        :returns: A list of `(name, record)` tuples
+
+        """
+        jobs = []
+        for name in self._list(self.pending_directory):
+            record = self._read(os.path.join(self.pending_directory, name))
+            if record is not None:
+                jobs.append((name, record))
+        return jobs
+
+    def failed(self):
+        """Lists the jobs that ran out of attempts, oldest first
+
+        :returns: A list of `(name, record)` tuples
+
+        """
+        jobs = []
+        for name in self._list(self.failed_directory):
+            record = self._read(os.path.join(self.failed_directory, name))
+            if record is not None:
+                jobs.append((name, record))
+        return jobs
+
+    def complete(self, name):
+        """ Removes a successfully processed job from the spool. """
+        os.remove(os.path.join(self.pending_directory, name))
+
+    def retry(self, name, record, error):
+        """Records a failed attempt, rescheduling the job or moving it to the failed directory
+
+        :param name: The name of the job
+        :param record: The job's record
+        :param error: A description of what went wrong
+        :returns: `True` if the job will be retried
+
+        """
+        record = dict(record, attempts=record.get('attempts', 0) + 1, error=error)
+        if record['attempts'] >= self.max_attempts:
+            write_atomic(os.path.join(self.failed_directory, name), json.dumps(record).encode('utf-8'))
+            self.complete(name)
+            return False
+        delay = self.retry_delay * (2 ** (record['attempts'] - 1))
+        record['not_before'] = time.time() + delay * random.uniform(0.5, 1.0)
+        write_atomic(os.path.join(self.pending_directory, name), json.dumps(record).encode('utf-8'))
+        return True
+
+    @contextmanager
+    def lock(self):
+        """Takes the spool's worker lock, so only one worker drains it at a time
+
+        :raises LolologistError: If another worker holds the lock
+
+        """
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except (IOError, OSError):
+                raise LolologistError("Another worker is already draining '{}'.".format(self.directory))
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def __attempt(self, name, record, handler):
+        """Runs the handler on a job, then completes or reschedules it
+
+        :returns: A `(completed, failed)` tuple of job counts
+
+        """
+        try:
+            handler(record)
+        except Exception as exc: #pylint: disable=W0703
+            LOG.warning("Job %s failed: %s", name, exc)
+            return (0, 0) if self.retry(name, record, str(exc)) else (0, 1)
+        self.complete(name)
+        return (1, 0)
+
+    def drain(self, handler, sleep=time.sleep, concurrency=1):
+        """Processes jobs in order until the spool is empty, waiting out retry delays as needed
+
+        :param handler: A callable that takes a job record. Any exception counts as a failed attempt.
+        :param sleep: The function used to wait for delayed jobs
+        :param concurrency: How many jobs may be handled at once, on a pool of threads
+        :returns: A `(completed, failed)` tuple of job counts
+
+        """
+        executor = None
+        if concurrency > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            executor = ThreadPoolExecutor(max_workers=concurrency)
+        attempt = lambda job: self.__attempt(job[0], job[1], handler)
+        completed, failed = 0, 0
+        try:
+            while True:
+                jobs = self.pending()
+                if not jobs:
+                    return completed, failed
+                now = time.time()
+                ready = [(name, record) for name, record in jobs if record.get('not_before', 0) <= now]
+                if not ready:
+                    sleep(min(record['not_before'] for _, record in jobs) - now)
+                    continue
+                for batch in (executor.map(attempt, ready) if executor else map(attempt, ready)):
+                    completed, failed = completed + batch[0], failed + batch[1]
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    def drain_exclusively(self, handler, sleep=time.sleep, concurrency=1):
+        """Takes the worker lock and drains the spool, draining again if a job arrives as the lock is released
+
+        :param handler: A callable that takes a job record
+        :param sleep: The function used to wait for delayed jobs
+        :param concurrency: How many jobs may be handled at once
+        :returns: A `(completed, failed)` tuple of job counts
+        :raises LolologistError: If another worker holds the lock
+
+        """
+        with self.lock():
+            completed, failed = self.drain(handler, sleep, concurrency)
+        # A job queued while the lock was being released would otherwise wait for the next worker
+        while self.pending():
+            try:
+                with self.lock():
+                    batch = self.drain(handler, sleep, concurrency)
+            except LolologistError:
+                break
+            completed, failed = completed + batch[0], failed + batch[1]
+        return completed, failed
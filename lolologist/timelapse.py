@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# pylint: disable=I0011
+
+"""
+Timelapses of saved macros. Frames are decoded and resized a few at a time, in commit order, and streamed into an
+animated GIF or an external video encoder, so memory use doesn't grow with the number of frames.
+
+    Aru Sahni <arusahni@gmail.com>
+"""
+
+from __future__ import unicode_literals
+
+from collections import deque, namedtuple
+from datetime import datetime
+import io
+import multiprocessing
+import os
+import os.path
+import shlex
+import struct
+import subprocess
+
+from .encoders import read_metadata
+from .utils import LolologistError, open_image
+
+MACRO_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif')
+
+# Anything but a GIF is encoded by this command, which reads raw RGB frames from its standard input
+DEFAULT_ENCODER_COMMAND = ('ffmpeg -loglevel error -y -f rawvideo -pix_fmt rgb24 -s {width}x{height} -r {fps} -i - '
+                           '-pix_fmt yuv420p {output}')
+
+# A saved macro, and the commit it was made for. Macros that predate embedded commits only have a `path` and the
+# time they were saved.
+Macro = namedtuple('Macro', ['path', 'time', 'project', 'revision', 'author', 'summary'])
+
+def find_macros(directory):
+    """Finds the images under a directory
+
+    :param directory: The directory to search, e.g. the `OutputDirectory` with its fields left out
+    :returns: An iterator of paths
+
+    """
+    for root, subdirectories, files in os.walk(directory):
+        subdirectories.sort()
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in MACRO_EXTENSIONS:
+                yield os.path.join(root, name)
+
+def read_macro(path):
+    """Reads the commit a macro was made for
+
+    :param path: The macro
+    :returns: A `Macro`, or `None` if the file isn't an image
+
+    """
+    try:
+        metadata = read_metadata(path) or {}
+    except (IOError, OSError, SyntaxError):
+        return None
+    time = metadata.get('time') or datetime.fromtimestamp(os.path.getmtime(path))
+    return Macro(path, time, metadata.get('project'), metadata.get('revision'), metadata.get('author'),
+                 metadata.get('summary'))
+
+def scan(directory, jobs=None):
+    """Reads every macro under a directory, several at a time
+
+    :param directory: The directory to search
+    :param jobs: How many macros are read at once. Defaults to the number of CPUs.
+    :returns: A list of `Macro`s, in no particular order
+
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=jobs or multiprocessing.cpu_count()) as executor:
+        return [macro for macro in executor.map(read_macro, find_macros(directory)) if macro is not None]
+
+def select(macros, project=None, author=None, since=None, until=None):
+    """Filters macros and orders them by commit time
+
+    :param macros: `Macro`s
+    :param project: Only keep this project's macros
+    :param author: Only keep macros of commits whose author's name contains this, ignoring case
+    :param since: Only keep macros of commits made at or after this `datetime`
+    :param until: Only keep macros of commits made before this `datetime`
+    :returns: The macros that are kept, oldest first
+
+    """
+    author = author.lower() if author else None
+    kept = [macro for macro in macros
+            if (project is None or macro.project == project)
+            and (author is None or (macro.author and author in macro.author.lower()))
+            and (since is None or macro.time >= since)
+            and (until is None or macro.time < until)]
+    return sorted(kept, key=lambda macro: (macro.time, macro.path))
+
+def load_frame(path, size, prepare=None):
+    """Decodes a macro and fits it onto a frame
+
+    :param path: The macro
+    :param size: The frame's `(width, height)`
+    :param prepare: Called with the frame, to do any further work (e.g. encoding it) in the worker
+    :returns: An RGB `Image` of exactly that size, with the macro centered on black, or `None` if it can't be read.
+        If `prepare` was given, this is what it returned instead.
+
+    """
+    from PIL import Image
+    try:
+        image = open_image(path, size).convert('RGB')
+    except (IOError, OSError, SyntaxError):
+        return None
+    if image.size != size:
+        image.thumbnail(size)
+        frame = Image.new('RGB', size, (0, 0, 0))
+        frame.paste(image, ((size[0] - image.size[0]) // 2, (size[1] - image.size[1]) // 2))
+        image = frame
+    return prepare(image) if prepare else image
+
+def iter_frames(paths, size, jobs=None, prepare=None):
+    """Decodes and resizes macros across a thread pool, keeping only a few frames in flight
+
+    :param paths: The macros, in order
+    :param size: The frames' `(width, height)`
+    :param jobs: How many frames are decoded at once. Defaults to the number of CPUs.
+    :param prepare: Called with each frame in the pool, e.g. to encode it. Its results are yielded instead.
+    :returns: An iterator of frames, in order. Macros that can't be read are skipped.
+
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    jobs = jobs or multiprocessing.cpu_count()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        for path in paths:
+            pending.append(executor.submit(load_frame, path, size, prepare))
+            if len(pending) >= 2 * jobs:
+                frame = pending.popleft().result()
+                if frame is not None:
+                    yield frame
+        while pending:
+            frame = pending.popleft().result()
+            if frame is not None:
+                yield frame
+
+
+class GifWriter(object):
+    """ Writes an animated GIF one frame at a time
+
+    Pillow keeps every frame of an animated GIF in memory until it's saved, so each frame is encoded as a GIF of
+    its own and its image block is copied into the animation, its palette becoming a local color table.
+
+    """
+
+    def __init__(self, output, size, fps, loop=0):
+        """Starts the animation
+
+        :param output: A binary file to write to
+        :param size: The frames' `(width, height)`
+        :param fps: Frames per second. GIFs count time in hundredths of a second.
+        :param loop: How many times the animation repeats. 0 repeats it forever.
+
+        """
+        self.output = output
+        self.delay = max(1, int(round(100.0 / fps)))
+        self.frames = 0
+        output.write(b'GIF89a' + struct.pack('<HHBBB', size[0], size[1], 0, 0, 0))
+        output.write(b'!\xff\x0bNETSCAPE2.0\x03\x01' + struct.pack('<H', loop) + b'\x00')
+
+    @staticmethod
+    def encode(frame):
+        """Encodes a frame as a GIF of its own. This is the slow part of adding a frame, and is safe to run on
+        several frames at once.
+
+        :param frame: An `Image` of the animation's size
+        :returns: The encoded GIF
+
+        """
+        from PIL import Image
+        encoded = io.BytesIO()
+        frame.convert('P', palette=Image.ADAPTIVE).save(encoded, 'GIF')
+        return encoded.getvalue()
+
+    def add(self, frame):
+        """Appends a frame
+
+        :param frame: An `Image` of the animation's size, or its GIF from `encode`
+
+        """
+        data = bytearray(frame if isinstance(frame, bytes) else self.encode(frame))
+        flags = data[10]
+        position = 13
+        color_table = b''
+        if flags & 0x80:
+            color_table = bytes(data[position:position + 3 * 2 ** ((flags & 0x07) + 1)])
+            position += len(color_table)
+        while data[position] == 0x21:
+            # Skip extensions, which are sub-blocks after a label
+            position += 2
+            while data[position]:
+                position += data[position] + 1
+            position += 1
+        if data[position] != 0x2c or data[-1] != 0x3b:
+            raise LolologistError("Pillow wrote a GIF frame lolologist doesn't understand.")
+        descriptor = data[position:position + 10]
+        if color_table and not descriptor[9] & 0x80:
+            descriptor[9] |= 0x80 | (flags & 0x07)
+        else:
+            color_table = b''
+        # Each frame replaces the last one, and is shown for `delay` hundredths of a second
+        self.output.write(b'!\xf9\x04\x04' + struct.pack('<H', self.delay) + b'\x00\x00')
+        self.output.write(bytes(descriptor) + color_table + bytes(data[position + 10:-1]))
+        self.frames += 1
+
+    def close(self):
+        """ Ends the animation. """
+        self.output.write(b';')
+
+
+def write_gif(output_path, frames, size, fps):
+    """Streams frames into an animated GIF
+
+    :param output_path: Where the GIF is saved
+    :param frames: An iterator of `Image`s of the given size, or of their GIFs from `GifWriter.encode`
+    :param size: The frames' `(width, height)`
+    :param fps: Frames per second
+    :returns: The number of frames written
+
+    """
+    with open(output_path, 'wb') as output:
+        writer = GifWriter(output, size, fps)
+        for frame in frames:
+            writer.add(frame)
+        writer.close()
+    return writer.frames
+
+def pipe_frames(command, output_path, frames, size, fps):
+    """Streams frames, as raw RGB, into an external encoder
+
+    :param command: The encoder's command line. `{output}`, `{width}`, `{height}` and `{fps}` are filled in.
+    :param output_path: The file the encoder should write
+    :param frames: An iterator of `Image`s of the given size
+    :param size: The frames' `(width, height)`
+    :param fps: Frames per second
+    :returns: The number of frames written
+    :raises LolologistError: If the encoder can't be started or fails
+
+    """
+    arguments = [argument.format(output=output_path, width=size[0], height=size[1], fps=fps)
+                 for argument in shlex.split(command)]
+    try:
+        encoder = subprocess.Popen(arguments, stdin=subprocess.PIPE)
+    except OSError as exc:
+        raise LolologistError("Couldn't start '{}': {}".format(arguments[0], exc))
+    count = 0
+    try:
+        for frame in frames:
+            encoder.stdin.write(frame.tobytes())
+            count += 1
+    except IOError:
+        pass # The encoder quit early, which its exit status will explain
+    finally:
+        try:
+            encoder.stdin.close()
+        except IOError:
+            pass
+    if encoder.wait() != 0:
+        raise LolologistError("'{}' failed with exit status {}.".format(arguments[0], encoder.returncode))
+    return count
+
+def build(output_path, macros, size, fps, jobs=None, command=None):
+    """Builds a timelapse
+
+    :param output_path: Where the timelapse is saved. A `.gif` is encoded by lolologist, anything else by `command`.
+    :param macros: The `Macro`s to include, in order
+    :param size: The frames' `(width, height)`
+    :param fps: Frames per second
+    :param jobs: How many frames are decoded at once. Defaults to the number of CPUs.
+    :param command: The external encoder's command line. Defaults to `DEFAULT_ENCODER_COMMAND`.
+    :returns: The number of frames written
+
+    """
+    paths = [macro.path for macro in macros]
+    if command is None and os.path.splitext(output_path)[1].lower() == '.gif':
+        # Quantizing and compressing each frame is the slow part, so it's done in the pool too
+        return write_gif(output_path, iter_frames(paths, size, jobs, prepare=GifWriter.encode), size, fps)
+    return pipe_frames(command or DEFAULT_ENCODER_COMMAND, output_path, iter_frames(paths, size, jobs), size, fps)
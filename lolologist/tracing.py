@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# pylint: disable=I0011
+
+"""
+Timing spans for lolologist. While a trace is being recorded, each stage of a capture records how long it took,
+and the spans are appended to a log as JSON lines when the trace finishes.
+
+    Aru Sahni <arusahni@gmail.com>
+"""
+
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import json
+import os
+import os.path
+import threading
+import time
+import uuid
+from timeit import default_timer
+
+# Setting this to anything but an empty string or `0` traces every capture
+TRACE_ENVIRONMENT_VARIABLE = 'LOLOLOGIST_TRACE'
+
+# The trace being recorded, if any. Captures are never concurrent, but their stages may run on several threads.
+_ACTIVE = None
+
+class Trace(object):
+    """ The spans recorded during one traced operation """
+
+    def __init__(self, name):
+        """Starts a trace
+
+        :param name: What is being traced, e.g. `capture`
+
+        """
+        self.name = name
+        self.trace_id = uuid.uuid4().hex[:12]
+        self.started = time.time()
+        self.spans = []
+        self.__lock = threading.Lock()
+
+    def add(self, name, started, duration):
+        """Records a span
+
+        :param name: The stage, e.g. `render`
+        :param started: When the stage started, as a `default_timer` reading
+        :param duration: How long the stage took, in seconds
+
+        """
+        with self.__lock:
+            self.spans.append((name, started, duration))
+
+    def to_lines(self):
+        """ Serializes the spans as JSON lines, one per span, in the order they started. """
+        origin = min([started for _, started, _ in self.spans] or [0])
+        lines = []
+        for name, started, duration in sorted(self.spans, key=lambda span: span[1]):
+            lines.append(json.dumps(OrderedDict([
+                ("trace", self.trace_id),
+                ("operation", self.name),
+                ("time", self.started),
+                ("span", name),
+                ("offset_ms", round((started - origin) * 1000, 3)),
+                ("ms", round(duration * 1000, 3)),
+            ])))
+        return lines
+
+
+def enabled_by_environment():
+    """ Determines if the environment asks for captures to be traced. """
+    return os.environ.get(TRACE_ENVIRONMENT_VARIABLE, '') not in ('', '0')
+
+def now():
+    """ Gets a timer reading for `record_span`. """
+    return default_timer()
+
+def record_span(name, started):
+    """Records a span that started at the given timer reading and ends now, if a trace is being recorded
+
+    :param name: The stage
+    :param started: A reading from `now`
+
+    """
+    trace = _ACTIVE
+    if trace is not None:
+        trace.add(name, started, default_timer() - started)
+
+@contextmanager
+def span(name):
+    """ Times the block as a named stage of the trace being recorded, if any. """
+    if _ACTIVE is None:
+        yield
+        return
+    started = default_timer()
+    try:
+        yield
+    finally:
+        record_span(name, started)
+
+@contextmanager
+def trace(name, log_path):
+    """Records a trace around the block, appending its spans to a log when the block exits
+
+    Traces don't nest. Inside another trace, the block's spans are recorded as part of the outer one.
+
+    :param name: What is being traced, e.g. `capture`. The whole block is recorded as a span with this name.
+    :param log_path: The JSON lines file the spans are appended to, or `None` not to trace at all
+
+    """
+    global _ACTIVE
+    if log_path is None or _ACTIVE is not None:
+        with span(name):
+            yield
+        return
+    _ACTIVE = Trace(name)
+    try:
+        with span(name):
+            yield
+    finally:
+        recorded, _ACTIVE = _ACTIVE, None
+        _write(log_path, recorded.to_lines())
+
+def _write(log_path, lines):
+    """ Appends lines to the span log in a single write, so concurrent processes don't interleave them. """
+    directory = os.path.dirname(log_path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    descriptor = os.open(log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(descriptor, ''.join(line + '\n' for line in lines).encode('utf-8'))
+    finally:
+        os.close(descriptor)
+
+def percentile(samples, fraction):
+    """ Gets the nearest-rank percentile of the samples. """
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def summarize(log_path):
+    """Summarizes a span log per stage
+
+    :param log_path: The JSON lines file spans were appended to
+    :returns: `(span, count, p50 ms, p95 ms)` tuples, slowest median first. A stage that ran several times in one
+        trace (e.g. `translate`) counts once, with its total time. Unreadable lines are skipped.
+
+    """
+    totals = OrderedDict()
+    with open(log_path, 'rb') as log_file:
+        for line in log_file:
+            try:
+                record = json.loads(line.decode('utf-8'))
+                key = (record["span"], record["trace"])
+                totals[key] = totals.get(key, 0) + float(record["ms"])
+            except (ValueError, KeyError, TypeError):
+                continue
+    durations = OrderedDict()
+    for (name, _), total in totals.items():
+        durations.setdefault(name, []).append(total)
+    rows = [(name, len(samples), percentile(samples, 0.5), percentile(samples, 0.95))
+            for name, samples in durations.items()]
+    return sorted(rows, key=lambda row: -row[2])
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# pylint: disable=I0011
+
+"""
+A persistent upload queue for lolologist. Macros are queued in a spool and uploaded in the background over
+pooled connections, so a slow or unreachable image host never holds up a commit, and a failed upload is
+retried rather than lost.
+
+    Aru Sahni <arusahni@gmail.com>
+"""
+
+from __future__ import unicode_literals
+
+import logging
+import threading
+import time
+
+from .spool import JobSpool, MAX_ATTEMPTS, RETRY_DELAY
+from .utils import UPLOAD_TIMEOUT, upload
+
+LOG = logging.getLogger("lolologist")
+
+# How many uploads may be in flight at once
+UPLOAD_CONCURRENCY = 4
+
+class UploadQueue(object):
+    """ A durable queue of macros waiting to be uploaded """
+
+    def __init__(self, directory, concurrency=UPLOAD_CONCURRENCY, timeout=UPLOAD_TIMEOUT,
+                 max_attempts=MAX_ATTEMPTS, retry_delay=RETRY_DELAY):
+        """Opens (and creates, if necessary) the queue
+
+        :param directory: The directory holding the queue's spool
+        :param concurrency: How many uploads may be in flight at once
+        :param timeout: The `(connect, read)` timeouts for each upload, in seconds
+        :param max_attempts: How many times an upload is tried before it is considered failed
+        :param retry_delay: The base delay (in seconds) between attempts
+
+        """
+        self.spool = JobSpool(directory, max_attempts=max_attempts, retry_delay=retry_delay)
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.__session = None
+        self.__session_lock = threading.Lock()
+
+    def push(self, url, path):
+        """Queues a macro for upload
+
+        :param url: The endpoint to POST the macro to
+        :param path: The macro to upload
+        :returns: The name of the queued upload
+
+        """
+        return self.spool.push({"url" : url, "path" : path, "queued" : time.time()})
+
+    def pending(self):
+        """ Lists the uploads still to be made, oldest first, as `(name, record)` tuples. """
+        return self.spool.pending()
+
+    def failed(self):
+        """ Lists the uploads that ran out of attempts, oldest first, as `(name, record)` tuples. """
+        return self.spool.failed()
+
+    def __get_session(self):
+        """ Gets the session whose connection pool fits every in-flight upload, creating it if need be. """
+        with self.__session_lock:
+            if self.__session is None:
+                import requests
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self.__session = session
+            return self.__session
+
+    def close(self):
+        """ Closes the pooled connections. """
+        with self.__session_lock:
+            if self.__session is not None:
+                self.__session.close()
+                self.__session = None
+
+    def upload(self, url, path, data=None):
+        """Uploads a macro right away over the pooled connections, without queueing it
+
+        :param url: The endpoint to POST the macro to
+        :param path: The macro's path, which names the upload
+        :param data: The macro's encoded bytes. Read from `path` if not given.
+        :returns: The URL of the uploaded image
+        :raises LolologistError: If the upload fails
+
+        """
+        return upload(url, path, session=self.__get_session(), timeout=self.timeout, data=data)
+
+    def flush(self, on_upload=None, sleep=time.sleep):
+        """Uploads everything in the queue, waiting out retry delays as needed
+
+        :param on_upload: Called with `(record, image_url)` after each successful upload
+        :param sleep: The function used to wait for delayed uploads
+        :returns: A `(completed, failed)` tuple of upload counts
+        :raises LolologistError: If another process is already flushing the queue
+
+        """
+        def handler(record):
+            """ Uploads a single macro. """
+            image_url = self.upload(record["url"], record["path"])
+            LOG.info("Uploaded %s to %s", record["path"], image_url)
+            if on_upload:
+                on_upload(record, image_url)
+
+        return self.spool.drain_exclusively(handler, sleep=sleep, concurrency=self.concurrency)
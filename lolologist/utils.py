@@ -18,8 +18,13 @@ import sys
 if sys.version_info >= (3,):
     from builtins import super
 
+from collections import namedtuple, OrderedDict
+import os
 import os.path
-import requests
+import uuid
+
+# The (connect, read) timeouts for uploads, in seconds
+UPLOAD_TIMEOUT = (5, 30)
 
 class LolologistError(Exception):
     """ Custom error type """
@@ -34,14 +39,156 @@ class LolologistError(Exception):
     def __str__(self):
         return repr(self.message)
 
-def upload(url, path):
-    """ POSTs the file at the given path to the specified endpoint. """
+def _fsync_directory(path):
+    """ Flushes a directory entry to disk so that renames into it survive a power loss. """
+    descriptor = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+def write_atomic(path, data, sync=True):
+    """Writes the data to the given path, replacing any existing file in a single step
+
+    Readers see either the old file or the new one, never a partial write.
+
+    :param path: The full path of the destination file
+    :param data: The bytes to write
+    :param sync: Whether to flush the file and its directory entry to disk, so the write survives a power loss
+
+    """
+    temp_path = '{}.{}.tmp'.format(path, uuid.uuid4().hex[:8])
+    try:
+        with open(temp_path, 'wb') as temp_file:
+            temp_file.write(data)
+            if sync:
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+        os.rename(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    if sync:
+        _fsync_directory(os.path.dirname(os.path.abspath(path)))
+
+
+def open_image(source, size=None):
+    """Opens and decodes an image, letting JPEGs skip the detail that would be scaled away
+
+    JPEGs are decoded at the smallest DCT scale (1/1, 1/2, 1/4 or 1/8) that still covers the given size, so the
+    final resample starts from as few pixels as possible. Other formats are decoded in full.
+
+    :param source: A path or a file object
+    :param size: The `(width, height)` box the image is going to be scaled down to, if it is
+    :returns: The loaded PIL `Image`
+
+    """
+    from PIL import Image
+    image = Image.open(source)
+    if size is not None and image.format == 'JPEG':
+        image.draft(image.mode, (int(size[0]), int(size[1])))
+    image.load()
+    return image
+
+
+class LRUCache(object):
+    """ A mapping that forgets its least recently used entries once it grows past a maximum size """
+
+    _MISSING = object()
+
+    def __init__(self, max_size):
+        """Creates an empty cache
+
+        :param max_size: The most entries to keep
+
+        """
+        self.max_size = max_size
+        self.__entries = OrderedDict()
+
+    def get(self, key, default=None):
+        """ Gets a value, marking it as the most recently used. """
+        value = self.__entries.get(key, self._MISSING)
+        if value is self._MISSING:
+            return default
+        try:
+            self.__entries.move_to_end(key)
+        except AttributeError: # Python 2
+            self.__entries[key] = self.__entries.pop(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.__entries.pop(key, None)
+        self.__entries[key] = value
+        while len(self.__entries) > self.max_size:
+            self.__entries.popitem(last=False)
+
+    def __getitem__(self, key):
+        value = self.get(key, self._MISSING)
+        if value is self._MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return key in self.__entries
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __repr__(self):
+        return 'LRUCache({!r})'.format(dict(self.__entries))
+
+    def clear(self):
+        """ Removes every entry. """
+        self.__entries.clear()
+
+
+try:
+    from functools import lru_cache
+except ImportError: # Python 2
+    CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+    def lru_cache(maxsize=128):
+        """ A minimal stand-in for Python 3's `functools.lru_cache`, for functions of hashable positional args. """
+        def decorator(function):
+            cache = LRUCache(maxsize)
+            stats = {'hits': 0, 'misses': 0}
+            def wrapper(*args):
+                value = cache.get(args, LRUCache._MISSING)
+                if value is LRUCache._MISSING:
+                    stats['misses'] += 1
+                    value = function(*args)
+                    cache[args] = value
+                else:
+                    stats['hits'] += 1
+                return value
+            wrapper.cache_clear = cache.clear
+            wrapper.cache_info = lambda: CacheInfo(stats['hits'], stats['misses'], maxsize, len(cache))
+            return wrapper
+        return decorator
+
+
+def upload(url, path, session=None, timeout=UPLOAD_TIMEOUT, data=None):
+    """POSTs the file at the given path to the specified endpoint.
+
+    :param url: The endpoint to POST to
+    :param path: The image to upload
+    :param session: An optional `requests.Session` whose pooled connections are reused
+    :param timeout: The `(connect, read)` timeouts, in seconds
+    :param data: The image's bytes, if they're already in memory. The file at `path` isn't read then.
+    :returns: The URL of the uploaded image
+
+    """
+    import requests
+    post = session.post if session is not None else requests.post
     try:
-        image = open(path, 'rb')
-        req = requests.post(url, files={'file': (os.path.basename(path), image)})
+        image = data if data is not None else open(path, 'rb')
+        req = post(url, files={'file': (os.path.basename(path), image)}, timeout=timeout)
         if req.status_code != 200:
             raise LolologistError("Couldn't upload the file: {} - {}".format(req.status_code, req.text))
         return req.json().get("data").get("img_url")
+    except requests.exceptions.Timeout as e:
+        raise LolologistError("The upload timed out. {}".format(str(e)))
     except requests.exceptions.ConnectionError as e:
         raise LolologistError("Couldn't connect to the host. {}".format(str(e)))
     except requests.exceptions.HTTPError as e:
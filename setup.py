@@ -25,6 +25,7 @@ REQUIREMENTS = [
 
 if sys.version_info <= (3,):
     REQUIREMENTS.append('configparser==3.5.0') # Using the beta for PyPy compatibility
+    REQUIREMENTS.append('futures')
 
 VERSION = '0.5.5'
 
@@ -0,0 +1,45 @@
+from __future__ import unicode_literals
+
+import pytest
+
+from tests import helpers
+
+@pytest.fixture
+def commit_summaries():
+    """ The commit messages `make_repository` cycles through. """
+    return helpers.COMMIT_SUMMARIES
+
+@pytest.fixture
+def make_repository():
+    """ Creates a git repository with a deterministic history: `make_repository(path, commits=20)`. """
+    return helpers.make_repository
+
+@pytest.fixture
+def make_image():
+    """ Writes a deterministic image with some detail to it: `make_image(path, size=(640, 480))`. """
+    return helpers.make_image
+
+@pytest.fixture
+def home(tmpdir, monkeypatch):
+    """ An empty home directory, standing in for the user's. """
+    directory = tmpdir.mkdir('home')
+    monkeypatch.setenv('HOME', str(directory))
+    return directory
+
+@pytest.fixture
+def write_config(home):
+    """ Writes a `.lolologistrc` into the home directory: `write_config(output_directory, **settings)`. """
+    def write(output_directory, **settings):
+        helpers.write_config(str(home), output_directory, **settings)
+    return write
+
+@pytest.fixture
+def make_app(tmpdir, make_repository, write_config):
+    """ Creates a `Lolologist` for a fresh repository, saving macros under `out`:
+    `make_app(commits=3, output_directory=None, **settings)`. """
+    def make(commits=3, output_directory=None, **settings):
+        from lolologist.lolologist import Lolologist
+        repository = make_repository(str(tmpdir.join('repo')), commits=commits)
+        write_config(output_directory or str(tmpdir.join('out')), **settings)
+        return Lolologist(repository)
+    return make
@@ -0,0 +1,82 @@
+"""
+Generated fixtures shared by the tests and the benchmarks. Everything is deterministic, so runs are reproducible.
+"""
+
+from __future__ import unicode_literals
+
+import os
+import subprocess
+
+COMMIT_SUMMARIES = [
+    "Fix off-by-one in the frame counter",
+    "Add support for multiple cameras",
+    "Refactor the repository handler so submodules get hooks too",
+    "Bump Pillow",
+    "Don't crash when the upload URL is missing",
+    "Wrap long commit summaries across several lines of text",
+    "Translate possessives correctly in lolspeak",
+    "Merge branch 'dev' into master",
+]
+
+GIT_ENVIRONMENT = dict(GIT_AUTHOR_NAME='Bench', GIT_AUTHOR_EMAIL='bench@example.com', GIT_COMMITTER_NAME='Bench',
+                       GIT_COMMITTER_EMAIL='bench@example.com', GIT_AUTHOR_DATE='2016-06-15T12:00:00',
+                       GIT_COMMITTER_DATE='2016-06-15T12:00:00')
+
+
+def make_image(path, size=(640, 480)):
+    """Writes a deterministic gradient image with some shapes on it
+
+    :param path: Where to save the image. The extension picks the format.
+    :param size: The image dimensions
+    :returns: The image path
+
+    """
+    from PIL import Image, ImageDraw
+    width, height = size
+    image = Image.new('RGB', size)
+    draw = ImageDraw.Draw(image)
+    for row in range(0, height, 4):
+        shade = int(255 * row / float(height))
+        draw.rectangle((0, row, width, row + 3), fill=(shade, 120, 255 - shade))
+    for index in range(12):
+        left = (index * width) // 12
+        draw.ellipse((left, height // 3, left + width // 14, height // 3 + height // 10), fill=(240, 200, 40))
+    image.save(path)
+    return path
+
+
+def make_repository(path, commits=20, summaries=COMMIT_SUMMARIES):
+    """Creates a git repository with a deterministic history
+
+    :param path: The directory to create the repository in
+    :param commits: The number of commits to make
+    :param summaries: The commit messages to cycle through
+    :returns: The repository path
+
+    """
+    environment = dict(os.environ, **GIT_ENVIRONMENT)
+    subprocess.check_call(['git', 'init', '-q', path], env=environment)
+    for index in range(commits):
+        with open(os.path.join(path, 'file.txt'), 'a') as tracked:
+            tracked.write('{}\n'.format(index))
+        subprocess.check_call(['git', 'add', 'file.txt'], cwd=path, env=environment)
+        subprocess.check_call(['git', 'commit', '-q', '-m', summaries[index % len(summaries)]],
+                              cwd=path, env=environment)
+    return path
+
+
+def write_config(home, output_directory, **settings):
+    """Writes a `.lolologistrc` into the given home directory
+
+    :param home: The directory to use as `$HOME`
+    :param output_directory: The `OutputDirectory` setting
+    :param settings: Any additional settings
+
+    """
+    from lolologist.lolologist import FALLBACK_FONT, get_font_path
+    settings.setdefault('FontPath', get_font_path(FALLBACK_FONT))
+    lines = ['[DEFAULT]', 'OutputDirectory = {}'.format(output_directory), 'OutputFileName = {revision}',
+             'OutputFormat = jpg']
+    lines.extend('{} = {}'.format(key, value) for key, value in sorted(settings.items()))
+    with open(os.path.join(home, '.lolologistrc'), 'w') as config_file:
+        config_file.write('\n'.join(lines) + '\n')
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# pylint: disable=I0011
+
+"""
+The translator lolologist shipped before its rules were compiled into a single pass, frozen as the reference the
+current one is tested against. The translation benchmark compares the two as well.
+"""
+
+from __future__ import unicode_literals
+
+import re
+
+from lolologist.lolz import Tranzlator
+
+
+class LegacyTranzlator(Tranzlator):
+    """ The regex-per-rule translator with an unbounded cache, as shipped in 0.5.x """
+
+    easy_regex = [
+            (re.compile("(.*)ed$"), 'd'),
+            (re.compile("(.*)ing$"), 'in'),
+            (re.compile("(.*)ss$"), 's'),
+            (re.compile("(.*)er$"), 'r'),
+            ]
+
+    regex = {
+            'apostrophy' : re.compile('(?P<prefix>.*)(?P<suffix>[\']\\w*)'),
+            'tion' : re.compile("(.*)tion(s?)$"),
+            'stoz' : re.compile("^([\\w]+)s$"),
+            'ous' : re.compile("ous$"),
+            }
+
+    def __init__(self, *args, **kwargs):
+        super(LegacyTranzlator, self).__init__(*args, **kwargs)
+        del self.translate_word # drop the LRU the current engine wraps around it
+        self.cached = {}
+
+    def translate_word(self, word):
+        word = word.lower()
+        word = word.replace('ph', 'f')
+        if word in self.cached:
+            return self.cached[word]
+        if word in self.db:
+            return self.db[word]
+        if self.regex['apostrophy'].search(word):
+            result = self.regex['apostrophy'].search(word).groupdict()
+            if result['prefix'] in self.db:
+                self.cached[word] = '%s%s' % (self.db[result['prefix']], result['suffix'])
+                return self.cached[word]
+        if self.heuristics is True:
+            for regex, replace in self.easy_regex:
+                match = regex.search(word)
+                if match:
+                    self.cached[word] = match.group(1)+replace
+                    return self.cached[word]
+            tion = self.regex['tion'].search(word)
+            if tion:
+                self.cached[word] = tion.group(1)+'shun'+tion.group(2)
+                return self.cached[word]
+            stoz = self.regex['stoz'].search(word)
+            if stoz and not self.regex['ous'].search(word):
+                self.cached[word] = stoz.group(1)+'z'
+                return self.cached[word]
+        self.cached[word] = word
+        return word
+
+    def translate_sentence(self, sentence):
+        new_sentence = ''
+        for word, space in re.findall("([\\w]*)([\\W]*)", sentence):
+            word = self.translate_word(word)
+            if word != '':
+                new_sentence += word + space
+        return new_sentence
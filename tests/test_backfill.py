@@ -0,0 +1,85 @@
+import os
+
+import pytest
+import mock
+
+from lolologist import backfill
+from lolologist.lolologist import FALLBACK_FONT
+from lolologist.utils import LolologistError
+
+@pytest.fixture
+def images(tmpdir, make_image):
+    directory = tmpdir.mkdir('images')
+    make_image(str(directory.join('a.jpg')), size=(1280, 960))
+    make_image(str(directory.join('b.png')))
+    directory.join('notes.txt').write('not an image')
+    return str(directory)
+
+@pytest.fixture
+def app(make_app):
+    return make_app(commits=6)
+
+def test_find_images(images):
+    found = backfill.find_images(images)
+    assert [os.path.basename(path) for path in found] == ['a.jpg', 'b.png']
+    assert backfill.find_images(found[0]) == found[:1]
+
+def test_find_images_missing(tmpdir):
+    with pytest.raises(LolologistError):
+        backfill.find_images(str(tmpdir.join('nope')))
+    with pytest.raises(LolologistError) as err:
+        backfill.find_images(str(tmpdir.mkdir('empty')))
+    assert 'no images' in err.exconly()
+
+def test_pick_image_is_stable():
+    images = ['a', 'b', 'c']
+    assert backfill.pick_image(images, '0000000004') == 'b'
+    assert backfill.pick_image(images, '0000000004') == backfill.pick_image(images, '0000000004')
+
+def test_base_images_are_bounded(tmpdir, make_image):
+    paths = [make_image(str(tmpdir.join('{}.png'.format(index))), size=(64, 48))
+             for index in range(backfill.MAX_BASE_IMAGES + 2)]
+    with mock.patch('lolologist.backfill._BASE_IMAGES', backfill.LRUCache(backfill.MAX_BASE_IMAGES)) as cache:
+        for path in paths:
+            backfill._get_base_image(path, (640.0, 480.0), 'bicubic')
+        assert len(cache) == backfill.MAX_BASE_IMAGES
+        with mock.patch('lolologist.backfill.open_image') as open_image:
+            backfill._get_base_image(paths[-1], (640.0, 480.0), 'bicubic')
+        assert not open_image.called
+
+def test_backfill(app, images, tmpdir, capsys):
+    app.backfill(mock.Mock(rev_range='HEAD', image=images, jobs=2))
+    outputs = tmpdir.join('out').listdir()
+    assert len(outputs) == 6
+    from PIL import Image
+    assert Image.open(str(outputs[0])).size == (640, 480)
+    assert 'Rendered 6 macro(s), skipped 0' in capsys.readouterr()[0]
+
+def test_backfill_resumes(app, images, tmpdir, capsys):
+    app.backfill(mock.Mock(rev_range='HEAD~2..HEAD', image=images, jobs=1))
+    assert len(tmpdir.join('out').listdir()) == 2
+    capsys.readouterr()
+    app.backfill(mock.Mock(rev_range='HEAD', image=images, jobs=2))
+    assert len(tmpdir.join('out').listdir()) == 6
+    assert 'Rendered 4 macro(s), skipped 2' in capsys.readouterr()[0]
+
+def test_backfill_bad_range(app, images):
+    with pytest.raises(LolologistError) as err:
+        app.backfill(mock.Mock(rev_range='nope..HEAD', image=images, jobs=1))
+    assert 'could not be found' in err.exconly()
+
+def test_backfill_needs_image(app):
+    with pytest.raises(LolologistError) as err:
+        app.backfill(mock.Mock(rev_range='HEAD', image=None, jobs=1))
+    assert 'BackfillImage' in err.exconly()
+
+def test_run_reports_failures(tmpdir):
+    results = []
+    task = (str(tmpdir.join('missing.jpg')), '0123456789', 'summary', FALLBACK_FONT, str(tmpdir.join('out.jpg')),
+            (640.0, 480.0), 'bicubic', {})
+    rendered, failed = backfill.run(iter([task]), jobs=1, on_result=lambda *result: results.append(result))
+    assert (rendered, failed) == (0, 1)
+    assert results[0][0] == task
+    assert isinstance(results[0][2], IOError)
+    assert 'missing.jpg' in str(results[0][2])
+    assert not tmpdir.join('out.jpg').exists()
@@ -0,0 +1,20 @@
+from benchmarks import suite
+
+def make_results(**medians):
+    return {"environment": {}, "results": dict((name, {"median_ms": median}) for name, median in medians.items())}
+
+def test_compare_flags_regressions():
+    baseline = make_results(render=20.0, capture=15.0, config_load=0.1, removed=1.0)
+    current = make_results(render=30.0, capture=16.0, config_load=0.15, added=1.0)
+    rows = dict((row[0], row[1:]) for row in suite.compare(baseline, current, threshold=0.2))
+    assert sorted(rows) == ['capture', 'config_load', 'render']
+    assert rows['render'][3]
+    assert not rows['capture'][3]
+    # A 50% slowdown of a fraction of a millisecond is noise
+    assert not rows['config_load'][3]
+
+def test_run(tmpdir):
+    results = suite.run(['config_load', 'config_update'], repeat=2)
+    assert list(results["results"]) == ['config_load', 'config_update']
+    assert results["results"]["config_load"]["runs"] == 2
+    assert results["environment"]["python"]
@@ -1,7 +1,12 @@
+import io
+import os
+import time
+
 import pytest
 import mock
 
-from lolologist.cameras import Camera
+from lolologist.cameras import Camera, CameraSession, MplayerCamera, read_last_frame, yuv420_to_image
+from lolologist.utils import LolologistError
 
 class TestBaseCamera(object):
     """Tests the base camera object functionality"""
@@ -50,3 +55,179 @@ class TestBaseCamera(object):
         assert pathexists_function.call_args_list[0][0][0] == c._output_directory
 
 
+
+
+def yuv4mpeg_stream(frames, width=4, height=2):
+    """ Builds a YUV4MPEG2 stream where every plane of frame N is filled with the byte N. """
+    chroma = ((width + 1) // 2) * ((height + 1) // 2)
+    data = 'YUV4MPEG2 W{} H{} F30:1 Ip A1:1 C420jpeg\n'.format(width, height).encode('ascii')
+    for index in range(frames):
+        data += b'FRAME\n' + bytes(bytearray([index]) * (width * height + 2 * chroma))
+    return io.BytesIO(data)
+
+class TestYuv4mpeg(object):
+    """Tests reading frames streamed by mplayer"""
+
+    def test_read_last_frame(self):
+        width, height, frame = read_last_frame(yuv4mpeg_stream(7))
+        assert (width, height) == (4, 2)
+        assert len(frame) == 12
+        assert set(frame) == set([6])
+
+    def test_read_no_frames(self):
+        with pytest.raises(LolologistError):
+            read_last_frame(yuv4mpeg_stream(0))
+
+    def test_read_truncated(self):
+        stream = io.BytesIO(yuv4mpeg_stream(2).getvalue()[:-1])
+        with pytest.raises(LolologistError):
+            read_last_frame(stream)
+
+    def test_read_not_a_stream(self):
+        with pytest.raises(LolologistError):
+            read_last_frame(io.BytesIO(b'\xff\xd8\xff\xe0'))
+
+    def test_read_no_dimensions(self):
+        with pytest.raises(LolologistError):
+            read_last_frame(io.BytesIO(b'YUV4MPEG2 W4 F30:1\nFRAME\n'))
+
+    def test_yuv420_to_image(self):
+        width, height = 4, 2
+        # studio-swing white: Y=235, U=V=128
+        data = bytearray([235] * 8 + [128] * 4)
+        image = yuv420_to_image(width, height, data)
+        assert image.mode == 'RGB'
+        assert image.size == (4, 2)
+        assert image.getpixel((0, 0)) == (255, 255, 255)
+
+
+class TestMplayerCamera(object):
+    """Tests the mplayer camera"""
+
+    @mock.patch("lolologist.cameras.Popen")
+    def test_capture_streams_frames(self, popen_function):
+        def fake_mplayer(params, **kwargs):
+            write_fd = int(params[3].rsplit('/', 1)[1])
+            os.write(write_fd, yuv4mpeg_stream(3).getvalue())
+            return mock.Mock()
+        popen_function.side_effect = fake_mplayer
+        camera = MplayerCamera(warmup_time=3)
+        with camera.capture_photo() as photo:
+            assert photo.size == (4, 2)
+        params = popen_function.call_args[0][0]
+        assert params[params.index('-frames') + 1] == '3'
+        assert params[2] == '-vo' and params[3].startswith('yuv4mpeg:file=/dev/fd/')
+
+    @mock.patch("lolologist.cameras.Popen")
+    def test_capture_bad_stream_kills_mplayer(self, popen_function):
+        process = mock.Mock()
+
+        def fake_mplayer(params, **kwargs):
+            write_fd = int(params[3].rsplit('/', 1)[1])
+            os.write(write_fd, b'YUV4MPEG2 W4 H2 C444 F30:1\n')
+            return process
+
+        def wait():
+            assert process.kill.called, "mplayer was waited on without being killed"
+        popen_function.side_effect = fake_mplayer
+        process.wait.side_effect = wait
+        with pytest.raises(LolologistError):
+            with MplayerCamera(warmup_time=3).capture_photo():
+                pass
+        assert process.wait.called
+
+    @mock.patch("lolologist.cameras.Popen")
+    def test_stream_frames(self, popen_function):
+        def fake_mplayer(params, **kwargs):
+            assert '-frames' not in params
+            write_fd = int(params[3].rsplit('/', 1)[1])
+            os.write(write_fd, yuv4mpeg_stream(3).getvalue())
+            return mock.Mock()
+        popen_function.side_effect = fake_mplayer
+        camera = MplayerCamera()
+        frames = list(camera.stream_frames())
+        assert [frame[2][0] for frame in frames] == [0, 1, 2]
+        assert camera.decode_frame(frames[-1]).size == (4, 2)
+
+    @mock.patch("os.makedirs")
+    def test_no_temp_directory(self, makedirs_function):
+        camera = MplayerCamera()
+        camera._setup()
+        camera._cleanup()
+        assert not makedirs_function.called
+
+
+class FakeStreamingCamera(object):
+    """A camera that streams increasing frame numbers"""
+    settle_frames = 3
+
+    def __init__(self, fail=False, delay=0.002):
+        self.opened = 0
+        self.closed = 0
+        self.fail = fail
+        self.delay = delay
+
+    def stream_frames(self):
+        self.opened += 1
+        try:
+            if self.fail:
+                raise IOError("no such device")
+            frame = 0
+            while True:
+                frame += 1
+                time.sleep(self.delay)
+                yield frame
+        finally:
+            self.closed += 1
+
+    @staticmethod
+    def decode_frame(frame):
+        return frame
+
+class TestCameraSession(object):
+    """Tests keeping a camera warm between captures"""
+
+    def test_waits_for_settled_frame(self):
+        camera = FakeStreamingCamera()
+        session = CameraSession(camera)
+        with session.capture_photo() as photo:
+            assert photo >= camera.settle_frames
+        session.close()
+
+    def test_reuses_open_device(self):
+        camera = FakeStreamingCamera()
+        session = CameraSession(camera)
+        first = session.latest_frame()
+        time.sleep(0.02)
+        second = session.latest_frame()
+        assert second > first
+        assert camera.opened == 1
+        session.close()
+        assert camera.closed == 1
+        assert not session.is_open
+
+    def test_idle_timeout(self):
+        camera = FakeStreamingCamera()
+        session = CameraSession(camera, idle_timeout=0.01)
+        session.latest_frame()
+        deadline = time.time() + 2
+        while session.is_open and time.time() < deadline:
+            time.sleep(0.01)
+        assert not session.is_open
+        assert camera.closed == 1
+        session.latest_frame()
+        assert camera.opened == 2
+        session.close()
+
+    def test_slow_warmup_outlasts_idle_timeout(self):
+        camera = FakeStreamingCamera(delay=0.03)
+        session = CameraSession(camera, idle_timeout=0.01)
+        assert session.latest_frame() >= camera.settle_frames
+        assert camera.opened == 1
+        session.close()
+
+    def test_device_error(self):
+        session = CameraSession(FakeStreamingCamera(fail=True))
+        with pytest.raises(LolologistError) as err:
+            session.latest_frame()
+        assert 'no such device' in err.exconly()
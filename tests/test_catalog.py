@@ -0,0 +1,180 @@
+from __future__ import unicode_literals
+
+from datetime import datetime, timedelta
+import itertools
+import os
+import sqlite3
+
+import pytest
+import mock
+from PIL import Image
+
+from lolologist import backfill
+from lolologist.catalog import Catalog, Entry, _find_query, _search_query, read_entry
+from lolologist.encoders import encode_image, get_image_format, make_metadata
+from lolologist.lolologist import Lolologist
+from lolologist.utils import LolologistError
+
+def make_entry(index, **fields):
+    values = dict(path='/out/{}.jpg'.format(index), project='p{}'.format(index % 10),
+                  revision='{:010x}'.format(index), time=datetime(2016, 6, 15) + timedelta(minutes=index),
+                  author='Author {}'.format(index % 7), summary='Commit number {}'.format(index), width=640,
+                  height=480, bytes=30000, url=None)
+    values.update(fields)
+    return Entry(**values)
+
+def save_macro(path, **commit):
+    with open(path, 'wb') as output:
+        output.write(encode_image(Image.new('RGB', (320, 240)), path,
+                                  make_metadata(get_image_format(path), commit)))
+    return path
+
+@pytest.fixture
+def catalog(tmpdir):
+    return Catalog(str(tmpdir.join('nested', 'catalog.sqlite')))
+
+def test_add_and_find(catalog):
+    catalog.add(make_entry(1))
+    catalog.add(make_entry(2, revision='0000000001', project='other'))
+    found = catalog.find('0000000001')
+    assert [entry.path for entry in found] == ['/out/2.jpg', '/out/1.jpg']
+    assert found[1].time == datetime(2016, 6, 15, 0, 1)
+    assert found[1].width == 640
+    assert [entry.path for entry in catalog.find('00000000', project='other')] == ['/out/2.jpg']
+    assert catalog.find('0000000001deadbeef') == found
+    assert catalog.find('f') == []
+
+def test_add_replaces_and_keeps_url(catalog):
+    catalog.add(make_entry(1))
+    catalog.set_url('/out/1.jpg', 'http://example.com/1.jpg')
+    catalog.add(make_entry(1, bytes=1))
+    entry, = catalog.find('0000000001')
+    assert entry.bytes == 1
+    assert entry.url == 'http://example.com/1.jpg'
+    assert catalog.count() == 1
+
+def test_set_url_before_add(catalog):
+    catalog.set_url('/out/1.jpg', 'http://example.com/1.jpg')
+    catalog.add(make_entry(1))
+    entry, = catalog.find('0000000001')
+    assert entry.url == 'http://example.com/1.jpg'
+    assert entry.summary == 'Commit number 1'
+
+def test_search(catalog):
+    catalog.add_many(make_entry(index) for index in range(30))
+    assert catalog.search('NUMBER 2', limit=None)[0].path == '/out/29.jpg'
+    assert len(catalog.search('number 2', limit=None)) == 11
+    assert len(catalog.search(limit=5)) == 5
+    assert [entry.path for entry in catalog.search(project='p3', author='author 3')] == ['/out/3.jpg']
+    assert len(catalog.search(since=datetime(2016, 6, 15, 0, 10), until=datetime(2016, 6, 15, 0, 20))) == 10
+    assert catalog.search('100%') == []
+    assert catalog.search('number_') == []
+
+def test_schema_version_change_empties(tmpdir, catalog):
+    catalog.add(make_entry(1))
+    with mock.patch('lolologist.catalog.SCHEMA_VERSION', 2):
+        assert Catalog(catalog.path).count() == 0
+
+def query_plan(catalog, query, parameters):
+    connection = sqlite3.connect(catalog.path)
+    try:
+        return ' '.join(row[-1] for row in connection.execute("EXPLAIN QUERY PLAN " + query, parameters))
+    finally:
+        connection.close()
+
+@pytest.mark.parametrize('query', [
+    _find_query('00000186a0'),
+    _find_query('0000018', project='p4'),
+    _search_query(project='p4'),
+    _search_query(since=datetime(2016, 6, 15), until=datetime(2016, 6, 16)),
+    _search_query('number'),
+])
+def test_lookups_use_indexes(catalog, query):
+    catalog.add_many(make_entry(index) for index in range(1000))
+    plan = query_plan(catalog, *query)
+    assert 'USING INDEX' in plan or 'USING COVERING INDEX' in plan
+    assert 'SCAN macros' not in plan or 'USING INDEX macros_time' in plan
+
+def test_read_entry(tmpdir):
+    path = save_macro(str(tmpdir.join('a.jpg')), project='a', revision='0123456789', author='Zoë',
+                      summary='Add a thing', time=datetime(2016, 6, 15))
+    entry = read_entry(path)
+    assert entry == Entry(path, 'a', '0123456789', datetime(2016, 6, 15), 'Zoë', 'Add a thing', 320, 240,
+                          os.path.getsize(path), None)
+    tmpdir.join('broken.jpg').write('not an image')
+    assert read_entry(str(tmpdir.join('broken.jpg'))) is None
+
+def test_reindex(tmpdir, catalog):
+    directory = tmpdir.mkdir('macros')
+    for index in range(5):
+        save_macro(str(directory.join('{}.png'.format(index))), project='a', revision='{:010d}'.format(index),
+                   summary='Commit {}'.format(index), time=datetime(2016, 6, 15, index))
+    directory.join('notes.txt').write('not a macro')
+    catalog.add(make_entry(99, path=str(directory.join('gone.png'))))
+    catalog.add(make_entry(0, path=str(directory.join('0.png')), url='http://example.com/0.png'))
+    assert catalog.reindex(str(directory), jobs=2) == 5
+    assert catalog.count() == 5
+    assert catalog.find('0000000000')[0].url == 'http://example.com/0.png'
+    assert catalog.find('0000000004')[0].summary == 'Commit 4'
+
+def test_failed_reindex_keeps_catalog(tmpdir, catalog):
+    catalog.add_many(make_entry(index) for index in range(3))
+    broken = [make_entry(10, path=str(tmpdir.join('a.jpg'))), make_entry(11, width=object())]
+    with mock.patch('lolologist.catalog.read_entries', return_value=broken):
+        with pytest.raises(sqlite3.Error):
+            catalog.reindex(str(tmpdir))
+    assert sorted(entry.path for entry in catalog.search(limit=None)) == ['/out/0.jpg', '/out/1.jpg', '/out/2.jpg']
+
+@pytest.fixture
+def app(tmpdir, make_app, make_image):
+    app = make_app(commits=3)
+    app.backfill(mock.Mock(rev_range='HEAD', image=make_image(str(tmpdir.join('base.jpg'))), jobs=1))
+    return app
+
+def test_backfill_catalogs(app, capsys):
+    entries = app.get_catalog().search(limit=None)
+    assert len(entries) == 3
+    assert all(entry.width and entry.bytes and entry.project == 'repo' for entry in entries)
+    capsys.readouterr()
+    app.show(mock.Mock(revision=entries[0].revision, project=None))
+    output = capsys.readouterr()[0]
+    assert entries[0].path in output
+    assert entries[0].summary in output
+
+def test_interrupted_backfill_catalogs_what_it_rendered(tmpdir, make_app, make_image):
+    app = make_app(commits=3)
+    run = backfill.run
+
+    def interrupted(tasks, jobs=None, on_result=None):
+        run(itertools.islice(tasks, 1), jobs=jobs, on_result=on_result)
+        raise KeyboardInterrupt()
+
+    with mock.patch('lolologist.backfill.run', side_effect=interrupted):
+        with pytest.raises(KeyboardInterrupt):
+            app.backfill(mock.Mock(rev_range='HEAD', image=make_image(str(tmpdir.join('base.jpg'))), jobs=1))
+    entry, = app.get_catalog().search(limit=None)
+    assert entry.path == str(tmpdir.join('out').listdir()[0])
+    assert entry.bytes == os.path.getsize(entry.path)
+    assert (entry.width, entry.height) == Image.open(entry.path).size
+
+def test_show_unknown(app):
+    with pytest.raises(LolologistError) as err:
+        app.show(mock.Mock(revision='ffffff', project=None))
+    assert 'reindex' in err.exconly()
+
+def test_search_and_reindex_commands(app, tmpdir, capsys):
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(app.get_catalog().path + suffix):
+            os.remove(app.get_catalog().path + suffix)
+    app = Lolologist(app.repo_path)
+    app.reindex(mock.Mock(directory=None, jobs=2))
+    assert 'Catalogued 3 macro(s)' in capsys.readouterr()[0]
+    app.search(mock.Mock(text=None, project='repo', author=None, since=None, until=None, limit=0))
+    assert '3 macro(s) found.' in capsys.readouterr()[0]
+
+def test_capture_catalogs(app):
+    with mock.patch.object(app, '_Lolologist__get_camera') as camera:
+        camera.return_value.capture_photo.return_value.__enter__.return_value = Image.new('RGB', (640, 480))
+        result = app.capture_commit(app.repo_path)
+    entry, = [entry for entry in app.get_catalog().search(limit=None) if entry.path == result["path"]]
+    assert entry.bytes == os.path.getsize(result["path"])
@@ -0,0 +1,60 @@
+import os
+import socket
+import threading
+
+import pytest
+import mock
+
+from lolologist.daemon import CaptureServer, DaemonUnavailableError, request_capture
+from lolologist.utils import LolologistError
+
+@pytest.fixture
+def socket_path(tmpdir):
+    return str(tmpdir.join('d.sock'))
+
+@pytest.fixture
+def app():
+    app = mock.Mock()
+    app.capture_commit.return_value = {"path": "/out/0123456789.jpg"}
+    return app
+
+@pytest.fixture
+def server(socket_path, app):
+    server = CaptureServer(socket_path, app)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def test_request_capture(server, app, socket_path):
+    response = request_capture(socket_path, '/repo', 'abc123')
+    assert response["path"] == "/out/0123456789.jpg"
+    assert response["elapsed"] >= 0
+    app.capture_commit.assert_called_once_with('/repo', 'abc123')
+
+def test_request_capture_error(server, app, socket_path):
+    app.capture_commit.side_effect = LolologistError("camera unplugged")
+    with pytest.raises(LolologistError) as err:
+        request_capture(socket_path, '/repo')
+    assert 'camera unplugged' in err.exconly()
+
+def test_request_capture_unavailable(socket_path):
+    with pytest.raises(DaemonUnavailableError):
+        request_capture(socket_path, '/repo')
+
+def test_server_close_removes_socket(socket_path, app):
+    CaptureServer(socket_path, app).server_close()
+    assert not os.path.exists(socket_path)
+
+def test_stale_socket_replaced(socket_path, app):
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(socket_path)
+    stale.close()
+    CaptureServer(socket_path, app).server_close()
+
+def test_live_socket_kept(server, socket_path, app):
+    with pytest.raises(LolologistError) as err:
+        CaptureServer(socket_path, app)
+    assert 'already listening' in err.exconly()
@@ -0,0 +1,74 @@
+from __future__ import unicode_literals
+
+from datetime import datetime
+import io
+
+import pytest
+from PIL import Image
+
+from lolologist.encoders import (OutputVariant, benchmark, encode_image, encode_outputs, get_image_format,
+                                make_metadata, parse_output_variants, read_metadata)
+from lolologist.utils import LolologistError
+
+@pytest.fixture
+def image():
+    return Image.effect_mandelbrot((160, 120), (-2.0, -1.25, 0.75, 1.25), 64).convert('RGB')
+
+def test_get_image_format():
+    assert get_image_format('/out/0123456789.jpg') == 'JPEG'
+    assert get_image_format('/out/0123456789.JPEG') == 'JPEG'
+    assert get_image_format('/out/0123456789.png') == 'PNG'
+    with pytest.raises(LolologistError):
+        get_image_format('/out/0123456789.notanimage')
+
+def test_encode_image_settings(image):
+    small = encode_image(image, 'macro.jpg', {'quality': 10})
+    large = encode_image(image, 'macro.jpg', {'quality': 95})
+    assert len(small) < len(large)
+    progressive = Image.open(io.BytesIO(encode_image(image, 'macro.jpg', {'progressive': True})))
+    assert progressive.info.get('progressive')
+
+def test_benchmark(image):
+    presets = (('jpeg', 'jpg', {}), ('png', 'png', {'optimize': True}), ('nope', 'notanimage', {}))
+    results = list(benchmark(image, presets, repeat=1))
+    assert [label for label, _, _ in results] == ['jpeg', 'png']
+    assert all(milliseconds > 0 and size > 0 for _, milliseconds, size in results)
+
+@pytest.mark.parametrize('extension', ['jpg', 'png', 'webp'])
+def test_metadata_round_trip(image, tmpdir, extension):
+    path = str(tmpdir.join('macro.' + extension))
+    commit = {'project': 'lolologist', 'revision': '0123456789', 'summary': 'Fix the café',
+              'author': 'Zoë Example', 'time': datetime(2016, 6, 15, 12, 30), 'message': 'Fix the café\n'}
+    image_format = get_image_format(path)
+    with open(path, 'wb') as output:
+        output.write(encode_image(image, path, make_metadata(image_format, commit)))
+    metadata = read_metadata(path)
+    assert metadata == dict((field, commit[field]) for field in ('project', 'revision', 'summary', 'author', 'time'))
+
+def test_metadata_missing(image, tmpdir):
+    path = str(tmpdir.join('plain.jpg'))
+    image.save(path)
+    assert read_metadata(path) is None
+    assert make_metadata('GIF', {'revision': '0123456789'}) == {}
+
+def test_parse_output_variants():
+    assert parse_output_variants(None) == []
+    assert parse_output_variants(' thumb:jpg:160x120, dashboard:webp ,') == [
+        OutputVariant('thumb', 'jpg', (160, 120)), OutputVariant('dashboard', 'webp', None)]
+    for text in ('thumb', 'thumb:jpg:160', 'thumb:jpg:0x120', 'a:jpg, a:png', 'the thumb:jpg'):
+        with pytest.raises(LolologistError):
+            parse_output_variants(text)
+
+def test_encode_outputs(image):
+    outputs = [('macro.jpg', None, {'quality': 90}), ('thumb.jpg', (40, 40), {}), ('copy.webp', None, {}),
+               ('tiny.png', (16, 16), {})]
+    encoded = encode_outputs(image, outputs)
+    assert [file_path for file_path, _, _ in encoded] == ['macro.jpg', 'thumb.jpg', 'copy.webp', 'tiny.png']
+    assert [size for _, _, size in encoded] == [(160, 120), (40, 30), (160, 120), (16, 12)]
+    assert encoded[0][1] == encode_image(image, 'macro.jpg', {'quality': 90})
+    for file_path, data, size in encoded:
+        decoded = Image.open(io.BytesIO(data))
+        assert decoded.format == get_image_format(file_path)
+        assert decoded.size == size
+    assert image.size == (160, 120)
+    assert encode_outputs(image, outputs[1:2], Image.NEAREST)[0][2] == (40, 30)
@@ -0,0 +1,95 @@
+import os
+
+import pytest
+import mock
+from PIL import ImageFont
+
+from lolologist import fonts
+from lolologist.fonts import get_font, measure_text, preload_fonts, clear_font_cache
+from lolologist.lolologist import FALLBACK_FONT, get_font_path
+
+FONT_PATH = get_font_path(FALLBACK_FONT)
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    clear_font_cache()
+    yield
+    clear_font_cache()
+
+def test_get_font_cached():
+    with mock.patch("PIL.ImageFont.truetype", wraps=ImageFont.truetype) as truetype_function:
+        font = get_font(FONT_PATH, 32)
+        assert get_font(FONT_PATH, 32) is font
+        assert truetype_function.call_count == 1
+        get_font(FONT_PATH, 48)
+        assert truetype_function.call_count == 2
+
+def test_get_font_mtime_invalidation():
+    font = get_font(FONT_PATH, 32)
+    with mock.patch("os.path.getmtime", return_value=0):
+        assert get_font(FONT_PATH, 32) is not font
+
+def test_get_font_bounded():
+    with mock.patch.object(fonts._FONT_CACHE, "max_size", 2):
+        first = get_font(FONT_PATH, 10)
+        get_font(FONT_PATH, 11)
+        get_font(FONT_PATH, 12)
+        assert len(fonts._FONT_CACHE) == 2
+        assert get_font(FONT_PATH, 10) is not first
+
+def test_preload_fonts():
+    preload_fonts([FONT_PATH, '/missing/font.ttf'], (32, 48))
+    with mock.patch("PIL.ImageFont.truetype") as truetype_function:
+        get_font(FONT_PATH, 32)
+        get_font(FONT_PATH, 48)
+        assert not truetype_function.called
+
+def test_measure_text():
+    font = get_font(FONT_PATH, 32)
+    width, height = measure_text(font, "HELLO gyp")
+    assert (width, height) == font.getbbox("HELLO gyp")[2:]
+    old_font = mock.Mock(spec=['getsize'])
+    old_font.getsize.return_value = (width, height)
+    assert measure_text(old_font, "HELLO gyp") == (width, height)
+
+@pytest.fixture
+def font_directory(tmpdir):
+    directory = tmpdir.mkdir('fonts')
+    directory.mkdir('truetype').mkdir('league').join('LeagueGothic-Regular.otf').write_binary(
+        open(FONT_PATH, 'rb').read())
+    directory.join('notes.txt').write('not a font')
+    return directory
+
+def test_font_index(font_directory, tmpdir):
+    index = fonts.load_font_index([str(font_directory)], str(tmpdir.join('fonts.json')))
+    path = str(font_directory.join('truetype', 'league', 'LeagueGothic-Regular.otf'))
+    assert index['league gothic'] == path
+    assert index['league gothic regular'] == path
+    assert index['leaguegothic-regular'] == path
+    assert len(set(index.values())) == 1
+
+def test_font_index_only_rescans_changed_directories(font_directory, tmpdir):
+    manifest = str(tmpdir.join('fonts.json'))
+    fonts.load_font_index([str(font_directory)], manifest)
+    with mock.patch("lolologist.fonts._scan_directory", wraps=fonts._scan_directory) as scan_function:
+        fonts.load_font_index([str(font_directory)], manifest)
+        assert not scan_function.called
+        font_directory.join('Impact.ttf').write_binary(open(FONT_PATH, 'rb').read())
+        index = fonts.load_font_index([str(font_directory)], manifest)
+        assert [call[0][0] for call in scan_function.call_args_list] == [str(font_directory)]
+    assert index['impact'] == str(font_directory.join('Impact.ttf'))
+
+def test_font_index_corrupt_manifest(font_directory, tmpdir):
+    manifest = tmpdir.join('fonts.json')
+    manifest.write('{not json')
+    assert 'league gothic' in fonts.load_font_index([str(font_directory)], str(manifest))
+
+def test_find_font(font_directory, tmpdir):
+    fonts.clear_font_index()
+    with mock.patch("lolologist.fonts.FONT_MANIFEST_PATH", str(tmpdir.join('fonts.json'))), \
+            mock.patch("lolologist.fonts.FONT_DIRECTORIES", (str(font_directory),)):
+        try:
+            assert fonts.find_font('League Gothic').endswith('LeagueGothic-Regular.otf')
+            assert fonts.find_font('Impact') is None
+        finally:
+            fonts.clear_font_index()
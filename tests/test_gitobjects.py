@@ -0,0 +1,69 @@
+import os
+import subprocess
+
+import pytest
+
+from lolologist import gitobjects
+
+def git(repository, *args):
+    return subprocess.check_output(('git',) + args, cwd=repository).decode('utf-8').strip()
+
+def gitpython_commit(repository, revision='HEAD'):
+    import git as gitpython
+    commit = gitpython.Repo(repository).commit(revision)
+    return gitobjects.Commit(commit.hexsha, commit.summary, commit.message, commit.committed_date,
+                             commit.author.name)
+
+@pytest.fixture
+def repository(tmpdir, make_repository):
+    return make_repository(str(tmpdir.join('repo')), commits=3)
+
+def test_read_loose_head(repository):
+    layout = gitobjects.find_repository(repository)
+    assert layout.work_tree == repository
+    assert layout.git_dir == os.path.join(repository, '.git')
+    assert gitobjects.read_commit(layout) == gitpython_commit(repository)
+
+def test_read_packed_head(repository):
+    git(repository, 'gc', '-q')
+    layout = gitobjects.find_repository(repository)
+    assert not os.path.exists(os.path.join(layout.git_dir, 'refs', 'heads', git(repository, 'symbolic-ref',
+                                                                                '--short', 'HEAD')))
+    assert gitobjects.read_commit(layout) == gitpython_commit(repository)
+
+def test_read_detached_head(repository):
+    sha = git(repository, 'rev-parse', 'HEAD~1')
+    git(repository, 'checkout', '-q', sha)
+    layout = gitobjects.find_repository(repository)
+    assert gitobjects.read_commit(layout) == gitpython_commit(repository, sha)
+
+def test_read_multiline_message(repository):
+    with open(os.path.join(repository, 'file.txt'), 'a') as tracked:
+        tracked.write('more\n')
+    git(repository, '-c', 'user.name=Test', '-c', 'user.email=test@example.com',
+        'commit', '-q', '-a', '-m', 'Caption the photo\n\nIt used to be blank.')
+    commit = gitobjects.read_commit(gitobjects.find_repository(repository))
+    assert commit.summary == 'Caption the photo'
+    assert commit == gitpython_commit(repository)
+
+def test_linked_work_tree(repository, tmpdir):
+    linked = str(tmpdir.join('linked'))
+    git(repository, 'worktree', 'add', '-q', '--detach', linked, 'HEAD~2')
+    layout = gitobjects.find_repository(linked)
+    assert layout.work_tree == linked
+    assert layout.common_dir == os.path.join(repository, '.git')
+    assert gitobjects.read_commit(layout) == gitpython_commit(linked)
+
+@pytest.mark.parametrize('revision', ['HEAD~1', 'master..HEAD', 'deadbeef', 'refs/heads/missing'])
+def test_unsupported_revisions(repository, revision):
+    with pytest.raises(gitobjects.Unsupported):
+        gitobjects.read_commit(gitobjects.find_repository(repository), revision)
+
+def test_replaced_commits_are_unsupported(repository):
+    git(repository, 'replace', git(repository, 'rev-parse', 'HEAD~1'), git(repository, 'rev-parse', 'HEAD'))
+    with pytest.raises(gitobjects.Unsupported):
+        gitobjects.find_repository(repository)
+
+def test_not_a_repository(tmpdir):
+    with pytest.raises(gitobjects.Unsupported):
+        gitobjects.find_repository(str(tmpdir.join('missing')))
@@ -0,0 +1,91 @@
+from __future__ import unicode_literals
+
+import mock
+
+from lolologist import layout
+from lolologist.fonts import clear_font_cache, get_advances, get_font
+from lolologist.lolologist import FALLBACK_FONT, get_font_path
+
+FONT_PATH = get_font_path(FALLBACK_FONT)
+
+def measure(text):
+    """ Ten pixels a character. """
+    return 10 * len(text)
+
+def test_wrap_by_width():
+    assert layout.wrap("the quick brown fox", 100, measure) == ["the quick", "brown fox"]
+    assert layout.wrap("the quick brown fox", 50, measure) == ["the", "quick", "brown", "fox"]
+
+def test_wrap_breaks_long_words():
+    assert layout.wrap("a supercalifragilistic word", 80, measure) == ["a", "supercal", "ifragili", "stic", "word"]
+
+def test_wrap_stops_past_max_lines():
+    assert len(layout.wrap("one two three four five", 30, measure, max_lines=2)) == 3
+
+def test_truncate():
+    lines = ["the quick", "brown fox", "jumps"]
+    assert layout.truncate(lines, 3, 100, measure) == lines
+    assert layout.truncate(lines, 2, 100, measure) == ["the quick", "brown fox…"]
+    assert layout.truncate(lines, 2, 90, measure) == ["the quick", "brown fo…"]
+
+def test_fit_picks_largest_size():
+    short = layout.fit("Bump Pillow", FONT_PATH, 620, 200, 3)
+    assert short.font_size == layout.FONT_SIZES[-1]
+    assert short.lines == ["Bump Pillow"]
+    fitted = layout.fit("Refactor the repository handler so submodules get hooks too", FONT_PATH, 300, 200, 3)
+    assert fitted.font_size < short.font_size
+    assert len(fitted.lines) <= 3
+    assert not fitted.truncated
+    for line in fitted.lines:
+        assert get_advances(FONT_PATH, fitted.font_size).measure(line) <= 300
+    # One size up doesn't fit
+    bigger = layout.FONT_SIZES[layout.FONT_SIZES.index(fitted.font_size) + 1]
+    lines = layout.wrap(fitted.lines and ' '.join(fitted.lines), 300, get_advances(FONT_PATH, bigger).measure)
+    assert len(lines) > 3 or len(lines) * bigger > 200
+
+def test_fit_truncates():
+    fitted = layout.fit("word " * 200, FONT_PATH, 300, 200, 3)
+    assert fitted.truncated
+    assert fitted.font_size == layout.FONT_SIZES[0]
+    assert len(fitted.lines) == 3
+    assert fitted.lines[-1].endswith(layout.ELLIPSIS)
+
+def test_advances_are_measured_once():
+    clear_font_cache()
+    font = get_font(FONT_PATH, 40)
+    with mock.patch.object(font, 'getlength', wraps=font.getlength) as getlength:
+        advances = get_advances(FONT_PATH, 40)
+        width = advances.measure("commit")
+        assert advances.measure("commit") == width
+        assert getlength.call_count == len(set("commit"))
+    assert get_advances(FONT_PATH, 40) is advances
+    clear_font_cache()
+
+def test_fit_picks_the_largest_size_that_fits():
+    summary = "Don't crash when the upload URL is missing from the configuration"
+    fitted = layout.fit(summary, FONT_PATH, 620, 192, 3)
+    fitting = [size for size in layout.FONT_SIZES
+               if len(layout.wrap(summary, 620, get_advances(FONT_PATH, size).measure)) * size <= 192
+               and len(layout.wrap(summary, 620, get_advances(FONT_PATH, size).measure)) <= 3]
+    assert fitted.font_size == max(fitting)
+    assert not fitted.truncated
+    assert " ".join(fitted.lines) == summary
+
+def test_fit_after_warmup_measures_nothing_new():
+    summary = "Don't crash when the upload URL is missing from the configuration"
+    clear_font_cache()
+    # The advance tables keep the font's `getlength`, so it's patched before they're built
+    fonts = [get_font(FONT_PATH, size) for size in layout.FONT_SIZES]
+    patches = [mock.patch.object(font, 'getlength', wraps=font.getlength) for font in fonts]
+    getlengths = [patch.start() for patch in patches]
+    try:
+        layout.fit(summary, FONT_PATH, 620, 192, 3)
+        assert any(getlength.called for getlength in getlengths)
+        for getlength in getlengths:
+            getlength.reset_mock()
+        layout.fit(summary, FONT_PATH, 620, 192, 3)
+        assert not any(getlength.called for getlength in getlengths)
+    finally:
+        for patch in patches:
+            patch.stop()
+        clear_font_cache()
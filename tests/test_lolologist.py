@@ -1,9 +1,20 @@
 from __future__ import unicode_literals
 
+import io
+import multiprocessing
+import os
+import threading
+
 import pytest
 import mock
 
-from lolologist.lolologist import ImageMacro
+from PIL import Image
+
+from lolologist.encoders import encode_image
+from lolologist.lolologist import (Config, ImageMacro, clear_text_overlays, get_font_path,
+                                   get_resample_filter, get_text_overlay, FALLBACK_FONT, MAX_LINES, STROKE_COLOR,
+                                   TEXT_COLOR)
+from lolologist.utils import LolologistError, write_atomic
 
 SAMPLE_PATH = '/sample/path.jpg'
 TOP_TEXT = 'This is top text'
@@ -19,23 +30,248 @@ class TestImageMacro(object):
         macro = ImageMacro(SAMPLE_PATH, TOP_TEXT, BOTTOM_SHORT_TEXT, 'font.ttf')
         assert macro.font == '/dir/font.ttf'
         assert macro.top_text == TOP_TEXT
-        assert isinstance(macro.bottom_text, list)
-        assert macro.bottom_text[0] == 'This is bottom text'
+        assert macro.summary == BOTTOM_SHORT_TEXT
+        assert macro.bottom_text == []
         assert macro.size == (0, 0)
 
     def test_bottom_wrapping(self):
-        macro = ImageMacro(SAMPLE_PATH, TOP_TEXT, ' '.join([BOTTOM_WRAP_TEXT_0, BOTTOM_WRAP_TEXT_1]), 'font.ttf')
-        assert isinstance(macro.bottom_text, list)
-        assert macro.bottom_text[0] == BOTTOM_WRAP_TEXT_0
-        assert macro.bottom_text[1] == BOTTOM_WRAP_TEXT_1
+        summary = ' '.join([BOTTOM_WRAP_TEXT_0, BOTTOM_WRAP_TEXT_1])
+        macro = ImageMacro(Image.new('RGB', (640, 480)), TOP_TEXT, summary, FALLBACK_FONT)
+        macro.render()
+        assert len(macro.bottom_text) > 1
+        assert ' '.join(macro.bottom_text) == summary
 
     def test_bottom_wrapping_max(self):
-        macro = ImageMacro(SAMPLE_PATH, TOP_TEXT, ' '.join([BOTTOM_WRAP_TEXT_0, BOTTOM_WRAP_TEXT_1, BOTTOM_WRAP_TEXT_2]), 'font.ttf')
-        assert isinstance(macro.bottom_text, list)
-        assert macro.bottom_text[0] == BOTTOM_WRAP_TEXT_0
-        assert macro.bottom_text[1] == BOTTOM_WRAP_TEXT_1
-        assert macro.bottom_text[2] != BOTTOM_WRAP_TEXT_2
-        assert macro.bottom_text[2][:24] == BOTTOM_WRAP_TEXT_2[:24]
-        assert macro.bottom_text[2][24] == '\u2026' #ellipses
+        summary = ' '.join([BOTTOM_WRAP_TEXT_0, BOTTOM_WRAP_TEXT_1, BOTTOM_WRAP_TEXT_2] * 10)
+        macro = ImageMacro(Image.new('RGB', (640, 480)), TOP_TEXT, summary, FALLBACK_FONT)
+        macro.render()
+        assert len(macro.bottom_text) == MAX_LINES
+        assert macro.bottom_text[0] == summary[:len(macro.bottom_text[0])]
+        assert macro.bottom_text[-1][-1] == '\u2026' #ellipses
+
+    def test_bottom_font_size_fits_text(self):
+        short = ImageMacro(Image.new('RGB', (640, 480)), TOP_TEXT, BOTTOM_SHORT_TEXT, FALLBACK_FONT)
+        short.render()
+        long = ImageMacro(Image.new('RGB', (640, 480)), TOP_TEXT, BOTTOM_WRAP_TEXT_0 * 3, FALLBACK_FONT)
+        long.render()
+        narrow = ImageMacro(Image.new('RGB', (240, 480)), TOP_TEXT, BOTTOM_SHORT_TEXT, FALLBACK_FONT)
+        narrow.render()
+        assert short.bottom_font_size > long.bottom_font_size
+        assert short.bottom_font_size > narrow.bottom_font_size
+
+    def test_render_stroke(self, tmpdir):
+        image_path = str(tmpdir.join('base.jpg'))
+        Image.new('RGB', (320, 240), (90, 120, 200)).save(image_path)
+        macro = ImageMacro(image_path, TOP_TEXT, BOTTOM_SHORT_TEXT, FALLBACK_FONT)
+        image = macro.render()
+        colors = set(color for _, color in image.getcolors(320 * 240))
+        assert STROKE_COLOR in colors
+        assert TEXT_COLOR in colors
+
+    def test_render_in_memory(self):
+        base = Image.new('RGB', (1280, 960), (90, 120, 200))
+        macro = ImageMacro(base, TOP_TEXT, BOTTOM_SHORT_TEXT, FALLBACK_FONT)
+        image = macro.render()
+        assert image.size == (640, 480)
+        assert macro.size == (640, 480)
+
+    def test_render_many(self, tmpdir):
+        image_path = str(tmpdir.join('base.jpg'))
+        Image.new('RGB', (1280, 960), (90, 120, 200)).save(image_path)
+        bases = [Image.new('RGB', (640, 480), (90, 120, 200)), image_path, Image.new('RGB', (320, 240), (0, 0, 0))]
+        macro = ImageMacro(None, TOP_TEXT, BOTTOM_SHORT_TEXT, FALLBACK_FONT)
+        with mock.patch.object(macro, 'layout_bottom_text', wraps=macro.layout_bottom_text) as layout:
+            images = list(macro.render_many(bases))
+        assert [image.size for image in images] == [(640, 480), (640, 480), (320, 240)]
+        assert layout.call_count == 2
+        single = ImageMacro(Image.new('RGB', (640, 480), (90, 120, 200)), TOP_TEXT, BOTTOM_SHORT_TEXT,
+                            FALLBACK_FONT).render()
+        assert images[0].tobytes() == single.tobytes()
+
+    def test_text_overlays_are_reused(self):
+        clear_text_overlays()
+        first = get_text_overlay(get_font_path(FALLBACK_FONT), 32, TOP_TEXT)
+        assert get_text_overlay(get_font_path(FALLBACK_FONT), 32, TOP_TEXT) is first
+        assert get_text_overlay(get_font_path(FALLBACK_FONT), 32, TOP_TEXT, stroke_width=1) is not first
+        clear_text_overlays()
+
+    def test_render_max_size(self, tmpdir):
+        image_path = str(tmpdir.join('base.jpg'))
+        Image.new('RGB', (3200, 2400), (90, 120, 200)).save(image_path)
+        macro = ImageMacro(image_path, TOP_TEXT, BOTTOM_SHORT_TEXT, FALLBACK_FONT, max_size=(320.0, 320.0),
+                           resample='bicubic')
+        assert macro.render().size == (320, 240)
+
+    def test_render_unknown_resample(self):
+        base = Image.new('RGB', (1280, 960), (90, 120, 200))
+        macro = ImageMacro(base, TOP_TEXT, BOTTOM_SHORT_TEXT, FALLBACK_FONT, resample='sharpest')
+        with pytest.raises(LolologistError):
+            macro.render()
+
+def test_encode_image():
+    data = encode_image(Image.new('RGB', (64, 48), (90, 120, 200)), '/out/0123456789.jpg')
+    assert Image.open(io.BytesIO(data)).format == 'JPEG'
+    data = encode_image(Image.new('RGB', (64, 48), (90, 120, 200)), '/out/0123456789.PNG')
+    assert Image.open(io.BytesIO(data)).format == 'PNG'
+
+@pytest.fixture
+def config_home(tmpdir, monkeypatch):
+    tmpdir.join('.lolologistrc').write("[DEFAULT]\nOutputDirectory = {}\nOutputFileName = {{revision}}\n"
+                                       "OutputFormat = jpg\n".format(tmpdir.join('out')))
+    monkeypatch.setenv('HOME', str(tmpdir))
+    return tmpdir
+
+def test_config_is_parsed_once(config_home):
+    config = Config()
+    assert config['OutputFormat'] == 'jpg'
+    with mock.patch('lolologist.lolologist._parse_config') as parse:
+        assert config['OutputDirectory'] == str(config_home.join('out'))
+        assert Config()['OutputFormat'] == 'jpg'
+    assert not parse.called
+
+def test_config_sees_external_changes(config_home):
+    config = Config()
+    assert not config.lol_speak
+    with open(config.config_file, 'a') as config_file:
+        config_file.write("LolSpeak = on\nUploadUrl = http://example.com/upload\n")
+    assert config.lol_speak
+    assert config.upload_url == 'http://example.com/upload'
+
+def test_config_image_settings(config_home):
+    config = Config()
+    assert config.max_size == (640.0, 480.0)
+    assert config.resample_filter == 'antialias'
+    config.update({'MaxWidth': '1280', 'MaxHeight': '720', 'ResampleFilter': 'bicubic'})
+    assert config.max_size == (1280.0, 720.0)
+    assert config.resample_filter == 'bicubic'
+
+def test_get_resample_filter():
+    assert get_resample_filter('antialias') == Image.LANCZOS
+    assert get_resample_filter('Bicubic') == Image.BICUBIC
+    with pytest.raises(LolologistError):
+        get_resample_filter('sharpest')
+
+def test_config_encoder_settings(config_home):
+    config = Config()
+    assert config.get_encoder_settings('JPEG') == {}
+    config.update({'JpegQuality': '85', 'JpegProgressive': 'on', 'WebpLossless': 'off', 'WebpMethod': '6'})
+    assert config.get_encoder_settings('JPEG') == {'quality': 85, 'progressive': True}
+    assert config.get_encoder_settings('WEBP') == {'lossless': False, 'method': 6}
+    config.update_config('JpegQuality', 'high')
+    with pytest.raises(LolologistError):
+        config.get_encoder_settings('JPEG')
+
+def test_config_output_variants(config_home):
+    config = Config()
+    commit = {'revision': '0123456789', 'project': 'lolologist'}
+    assert config.get_output_variants() == []
+    assert config.get_output_path(**commit) == str(config_home.join('out', '0123456789.jpg'))
+    config.update({'OutputVariants': 'thumb:jpg:160x120, dashboard:webp'})
+    thumb, dashboard = config.get_output_variants()
+    assert config.get_output_path(variant=thumb, **commit) == str(config_home.join('out', '0123456789.thumb.jpg'))
+    config.update({'OutputFileName': '{revision}{variant}'})
+    assert config.get_output_path(**commit) == str(config_home.join('out', '0123456789.jpg'))
+    assert config.get_output_path(variant=dashboard, **commit) == str(config_home.join('out',
+                                                                                      '0123456789dashboard.webp'))
+
+def test_capture_output_variants(make_app):
+    app = make_app(commits=1, OutputVariants='thumb:jpg:160x120, dashboard:webp')
+    with mock.patch.object(app, '_Lolologist__get_camera') as camera:
+        camera.return_value.capture_photo.return_value.__enter__.return_value = Image.new('RGB', (1280, 960))
+        result = app.capture_commit(app.repo_path)
+    thumb, dashboard = result["variants"]
+    assert Image.open(result["path"]).size == (640, 480)
+    assert Image.open(thumb).size == (160, 120)
+    assert Image.open(dashboard).format == 'WEBP'
+    assert Image.open(dashboard).size == (640, 480)
+    assert len(app.get_catalog().search(limit=None)) == 3
+
+@pytest.fixture
+def session_app(make_app):
+    app = make_app(commits=1, UploadImages='on', UploadUrl='http://example.com/upload')
+    camera = app._Lolologist__camera = mock.Mock()
+    camera.capture_photo.return_value.__enter__ = mock.Mock(return_value=Image.new('RGB', (640, 480)))
+    camera.capture_photo.return_value.__exit__ = mock.Mock(return_value=False)
+    return app
+
+def test_session_capture_replies_before_uploading(session_app):
+    app = session_app
+    release = threading.Event()
+
+    def slow_upload(url, path, data):
+        assert release.wait(5)
+        return 'http://example.com/macro.jpg'
+
+    with mock.patch.object(app, 'get_upload_queue') as queue:
+        queue.return_value.upload.side_effect = slow_upload
+        result = app.capture_commit(app.repo_path)
+        assert result["upload"] == "started"
+        assert os.path.isfile(result["path"])
+        release.set()
+        app.finish_uploads()
+    queue.return_value.upload.assert_called_once_with('http://example.com/upload', result["path"], mock.ANY)
+    entry, = app.get_catalog().search(limit=None)
+    assert entry.url == 'http://example.com/macro.jpg'
+
+def test_session_capture_uploads_while_saving(session_app):
+    app = session_app
+    uploading = threading.Event()
+
+    def upload(url, path, data):
+        uploading.set()
+        return 'http://example.com/macro.jpg'
+
+    def save(path, data, sync=True):
+        # Only returns once the upload has started, which it can't if the upload waits on the save
+        assert uploading.wait(5)
+        write_atomic(path, data, sync=sync)
+
+    with mock.patch.object(app, 'get_upload_queue') as queue, \
+            mock.patch('lolologist.lolologist.write_atomic', side_effect=save), \
+            mock.patch('lolologist.tracing._ACTIVE') as trace:
+        queue.return_value.upload.side_effect = upload
+        result = app.capture_commit(app.repo_path)
+        app.finish_uploads()
+    assert os.path.isfile(result["path"])
+    assert 'upload' in [call[0][0] for call in trace.add.call_args_list]
+    entry, = app.get_catalog().search(limit=None)
+    assert entry.url == 'http://example.com/macro.jpg'
+    assert entry.revision
+
+def test_session_capture_queues_failed_upload(session_app):
+    app = session_app
+    with mock.patch.object(app, 'get_upload_queue') as queue, \
+            mock.patch.object(app, '_Lolologist__spawn_background') as spawn:
+        queue.return_value.upload.side_effect = LolologistError("the host is down")
+        result = app.capture_commit(app.repo_path)
+        app.finish_uploads()
+    queue.return_value.push.assert_called_once_with('http://example.com/upload', result["path"])
+    spawn.assert_called_once_with('uploads', '--flush')
+
+def test_config_update_batches(config_home):
+    config = Config()
+    config.update_config('UploadUrl', 'http://example.com/upload')
+    with mock.patch('lolologist.lolologist.write_atomic', wraps=write_atomic) as write:
+        config.update({'OutputFormat': 'png', 'LolSpeak': 'on', 'UploadUrl': None})
+    assert write.call_count == 1
+    assert config['OutputFormat'] == 'png'
+    assert config.lol_speak
+    assert 'UploadUrl' not in config_home.join('.lolologistrc').read()
+    assert not [name for name in os.listdir(str(config_home)) if name.endswith('.tmp')]
 
+def _set_many(prefix):
+    config = Config()
+    for index in range(20):
+        config.update_config('{}{}'.format(prefix, index), str(index))
 
+def test_config_concurrent_updates(config_home):
+    processes = [multiprocessing.Process(target=_set_many, args=('Setting{}x'.format(n),)) for n in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    config = Config()
+    for n in range(4):
+        for index in range(20):
+            assert config['Setting{}x{}'.format(n, index)] == str(index)
+    assert config['OutputFormat'] == 'jpg'
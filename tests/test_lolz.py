@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import io
+import json
+import os
+
+import pytest
+import mock
+
+from lolologist import lolz
+from lolologist.lolz import Tranzlator, load_db
+from tests.legacy_lolz import LegacyTranzlator
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), 'data', 'commit_messages.txt')
+
+@pytest.fixture(scope='module')
+def corpus():
+    with io.open(CORPUS_PATH, encoding='utf-8') as corpus_file:
+        return corpus_file.read()
+
+@pytest.mark.parametrize('heuristics', [True, False])
+def test_matches_legacy_engine(corpus, heuristics):
+    tranzlator = Tranzlator(heuristics=heuristics)
+    legacy = LegacyTranzlator(heuristics=heuristics)
+    for line in corpus.splitlines():
+        assert tranzlator.translate_sentence(line) == legacy.translate_sentence(line)
+    assert tranzlator.translate_sentence(corpus) == legacy.translate_sentence(corpus)
+
+@pytest.mark.parametrize('word', ["dog's", "book's", "processes", "famous", "ous", "s", "ed", "stations",
+                                  "nation", "kiss", "photographer", "PHONE", "café's", "x'y'z"])
+def test_word_matches_legacy_engine(word):
+    assert Tranzlator().translate_word(word) == LegacyTranzlator().translate_word(word)
+
+def test_translate_many(corpus):
+    lines = corpus.splitlines()
+    tranzlator = Tranzlator()
+    assert list(tranzlator.translate_many(lines)) == [tranzlator.translate_sentence(line) for line in lines]
+
+def test_cache_bounded():
+    with mock.patch.object(Tranzlator, 'max_cached_words', 5):
+        tranzlator = Tranzlator()
+    tranzlator.translate_sentence("one two three four five six seven eight")
+    assert tranzlator.translate_word.cache_info().currsize == 5
+
+def test_cache_per_instance():
+    first, second = Tranzlator(), Tranzlator()
+    first.translate_word("kittens")
+    assert second.translate_word.cache_info().currsize == 0
+
+@pytest.fixture
+def compiled_dir(tmpdir, monkeypatch):
+    directory = tmpdir.join('cache')
+    monkeypatch.setattr(lolz, 'COMPILED_DB_DIRECTORY', str(directory))
+    monkeypatch.setattr(lolz, '_LOADED_DBS', {})
+    return directory
+
+@pytest.fixture
+def custom_db(tmpdir):
+    path = tmpdir.join('custom.json')
+    path.write(json.dumps({"hello": "oh hai", "cat": "kitteh"}))
+    return path
+
+def test_custom_db_compiled(compiled_dir, custom_db):
+    tranzlator = Tranzlator(db=str(custom_db))
+    assert tranzlator.translate_sentence("hello cat") == "oh hai kitteh"
+    assert len(compiled_dir.listdir()) == 1
+
+def test_compiled_db_reused(compiled_dir, custom_db):
+    load_db(str(custom_db))
+    lolz._LOADED_DBS.clear()
+    with mock.patch("json.load") as json_load:
+        db = load_db(str(custom_db))
+    assert not json_load.called
+    assert db.get("cat") == "kitteh"
+    assert "dog" not in db
+
+def test_compiled_db_rebuilt_on_change(compiled_dir, custom_db):
+    assert load_db(str(custom_db)).get("cat") == "kitteh"
+    custom_db.write(json.dumps({"cat": "ceiling cat"}))
+    os.utime(str(custom_db), (1, 1))
+    db = load_db(str(custom_db))
+    assert db.get("cat") == "ceiling cat"
+    assert len(db) == 1
+
+def test_compiled_db_corrupt(compiled_dir, custom_db):
+    load_db(str(custom_db))
+    lolz._LOADED_DBS.clear()
+    compiled_dir.listdir()[0].write(b'garbage', mode='wb')
+    assert load_db(str(custom_db)).get("hello") == "oh hai"
+
+def test_missing_db(compiled_dir, tmpdir):
+    with pytest.raises(IOError) as err:
+        Tranzlator(db=str(tmpdir.join('missing.json')))
+    assert 'Unable to open lolz database' in err.exconly()
+
+def test_unreadable_db(compiled_dir, tmpdir):
+    path = tmpdir.join('bad.json')
+    path.write('{not json')
+    with pytest.raises(IOError) as err:
+        Tranzlator(db=str(path))
+    assert 'unreadable' in err.exconly()
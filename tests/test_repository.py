@@ -1,10 +1,13 @@
+import os
 import stat
+import subprocess
 import sys
 
 import pytest
 import mock
 
-from lolologist.repository import GitRepository
+from lolologist.repository import (GitRepository, INSTALLED, REMOVED, SKIPPED, FAILED, find_repositories,
+                                   register_tree, deregister_tree)
 from lolologist.utils import LolologistError
 
 BUILTIN_OPEN = "__builtin__.open" if sys.version_info < (3,) else "builtins.open"
@@ -54,3 +57,66 @@ def test_add_hook(join_f, isfile_f, stat_f, chmod_f, open_f, repo_f):
         assert stat_f.call_args[0][0] == join_f.return_value
         assert chmod_f.call_args[0][0] == join_f.return_value
         assert chmod_f.call_args[0][1] ^ stat.S_IFREG == stat.S_IEXEC
+
+def test_get_commit_without_gitpython(tmpdir, make_repository, commit_summaries):
+    repository = make_repository(str(tmpdir.join('repo')), commits=2)
+    with mock.patch("git.Repo", side_effect=AssertionError("GitPython was started")):
+        commit = GitRepository(repository).get_newest_commit()
+    assert commit['project'] == 'repo'
+    assert commit['summary'] == commit_summaries[1]
+    assert commit['author'] == 'Bench'
+
+def test_get_commit_falls_back_to_gitpython(tmpdir, make_repository, commit_summaries):
+    repository = make_repository(str(tmpdir.join('repo')), commits=2)
+    repo = GitRepository(repository)
+    assert repo.get_commit('HEAD~1')['summary'] == commit_summaries[0]
+    with pytest.raises(LolologistError) as err:
+        repo.get_commit('nonexistent')
+    assert 'could not be found' in err.exconly()
+
+def test_init_subdirectory(tmpdir, make_repository):
+    repository = make_repository(str(tmpdir.join('repo')), commits=1)
+    os.mkdir(os.path.join(repository, 'sub'))
+    with pytest.raises(LolologistError) as err:
+        GitRepository(os.path.join(repository, 'sub'))
+    assert 'must contain a valid git repository' in err.exconly()
+
+@pytest.fixture
+def tree(tmpdir):
+    """ Two repositories, one nested in the other, and a submodule-style checkout with a `.git` file. """
+    root = tmpdir.mkdir('tree')
+    for path in ('a', 'a/vendor/b', 'c'):
+        subprocess.check_call(['git', 'init', '-q', str(root.join(path))])
+    root.join('a/.git').mkdir('modules')
+    subprocess.check_call(['git', 'init', '-q', '--separate-git-dir', str(root.join('a/.git/modules/sub')),
+                           str(root.join('a/sub'))])
+    root.mkdir('not-a-repo').join('file.txt').write('')
+    return str(root)
+
+def test_find_repositories(tree):
+    found = [os.path.relpath(path, tree) for path in find_repositories(tree)]
+    assert found == ['a', os.path.join('a', 'sub'), os.path.join('a', 'vendor', 'b'), 'c']
+
+def test_register_tree(tree):
+    hook_file = os.path.join(tree, 'c', '.git', 'hooks', 'post-commit')
+    with open(hook_file, 'w') as script:
+        script.write("#!/bin/sh\necho someone else's hook\n")
+    results = register_tree(tree, TEST_HOOK_TEXT + " lolologist", jobs=2)
+    outcomes = dict((os.path.relpath(path, tree), outcome) for path, outcome, _ in results)
+    assert outcomes == {'a': INSTALLED, os.path.join('a', 'sub'): INSTALLED,
+                        os.path.join('a', 'vendor', 'b'): INSTALLED, 'c': SKIPPED}
+    submodule_hook = os.path.join(tree, 'a', '.git', 'modules', 'sub', 'hooks', 'post-commit')
+    assert os.access(submodule_hook, os.X_OK)
+
+    results = deregister_tree(tree, jobs=2)
+    outcomes = dict((os.path.relpath(path, tree), outcome) for path, outcome, _ in results)
+    assert outcomes['a'] == REMOVED
+    assert outcomes['c'] == SKIPPED
+    assert not os.path.exists(submodule_hook)
+    assert os.path.exists(hook_file)
+
+def test_register_tree_failures(tree):
+    with mock.patch("lolologist.repository.GitRepository._add_hook", side_effect=OSError("read-only")):
+        results = register_tree(tree, TEST_HOOK_TEXT)
+    assert set(outcome for _, outcome, _ in results) == {FAILED}
+    assert results[0][2] == 'read-only'
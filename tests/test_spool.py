@@ -0,0 +1,95 @@
+import json
+import os
+
+import pytest
+import mock
+
+from lolologist.spool import JobSpool, write_atomic
+from lolologist.utils import LolologistError
+
+@pytest.fixture
+def spool(tmpdir):
+    return JobSpool(str(tmpdir.join('spool')), max_attempts=3, retry_delay=10)
+
+def test_write_atomic(tmpdir):
+    path = str(tmpdir.join('record.json'))
+    write_atomic(path, b'{"a": 1}')
+    write_atomic(path, b'{"a": 2}')
+    assert json.load(open(path)) == {"a": 2}
+    assert os.listdir(str(tmpdir)) == ['record.json']
+
+def test_push_order(spool):
+    first = spool.push({"revision": "a"})
+    second = spool.push({"revision": "b"})
+    assert first < second
+    assert [record["revision"] for _, record in spool.pending()] == ["a", "b"]
+    assert spool.pending()[0][1]["attempts"] == 0
+
+def test_complete(spool):
+    name = spool.push({"revision": "a"})
+    spool.complete(name)
+    assert spool.pending() == []
+
+def test_retry_backoff(spool):
+    name = spool.push({"revision": "a"})
+    record = spool.pending()[0][1]
+    with mock.patch("time.time", return_value=1000):
+        assert spool.retry(name, record, "boom")
+    record = spool.pending()[0][1]
+    assert record["attempts"] == 1
+    assert record["error"] == "boom"
+    assert 1005 <= record["not_before"] <= 1010
+
+def test_retry_exhausted(spool):
+    name = spool.push({"revision": "a"})
+    for _ in range(3):
+        record = spool.pending()[0][1]
+        spool.retry(name, record, "boom")
+    assert spool.pending() == []
+    assert spool.failed()[0][1]["attempts"] == 3
+
+def test_drain_in_order(spool):
+    spool.push({"revision": "a"})
+    spool.push({"revision": "b"})
+    seen = []
+    assert spool.drain(lambda job: seen.append(job["revision"])) == (2, 0)
+    assert seen == ["a", "b"]
+    assert spool.pending() == []
+
+def test_drain_retries(tmpdir):
+    spool = JobSpool(str(tmpdir), retry_delay=0)
+    spool.push({"revision": "a"})
+    attempts = []
+    def handler(job):
+        attempts.append(job["attempts"])
+        if len(attempts) < 2:
+            raise LolologistError("camera unplugged")
+    assert spool.drain(handler) == (1, 0)
+    assert attempts == [0, 1]
+
+def test_drain_waits_for_delayed(spool):
+    spool.push({"revision": "a"})
+    name, record = spool.pending()[0]
+    with mock.patch("time.time", return_value=1000):
+        spool.retry(name, record, "boom")
+    clock = mock.Mock(side_effect=[999, 1010])
+    with mock.patch("time.time", clock):
+        sleep = mock.Mock()
+        assert spool.drain(lambda job: None, sleep=sleep) == (1, 0)
+    assert 6 <= sleep.call_args[0][0] <= 11
+
+def test_drain_gives_up(tmpdir):
+    spool = JobSpool(str(tmpdir), max_attempts=3, retry_delay=0)
+    spool.push({"revision": "a"})
+    def handler(job):
+        raise IOError("no frame")
+    assert spool.drain(handler) == (0, 1)
+    assert len(spool.failed()) == 1
+
+def test_lock_exclusive(spool):
+    with spool.lock():
+        with pytest.raises(LolologistError):
+            with JobSpool(spool.directory).lock():
+                pass
+    with spool.lock():
+        pass
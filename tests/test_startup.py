@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+# Heavy dependencies that only capture-related code paths should pull in
+HEAVY_MODULES = ('PIL', 'git', 'requests', 'socketserver')
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+pytestmark = pytest.mark.skipif(sys.version_info < (3, 7), reason="-X importtime requires Python 3.7+")
+
+def run_with_importtime(home, argv):
+    """ Runs the CLI with the given arguments, returning every module it imported. """
+    script = "import sys; from lolologist.lolologist import main; sys.argv = {!r}; main()".format(
+        ['lolologist'] + argv)
+    environment = dict(os.environ, HOME=home, PYTHONPATH=PROJECT_ROOT)
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', script], env=environment,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    assert process.returncode == 0, process.stderr
+    modules = []
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, module = line.split('|')
+        if cumulative.strip().isdigit():
+            modules.append(module.strip())
+    return modules
+
+@pytest.fixture
+def home(tmpdir):
+    tmpdir.join('.lolologistrc').write("[DEFAULT]\nOutputDirectory = {}\nOutputFileName = {{revision}}\n"
+                                       "OutputFormat = jpg\n".format(tmpdir.join('out')))
+    return str(tmpdir)
+
+@pytest.mark.parametrize('argv', [['--help'], ['speaklolz', 'on'], ['uploader', 'off']])
+def test_config_commands_skip_heavy_imports(home, argv):
+    # How long startup takes is tracked by the `config_command` benchmark, against its baseline
+    modules = run_with_importtime(home, argv)
+    assert 'lolologist.lolologist' in modules
+    heavy = [module for module in modules if module.split('.')[0] in HEAVY_MODULES]
+    assert heavy == []
@@ -0,0 +1,114 @@
+from __future__ import unicode_literals
+
+from datetime import datetime
+import os
+import sys
+
+import pytest
+import mock
+from PIL import Image
+
+from lolologist import timelapse
+from lolologist.encoders import encode_image, get_image_format, make_metadata
+from lolologist.utils import LolologistError
+
+COLORS = [(255, 0, 0), (0, 255, 0), (0, 0, 255)]
+
+def save_macro(path, color, **commit):
+    image = Image.new('RGB', (320, 240), color)
+    with open(path, 'wb') as output:
+        output.write(encode_image(image, path, make_metadata(get_image_format(path), commit)))
+    return path
+
+@pytest.fixture
+def macros(tmpdir):
+    """ Three projects' macros, saved out of commit order, and a file that isn't a macro. """
+    save_macro(str(tmpdir.mkdir('b').join('2.jpg')), COLORS[2], project='b', revision='2', author='Ada',
+               time=datetime(2016, 6, 17))
+    save_macro(str(tmpdir.mkdir('a').join('1.png')), COLORS[1], project='a', revision='1', author='Zoë',
+               time=datetime(2016, 6, 16))
+    save_macro(str(tmpdir.join('a', '0.webp')), COLORS[0], project='a', revision='0', author='Ada',
+               time=datetime(2016, 6, 15))
+    tmpdir.join('a', 'notes.txt').write('not a macro')
+    tmpdir.join('a', 'broken.jpg').write('not an image')
+    return str(tmpdir)
+
+def test_scan_and_select(macros):
+    found = timelapse.scan(macros, jobs=2)
+    assert len(found) == 3
+    assert [macro.revision for macro in timelapse.select(found)] == ['0', '1', '2']
+    assert [macro.revision for macro in timelapse.select(found, project='a')] == ['0', '1']
+    assert [macro.revision for macro in timelapse.select(found, author='ADA')] == ['0', '2']
+    assert [macro.revision for macro in timelapse.select(found, since=datetime(2016, 6, 16),
+                                                         until=datetime(2016, 6, 17))] == ['1']
+
+def test_macros_without_metadata_use_mtime(tmpdir):
+    path = str(tmpdir.join('old.jpg'))
+    Image.new('RGB', (32, 24)).save(path)
+    os.utime(path, (1466000000, 1466000000))
+    macro = timelapse.read_macro(path)
+    assert macro.time == datetime.fromtimestamp(1466000000)
+    assert macro.project is None
+
+def test_frames_stay_bounded(macros):
+    consumed = []
+
+    def paths():
+        for index in range(20):
+            consumed.append(index)
+            yield os.path.join(macros, 'a', '0.webp')
+    frames = timelapse.iter_frames(paths(), (64, 48), jobs=2)
+    first = next(frames)
+    assert first.size == (64, 48)
+    assert len(consumed) <= 4
+    assert len(list(frames)) == 19
+
+def test_load_frame_letterboxes(tmpdir):
+    path = str(tmpdir.join('wide.png'))
+    Image.new('RGB', (200, 50), (255, 255, 255)).save(path)
+    frame = timelapse.load_frame(path, (100, 100))
+    assert frame.size == (100, 100)
+    assert frame.getpixel((50, 5)) == (0, 0, 0)
+    assert frame.getpixel((50, 50)) == (255, 255, 255)
+    assert timelapse.load_frame(str(tmpdir.join('missing.png')), (100, 100)) is None
+
+def test_build_gif(macros, tmpdir):
+    output = str(tmpdir.join('recap.gif'))
+    count = timelapse.build(output, timelapse.select(timelapse.scan(macros)), (160, 120), fps=5)
+    assert count == 3
+    animation = Image.open(output)
+    assert animation.size == (160, 120)
+    assert animation.n_frames == 3
+    assert animation.info['loop'] == 0
+    for index, color in enumerate(COLORS):
+        animation.seek(index)
+        assert animation.info['duration'] == 200
+        pixel = animation.convert('RGB').getpixel((80, 60))
+        # The macros were saved lossily
+        assert max(abs(actual - expected) for actual, expected in zip(pixel, color)) < 8
+
+def test_build_with_command(macros, tmpdir):
+    output = str(tmpdir.join('recap.raw'))
+    command = '"{}" -c "import sys, shutil; shutil.copyfileobj(sys.stdin.buffer if hasattr(sys.stdin, \'buffer\') ' \
+              'else sys.stdin, open(sys.argv[1], \'wb\'))" {{output}}'.format(sys.executable)
+    count = timelapse.build(output, timelapse.select(timelapse.scan(macros)), (16, 12), fps=5, command=command)
+    assert count == 3
+    assert os.path.getsize(output) == 3 * 16 * 12 * 3
+
+def test_build_with_failing_command(macros, tmpdir):
+    with pytest.raises(LolologistError) as err:
+        timelapse.build(str(tmpdir.join('recap.mp4')), timelapse.select(timelapse.scan(macros)), (16, 12), fps=5,
+                        command='"{}" -c "import sys; sys.exit(3)"'.format(sys.executable))
+    assert 'exit status 3' in err.exconly()
+
+def test_timelapse_command(tmpdir, make_app, make_image, capsys):
+    app = make_app(commits=4, output_directory=str(tmpdir.join('out', '{project}')))
+    app.backfill(mock.Mock(rev_range='HEAD', image=make_image(str(tmpdir.join('base.jpg'))), jobs=1))
+    output = str(tmpdir.join('recap.gif'))
+    app.timelapse(mock.Mock(output=output, directory=None, project='repo', author='bench', since='2016-06-15',
+                            until='2016-06-15', fps=4, jobs=2, command=None))
+    assert 'Saved a 4-frame timelapse' in capsys.readouterr()[0]
+    assert Image.open(output).n_frames == 4
+    with pytest.raises(LolologistError):
+        app.timelapse(mock.Mock(output=output, directory=None, project='other', author=None, since=None,
+                                until=None, fps=4, jobs=2, command=None))
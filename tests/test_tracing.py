@@ -0,0 +1,66 @@
+import json
+import threading
+
+from lolologist import tracing
+
+def test_spans_are_ignored_without_a_trace(tmpdir):
+    with tracing.span('render'):
+        pass
+    tracing.record_span('camera', tracing.now())
+    with tracing.trace('capture', None):
+        with tracing.span('render'):
+            pass
+    assert not tmpdir.listdir()
+
+def save():
+    with tracing.span('save'):
+        pass
+
+def test_trace_writes_json_lines(tmpdir):
+    log_path = str(tmpdir.join('traces', 'trace.jsonl'))
+    with tracing.trace('capture', log_path):
+        started = tracing.now()
+        tracing.record_span('camera', started)
+        with tracing.span('render'):
+            pass
+        saver = threading.Thread(target=save)
+        saver.start()
+        saver.join()
+        with tracing.span('translate'):
+            pass
+        with tracing.span('translate'):
+            pass
+    records = [json.loads(line) for line in open(log_path)]
+    assert [record['span'] for record in records][0] == 'capture'
+    assert sorted(record['span'] for record in records) == ['camera', 'capture', 'render', 'save', 'translate',
+                                                             'translate']
+    assert len(set(record['trace'] for record in records)) == 1
+    assert all(record['ms'] >= 0 for record in records)
+
+def test_traces_do_not_nest(tmpdir):
+    outer, inner = str(tmpdir.join('outer.jsonl')), str(tmpdir.join('inner.jsonl'))
+    with tracing.trace('worker', outer):
+        with tracing.trace('capture', inner):
+            pass
+    assert not tmpdir.join('inner.jsonl').exists()
+    assert [json.loads(line)['span'] for line in open(outer)] == ['worker', 'capture']
+
+def test_enabled_by_environment(monkeypatch):
+    monkeypatch.delenv(tracing.TRACE_ENVIRONMENT_VARIABLE, raising=False)
+    assert not tracing.enabled_by_environment()
+    monkeypatch.setenv(tracing.TRACE_ENVIRONMENT_VARIABLE, '0')
+    assert not tracing.enabled_by_environment()
+    monkeypatch.setenv(tracing.TRACE_ENVIRONMENT_VARIABLE, '1')
+    assert tracing.enabled_by_environment()
+
+def test_summarize(tmpdir):
+    log = tmpdir.join('trace.jsonl')
+    lines = []
+    for trace in range(20):
+        lines.append({"trace": str(trace), "span": "render", "ms": 10.0 + trace})
+        lines.append({"trace": str(trace), "span": "translate", "ms": 1.0})
+        lines.append({"trace": str(trace), "span": "translate", "ms": 2.0})
+    log.write('\n'.join(json.dumps(line) for line in lines) + '\n{truncated\n')
+    rows = tracing.summarize(str(log))
+    assert rows[0] == ('render', 20, 20.0, 28.0)
+    assert rows[1] == ('translate', 20, 3.0, 3.0)
@@ -0,0 +1,177 @@
+import json
+import socket
+import threading
+import time
+
+import pytest
+import mock
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+from lolologist import uploads
+from lolologist.uploads import UploadQueue
+from lolologist.utils import LolologistError
+
+class ImageHost(ThreadingMixIn, HTTPServer):
+    """ A local stand-in for an image host that can be told to be slow or to fail """
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), ImageHostHandler)
+        self.latency = 0
+        self.failures = 0
+        self.uploads = []
+        self.connections = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        pass  # Clients that time out hang up on us
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/upload'.format(self.server_address[1])
+
+class ImageHostHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        host = self.server
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        with host.lock:
+            host.connections.add(self.client_address)
+            host.in_flight += 1
+            host.max_in_flight = max(host.max_in_flight, host.in_flight)
+            failing = host.failures > 0
+            host.failures -= 1
+        time.sleep(host.latency)
+        with host.lock:
+            host.in_flight -= 1
+            if not failing:
+                host.uploads.append(body)
+                image_url = 'http://images.example.com/{}.jpg'.format(len(host.uploads))
+        if failing:
+            self.respond(500, b'overloaded')
+        else:
+            self.respond(200, json.dumps({"data": {"img_url": image_url}}).encode('utf-8'))
+
+    def respond(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def host():
+    host = ImageHost()
+    thread = threading.Thread(target=host.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield host
+    host.shutdown()
+    host.server_close()
+
+@pytest.fixture
+def macros(tmpdir):
+    paths = []
+    for index in range(8):
+        path = tmpdir.join('{}.jpg'.format(index))
+        path.write_binary(b'macro %d' % index)
+        paths.append(str(path))
+    return paths
+
+def make_queue(tmpdir, **kwargs):
+    kwargs.setdefault('retry_delay', 0)
+    return UploadQueue(str(tmpdir.join('uploads')), **kwargs)
+
+def test_flush(host, macros, tmpdir):
+    queue = make_queue(tmpdir, concurrency=3)
+    for path in macros:
+        queue.push(host.url, path)
+    host.latency = 0.05
+    uploaded = []
+    assert queue.flush(on_upload=lambda record, url: uploaded.append(url)) == (8, 0)
+    assert sorted(uploaded) == sorted('http://images.example.com/{}.jpg'.format(n) for n in range(1, 9))
+    assert queue.pending() == []
+    assert 1 < host.max_in_flight <= 3
+    # Connections are pooled and reused rather than opened per upload
+    assert len(host.connections) <= 3
+
+def test_flush_retries_errors(host, macros, tmpdir):
+    queue = make_queue(tmpdir)
+    queue.push(host.url, macros[0])
+    host.failures = 2
+    assert queue.flush() == (1, 0)
+    assert len(host.uploads) == 1
+
+def test_flush_gives_up(host, macros, tmpdir):
+    queue = make_queue(tmpdir, max_attempts=2)
+    queue.push(host.url, macros[0])
+    host.failures = 5
+    assert queue.flush() == (0, 1)
+    failed = queue.failed()
+    assert failed[0][1]["path"] == macros[0]
+    assert '500' in failed[0][1]["error"]
+
+def test_flush_backs_off(host, macros, tmpdir):
+    queue = make_queue(tmpdir, retry_delay=10)
+    queue.push(host.url, macros[0])
+    host.failures = 2
+    clock, sleeps = [1000.0], []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        clock[0] += seconds
+
+    with mock.patch('lolologist.spool.time') as spool_time, \
+            mock.patch('lolologist.spool.random.uniform', return_value=1.0):
+        spool_time.time.side_effect = lambda: clock[0]
+        assert queue.flush(sleep=sleep) == (1, 0)
+    # The delay doubles with each failed attempt
+    assert sleeps == [10, 20]
+
+def test_flush_times_out(host, macros, tmpdir):
+    queue = make_queue(tmpdir, max_attempts=1, timeout=0.1)
+    queue.push(host.url, macros[0])
+    host.latency = 0.5
+    sleeps = []
+    with mock.patch('lolologist.uploads.upload', wraps=uploads.upload) as upload:
+        assert queue.flush(sleep=sleeps.append) == (0, 1)
+    assert upload.call_args[1]['timeout'] == 0.1
+    assert sleeps == []
+    assert 'timed out' in queue.failed()[0][1]["error"]
+
+def test_flush_unreachable(macros, tmpdir):
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    port = listener.getsockname()[1]
+    listener.close()
+    queue = make_queue(tmpdir, max_attempts=1)
+    queue.push('http://127.0.0.1:{}/upload'.format(port), macros[0])
+    assert queue.flush() == (0, 1)
+    assert "connect to the host" in queue.failed()[0][1]["error"]
+
+def test_flush_is_exclusive(macros, tmpdir):
+    queue = make_queue(tmpdir)
+    queue.push('http://127.0.0.1:1/upload', macros[0])
+    with queue.spool.lock():
+        with pytest.raises(LolologistError):
+            queue.flush()
+    assert len(queue.pending()) == 1
+
+def test_upload_from_memory(host, tmpdir):
+    queue = make_queue(tmpdir)
+    missing = str(tmpdir.join('not-written-yet.jpg'))
+    assert queue.upload(host.url, missing, data=b'encoded macro') == 'http://images.example.com/1.jpg'
+    assert b'encoded macro' in host.uploads[0]
+    assert b'not-written-yet.jpg' in host.uploads[0]
+    queue.close()
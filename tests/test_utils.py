@@ -3,7 +3,7 @@ import sys
 import pytest
 import mock
 
-from lolologist.utils import upload, LolologistError
+from lolologist.utils import upload, open_image, LolologistError, LRUCache
 
 TEST_URL = "http://test/url"
 TEST_PATH = "/test/path.jpg"
@@ -84,3 +84,35 @@ def test_upload_failure_status(open_function, basename_function, post_function):
     assert post_function.called
     assert "Couldn't upload the file" in err.exconly()
     assert post_function.return_value.status_code == 500
+
+def test_lru_cache_evicts_least_recent():
+    cache = LRUCache(2)
+    cache['a'] = 1
+    cache['b'] = 2
+    assert cache.get('a') == 1
+    cache['c'] = 3
+    assert 'a' in cache
+    assert 'b' not in cache
+    assert len(cache) == 2
+    with pytest.raises(KeyError):
+        cache['b']
+
+def _write_jpeg(tmpdir, size):
+    from PIL import Image
+    path = str(tmpdir.join('{}x{}.jpg'.format(*size)))
+    Image.new('RGB', size, (90, 120, 200)).save(path)
+    return path
+
+def test_open_image_draft(tmpdir):
+    path = _write_jpeg(tmpdir, (4000, 3000))
+    assert open_image(path).size == (4000, 3000)
+    assert open_image(path, (640, 480)).size == (1000, 750)
+    # Never decodes below the requested size
+    assert open_image(path, (1200, 900)).size == (2000, 1500)
+    assert open_image(path, (4000, 3000)).size == (4000, 3000)
+
+def test_open_image_draft_only_jpeg(tmpdir):
+    from PIL import Image
+    path = str(tmpdir.join('image.png'))
+    Image.new('RGB', (4000, 3000)).save(path)
+    assert open_image(path, (640, 480)).size == (4000, 3000)